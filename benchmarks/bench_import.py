@@ -0,0 +1,87 @@
+"""
+コールドスタートのimport時間の計測
+    main: Cloud Functionのインスタンス起動時に読み込まれるmain.pyのimport時間
+    各段階: main読み込み後、段階ごとに遅延importされるモジュールの追加のimport時間
+毎回新しいプロセスで計測し、中央値を表示する
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.bench_import --repeat 5 --top 15
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# 段階ごとに遅延importされるモジュール(実行される順)
+STAGES = [
+    ("query (bigquery)", "google.cloud.bigquery"),
+    ("parse (pandas/numpy)", "modules.forecasttable"),
+    ("upload (storage)", "google.cloud.storage"),
+    ("logging client", "google.cloud.logging.handlers"),
+]
+
+MEASURE_CODE = """
+import importlib, json, time
+started = time.perf_counter()
+import main
+timings = {"main": time.perf_counter() - started}
+for name, module in %r:
+    started = time.perf_counter()
+    importlib.import_module(module)
+    timings[name] = time.perf_counter() - started
+print(json.dumps(timings))
+"""
+
+
+def measure_once() -> dict[str, float]:
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_CODE % (STAGES,)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(result.stdout)
+
+
+def slowest_modules(top: int) -> list[tuple[int, int, str]]:
+    """-X importtimeでmainの読み込み中に時間のかかったモジュール(自身の時間順)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数")
+    parser.add_argument("--top", type=int, default=15, help="表示するモジュール数")
+    args = parser.parse_args()
+
+    results = [measure_once() for _ in range(args.repeat)]
+
+    print(f"python {sys.version.split()[0]}, repeat: {args.repeat}")
+    for name in results[0]:
+        timings = [result[name] for result in results]
+        print(
+            f"{name:>22}: median {statistics.median(timings) * 1000:8.1f} ms"
+            f"  min {min(timings) * 1000:8.1f} ms"
+        )
+
+    print(f"\nslowest modules while importing main (self / cumulative):")
+    for self_us, cumulative_us, name in slowest_modules(args.top):
+        print(f"{self_us / 1000:8.1f} ms {cumulative_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+フィクスチャ(全気象台分)から7テーブルのDataFrameを作るまでの抽出処理のベンチマーク
+    total: 全テーブル分の抽出とDataFrame作成(本番と同じくForecastTablesに追記してから1度だけDataFrameにする)
+    テーブルごと: そのテーブルのみ抽出してDataFrameにする時間
+    peak memory: total 1回分のtracemallocでのメモリ使用量のピーク
+保存したベースライン(benchmarks/baselines/bench_parse.json)と比較し、差を割合で表示する
+ベースラインは計測した環境(マシン・Python・pandasのバージョン・フィクスチャの作成方法)でのみ比較できる
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.bench_parse --repeat 20
+    python -m benchmarks.bench_parse --repeat 20 --save-baseline
+    python -m benchmarks.bench_parse --max-regression 0.2  # 20%以上遅くなったら終了コード1
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.fixtures import load_fixture_source, load_fixtures
+from modules.forecasttable import TABLE_COLUMNS, ForecastTables
+from modules.weatherforcast import WeatherForecast
+
+GET_DATETIME = "2021-11-20 11:05:00"
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "bench_parse.json")
+
+
+def build_tables(payloads, table_names=None) -> dict[str, pd.DataFrame]:
+    """フィクスチャからテーブルごとのDataFrameを作る(省略時は全テーブル)"""
+    table_names = list(TABLE_COLUMNS) if table_names is None else table_names
+    tables = ForecastTables(capacity=64 * len(payloads))
+    for area_code, payload in payloads.items():
+        WeatherForecast.from_json(
+            area_code, payload, get_datetime=GET_DATETIME
+        ).append_to(tables, table_names=table_names)
+    return {table_name: tables.to_dataframe(table_name) for table_name in table_names}
+
+
+def median_seconds(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def peak_memory_bytes(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(payloads, repeat: int) -> dict:
+    """計測して結果をまとめる"""
+    dataframes = build_tables(payloads)
+    rows = {table_name: len(df) for table_name, df in dataframes.items()}
+    total_seconds = median_seconds(lambda: build_tables(payloads), repeat)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "fixtures": load_fixture_source()["source"],
+        },
+        "offices": len(payloads),
+        "rows": sum(rows.values()),
+        "total_seconds": total_seconds,
+        "rows_per_second": sum(rows.values()) / total_seconds,
+        "peak_memory_bytes": peak_memory_bytes(lambda: build_tables(payloads)),
+        "tables": {
+            table_name: {
+                "rows": rows[table_name],
+                "seconds": median_seconds(
+                    lambda: build_tables(payloads, [table_name]), repeat
+                ),
+            }
+            for table_name in TABLE_COLUMNS
+        },
+    }
+
+
+def change(current: float, baseline: float) -> str:
+    if not baseline:
+        return ""
+    return f"{(current - baseline) / baseline * 100:+7.1f}%"
+
+
+def report(result: dict, baseline: dict = None) -> float:
+    """
+    結果を表示
+    return
+        ベースラインに対する全体の時間の増加率(ベースラインがなければ0)
+    """
+    baseline = baseline or {}
+    baseline_tables = baseline.get("tables", {})
+
+    print(
+        f"offices: {result['offices']}, rows: {result['rows']}"
+        f" (python {result['environment']['python']},"
+        f" pandas {result['environment']['pandas']})"
+    )
+    if baseline and baseline["environment"] != result["environment"]:
+        print(f"baseline environment differs: {baseline['environment']}")
+
+    print(
+        f"{'total':>22}: {result['total_seconds'] * 1000:8.2f} ms"
+        f" {change(result['total_seconds'], baseline.get('total_seconds'))}"
+        f"  {result['rows_per_second']:12,.0f} rows/s"
+    )
+    for table_name, table in result["tables"].items():
+        baseline_seconds = baseline_tables.get(table_name, {}).get("seconds")
+        print(
+            f"{table_name:>22}: {table['seconds'] * 1000:8.2f} ms"
+            f" {change(table['seconds'], baseline_seconds)}"
+            f"  {table['rows']:6d} rows"
+        )
+    print(
+        f"{'peak memory':>22}: {result['peak_memory_bytes'] / 1024 / 1024:8.2f} MiB"
+        f" {change(result['peak_memory_bytes'], baseline.get('peak_memory_bytes'))}"
+    )
+
+    if not baseline:
+        return 0.0
+    return (result["total_seconds"] - baseline["total_seconds"]) / baseline[
+        "total_seconds"
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20, help="計測回数")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="結果をベースラインとして保存"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=None,
+        help="ベースラインより遅くなってよい割合(超えたら終了コード1)",
+    )
+    args = parser.parse_args()
+
+    # 境界ケース(読み飛ばす地方)のエラーログは計測の邪魔になるので出さない
+    logging.disable(logging.CRITICAL)
+
+    payloads = load_fixtures()
+    result = run(payloads, args.repeat)
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH) and not args.save_baseline:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["rows"] != result["rows"]:
+            print(f"baseline rows differ: {baseline['rows']} (fixtures changed?)")
+
+    regression = report(result, baseline)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(BASELINE_PATH), exist_ok=True)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"saved baseline to {BASELINE_PATH}")
+
+    if args.max_regression is not None and regression > args.max_regression:
+        print(f"regression {regression * 100:.1f}% > {args.max_regression * 100:.1f}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+予報レスポンスから7テーブルのDataFrameを作るまでのベンチマーク
+    per-office: 気象台ごとにDataFrameを作りpd.concatで結合(従来の方法)
+    batched: ForecastTablesに全気象台分を追記し、テーブルごとに1度だけDataFrameにする
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.bench_parse_concat --offices 58 --repeat 20
+"""
+
+import argparse
+import statistics
+import time
+
+import pandas as pd
+
+from benchmarks.payloads import generate_payloads
+from modules.forecasttable import TABLE_COLUMNS, ForecastTables
+from modules.weatherforcast import WeatherForecast
+
+GET_DATETIME = "2021-11-20 11:05:00"
+
+
+def build_per_office(payloads) -> dict[str, pd.DataFrame]:
+    weather_forecasts = [
+        WeatherForecast.from_json(area_code, payload, get_datetime=GET_DATETIME)
+        for area_code, payload in payloads.items()
+    ]
+    return {
+        table_name: pd.concat(
+            [getattr(wf, f"{table_name}_df") for wf in weather_forecasts]
+        )
+        for table_name in TABLE_COLUMNS
+    }
+
+
+def build_batched(payloads) -> dict[str, pd.DataFrame]:
+    tables = ForecastTables(capacity=64 * len(payloads))
+    for area_code, payload in payloads.items():
+        WeatherForecast.from_json(
+            area_code, payload, get_datetime=GET_DATETIME
+        ).append_to(tables)
+    return {table_name: tables.to_dataframe(table_name) for table_name in TABLE_COLUMNS}
+
+
+def measure(func, payloads, repeat: int) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(payloads)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--offices", type=int, default=58, help="気象台数")
+    parser.add_argument("--repeat", type=int, default=20, help="計測回数")
+    args = parser.parse_args()
+
+    payloads = generate_payloads(num_offices=args.offices)
+
+    # 両方式の出力ファイルが同じであることを確認
+    per_office = build_per_office(payloads)
+    batched = build_batched(payloads)
+    for table_name in TABLE_COLUMNS:
+        assert per_office[table_name].to_csv(index=False) == batched[table_name].to_csv(
+            index=False
+        ), f"{table_name}: output mismatch"
+    num_rows = sum(len(df) for df in batched.values())
+
+    print(f"offices: {args.offices}, rows: {num_rows}, repeat: {args.repeat}")
+    results = {}
+    for name, func in (("per-office", build_per_office), ("batched", build_batched)):
+        timings = measure(func, payloads, args.repeat)
+        results[name] = statistics.median(timings)
+        print(
+            f"{name:>10}: median {results[name] * 1000:8.2f} ms"
+            f"  min {min(timings) * 1000:8.2f} ms"
+            f"  ({num_rows / results[name]:,.0f} rows/s)"
+        )
+    print(f"speedup: {results['per-office'] / results['batched']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""
+main.mainの全体(取得→ 抽出→ 出力→ BigQuery取り込み→ 後片付け)をオフラインで計測するハーネス
+    気象庁API: localjma(フィクスチャを返すローカルHTTPサーバ)
+    GCS: localgcs(一時ディレクトリ)
+    BigQuery: localbq(取り込みジョブ・クエリを記録するだけ)
+段階(サービスの関数)ごとの時間を実行ごとに表示する
+    同じ関数が並列に呼ばれる段階(output_import_fileなど)は各呼び出しの合計で、実時間より長くなる
+    段階は入れ子(request_weather_forecastはfetch_weather_forecastsなどを含む)
+1回目はコールドスタート相当、2回目以降はウォームインスタンス相当(応答キャッシュ・取り込み済みレポート日時が効く)
+--freshで毎回キャッシュと取り込み済みレポート日時を捨て、全件取り込みを繰り返す
+
+遅延・失敗の注入(--fault エンドポイント=書式、複数指定可)
+    エンドポイント: jma, gcs.download, gcs.upload, gcs.delete, gcs.copy, gcs.list, bq.query, bq.load, bq.write
+    書式: latency=秒,jitter=秒,failure_rate=割合(0-1)
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.bench_pipeline --runs 3
+    python -m benchmarks.bench_pipeline --fresh --runs 3 --set load_mode=direct --set request_max_workers=16
+    python -m benchmarks.bench_pipeline --fault jma=latency=0.2,jitter=0.1 --fault bq.load=latency=2
+    python -m benchmarks.bench_pipeline --fault jma=failure_rate=0.1 --fault gcs.upload=failure_rate=0.05
+"""
+
+import argparse
+import base64
+import contextlib
+import functools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import yaml
+
+import main as cloud_function
+
+from benchmarks.faults import Faults
+from benchmarks.fixtures import load_fixtures
+from benchmarks.localbq import LocalBigQuery
+from benchmarks.localgcs import LocalGCS
+from benchmarks.localjma import LocalJMAServer
+from modules import weatherforcast
+from services import weatherforcastservice
+from utils import files
+
+PROJECT_ID = "bench-project"
+BUCKET_NAME = "bench-bucket"
+
+# 計測するサービスの関数(実行される順)
+STAGES = [
+    "request_weather_forecast",
+    "fetch_weather_forecasts",
+    "validate_import_dataframes",
+    "output_import_file",
+    "dataframes_to_bqtable",
+    "write_dataframes_to_bqtable",
+    "gcsweatherforecastfiles_to_bqtable",
+    "clear_response_cache",
+    "delete_localweatherforecastfiles",
+    "delete_insertedgcsweatherforecastfiles",
+]
+
+
+class StageTimer:
+    def __init__(self):
+
+        """
+        段階ごとの時間の合計と呼び出し回数(並列に呼ばれてもよい)
+
+        フィールド変数
+        self.seconds: dict[str, float]
+        self.calls: dict[str, int]
+        """
+
+        self.seconds = {}
+        self.calls = {}
+        self.__lock = threading.Lock()
+
+    def reset(self):
+        with self.__lock:
+            self.seconds = {}
+            self.calls = {}
+
+    def wrap(self, name: str, func):
+        """funcの時間をnameの段階として計測する関数を返す"""
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self.__lock:
+                    self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+                    self.calls[name] = self.calls.get(name, 0) + 1
+
+        return timed
+
+
+def parse_overrides(items: list[str]) -> dict:
+    """--set の "a.b=値"(値はyamlとして読む)を{("a", "b"): 値}にする"""
+    overrides = {}
+    for item in items:
+        key, value = item.split("=", 1)
+        overrides[tuple(key.split("."))] = yaml.safe_load(value)
+    return overrides
+
+
+def install_config_overrides(overrides: dict, tmp_file_dir: str):
+    """set_configが読むyamls/config.yamlに上書きを適用する"""
+    read_yaml = files.read_yaml
+
+    def read_yaml_with_overrides(filepath: str):
+        yml = read_yaml(filepath)
+        if filepath != "yamls/config.yaml":
+            return yml
+        yml["tmp_file_dir"] = tmp_file_dir
+        for keys, value in overrides.items():
+            target = yml
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = value
+        return yml
+
+    files.read_yaml = read_yaml_with_overrides
+
+
+def discard_caches(local_gcs: LocalGCS, tmp_file_dir: str):
+    """応答キャッシュと取り込み済みレポート日時を捨てる(次の実行を全件取り込みにする)"""
+    config = files.read_yaml("yamls/config.yaml")
+    shutil.rmtree(
+        os.path.join(tmp_file_dir, config["response_cache"]["dirname"]),
+        ignore_errors=True,
+    )
+    snapshot_path = config["report_watermark"]["snapshot_path"]
+    for path in (
+        local_gcs.path(BUCKET_NAME, snapshot_path),
+        os.path.join(tmp_file_dir, snapshot_path),
+    ):
+        if os.path.exists(path):
+            os.remove(path)
+    weatherforcastservice._report_watermark = None
+    weatherforcastservice._response_cache = None
+
+
+@contextlib.contextmanager
+def local_environment(payloads: dict, faults: Faults, overrides: dict):
+    """
+    ローカル代替(気象庁API・GCS・BigQuery)を起動・差し替え、終了時に元に戻して作業ディレクトリを消す
+    params
+        payloads: dict: {気象台コード: レスポンス}
+        faults: Faults: 遅延・失敗の注入
+        overrides: dict: config.yamlの上書き(parse_overridesの戻り値)
+    return
+        (LocalJMAServer, LocalGCS, LocalBigQuery, tmp_file_dir)
+    """
+    work_dir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    tmp_file_dir = os.path.join(work_dir, "tmp")
+    os.makedirs(tmp_file_dir)
+
+    os.environ["_ENV"] = "local"
+    os.environ["_PROJECT_ID"] = PROJECT_ID
+    os.environ["_BUCKET_NAME"] = BUCKET_NAME
+    read_yaml, forecast_url = files.read_yaml, weatherforcast.FORECAST_URL
+    install_config_overrides(overrides, tmp_file_dir)
+
+    jma = LocalJMAServer(payloads, faults)
+    local_gcs = LocalGCS(os.path.join(work_dir, "gcs"), faults)
+    local_bq = LocalBigQuery(local_gcs, list(payloads), faults)
+
+    jma.start()
+    local_gcs.install()
+    local_bq.install()
+    weatherforcast.FORECAST_URL = jma.forecast_url
+    try:
+        # 前の実行(同じプロセスでの別の計測)のキャッシュを持ち越さない
+        discard_caches(local_gcs, tmp_file_dir)
+        yield jma, local_gcs, local_bq, tmp_file_dir
+    finally:
+        local_bq.uninstall()
+        local_gcs.uninstall()
+        jma.stop()
+        files.read_yaml, weatherforcast.FORECAST_URL = read_yaml, forecast_url
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def run_once(timer: StageTimer, local_bq: LocalBigQuery, jma: LocalJMAServer) -> dict:
+    """main.mainを1回実行して計測結果をまとめる"""
+    timer.reset()
+    jma.stats = {}
+    loaded_before = sum(local_bq.loaded_rows.values())
+    written_before = sum(local_bq.written_rows().values())
+
+    started = time.perf_counter()
+    cloud_function.main({"data": base64.b64encode(b"bench")}, None)
+    wall_seconds = time.perf_counter() - started
+
+    return {
+        "wall_seconds": wall_seconds,
+        "stages": {
+            name: (timer.seconds[name], timer.calls[name])
+            for name in STAGES
+            if name in timer.calls
+        },
+        "jma": dict(sorted(jma.stats.items())),
+        "loaded_rows": sum(local_bq.loaded_rows.values()) - loaded_before,
+        "written_rows": sum(local_bq.written_rows().values()) - written_before,
+    }
+
+
+def report(run: int, result: dict):
+    print(
+        f"run {run}: wall {result['wall_seconds'] * 1000:9.1f} ms"
+        f"  jma {result['jma']}"
+        f"  loaded rows {result['loaded_rows']}"
+        f"  written rows {result['written_rows']}"
+    )
+    for name, (seconds, calls) in result["stages"].items():
+        print(f"{name:>40}: {seconds * 1000:9.1f} ms  x{calls}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--offices", type=int, default=None, help="気象台数(省略時は全件)"
+    )
+    parser.add_argument("--runs", type=int, default=3, help="実行回数")
+    parser.add_argument(
+        "--fresh", action="store_true", help="毎回キャッシュを捨てて全件取り込む"
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="config.yamlの上書き(例: load_mode=direct, http.retries=1)",
+    )
+    parser.add_argument(
+        "--fault",
+        action="append",
+        default=[],
+        metavar="ENDPOINT=SPEC",
+        help="遅延・失敗の注入(例: jma=latency=0.2,failure_rate=0.1)",
+    )
+    parser.add_argument("--verbose", action="store_true", help="サービスのログを出す")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    payloads = load_fixtures()
+    if args.offices is not None:
+        payloads = dict(list(payloads.items())[: args.offices])
+
+    faults = Faults(dict(fault.split("=", 1) for fault in args.fault))
+    with local_environment(payloads, faults, parse_overrides(args.set)) as env:
+        jma, local_gcs, local_bq, tmp_file_dir = env
+        timer = StageTimer()
+        for name in STAGES:
+            setattr(
+                weatherforcastservice,
+                name,
+                timer.wrap(name, getattr(weatherforcastservice, name)),
+            )
+
+        print(f"offices: {len(payloads)}, settings: {args.set}, faults: {args.fault}")
+        for run in range(1, args.runs + 1):
+            if args.fresh:
+                discard_caches(local_gcs, tmp_file_dir)
+            report(run, run_once(timer, local_bq, jma))
+        print(f"fault stats: {faults.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+取り込みに失敗したテーブルのみが次の実行で取り込み直されることの確認(応答キャッシュと取り込み済みレポート日時を併用)
+    bench_pipelineと同じローカル代替でmain.mainを3回実行する
+    1回目: 1テーブルの取り込みジョブを失敗させる
+    2回目: 失敗したテーブルに行のある気象台は304にならず取得し直し、失敗したテーブルのみ取り込み直す
+           (1回目に取り込めたテーブルは同じ区分でも取り込み直さない。append時に行が重複するため)
+    3回目: 全気象台が304で何も取り込まない
+report_watermarkを無効にした場合(応答キャッシュのみ)も、応答キャッシュに残した未取り込みのテーブルのみ取り込み直す
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.check_reimport
+    python -m benchmarks.check_reimport --table fewdays_weather --set load_mode=direct
+"""
+
+import argparse
+import base64
+import logging
+import sys
+
+import main as cloud_function
+
+from benchmarks.bench_pipeline import local_environment, parse_overrides
+from benchmarks.faults import Faults
+from benchmarks.fixtures import load_fixtures
+from utils import bq
+from utils import files
+
+
+def import_table_of(table_name: str) -> str:
+    """取り込み先(パーティションデコレータ付き・ステージングテーブルも可)の取り込みテーブル名"""
+    return table_name.split("$")[0].split("_staging_")[0]
+
+
+def fail_table_loads(failing: set):
+    """取り込みジョブの投入を取り込みテーブル名(import_table_name)がfailingに含まれる場合に失敗させる"""
+    start_file_to_table = bq.start_file_to_table
+    start_fileobj_to_table = bq.start_fileobj_to_table
+
+    def check(table_name: str):
+        if import_table_of(table_name) in failing:
+            raise RuntimeError(f"injected load failure: {table_name}")
+
+    def failing_file_to_table(*args, **kwargs):
+        check(kwargs["table_name"])
+        return start_file_to_table(*args, **kwargs)
+
+    def failing_fileobj_to_table(*args, **kwargs):
+        check(kwargs["table_name"])
+        return start_fileobj_to_table(*args, **kwargs)
+
+    bq.start_file_to_table = failing_file_to_table
+    bq.start_fileobj_to_table = failing_fileobj_to_table
+
+
+def run_once(local_bq, jma) -> tuple:
+    """main.mainを1回実行し、(ステータスコードごとの応答数, テーブル名ごとの取り込み行数)を返す"""
+    jma.stats = {}
+    loaded_before = dict(local_bq.loaded_rows)
+    cloud_function.main({"data": base64.b64encode(b"check")}, None)
+
+    loaded = {}
+    for table_id, rows in local_bq.loaded_rows.items():
+        name = import_table_of(table_id.rsplit(".", 1)[1])
+        loaded[name] = loaded.get(name, 0) + rows - loaded_before.get(table_id, 0)
+    return dict(jma.stats), {name: rows for name, rows in loaded.items() if rows > 0}
+
+
+def check(payloads: dict, table_name: str, overrides: dict) -> list[str]:
+    """
+    1つの設定で3回実行して確認する
+    params
+        payloads: dict: {気象台コード: レスポンス}
+        table_name: str: 1回目に取り込みを失敗させるテーブル名(config["import_data"]のキー)
+        overrides: dict: config.yamlの上書き
+    return
+        確認できなかった項目(空なら成功)
+    """
+    errors = []
+    with local_environment(payloads, Faults(), overrides) as env:
+        jma, local_gcs, local_bq, tmp_file_dir = env
+        config = files.read_yaml("yamls/config.yaml")
+        if config["load_mode"] == "storage_write":
+            raise ValueError("load_mode storage_write does not use load jobs")
+        import_table_names = {
+            name: data["import_table_name"]
+            for name, data in config["import_data"].items()
+        }
+        failing = import_table_names[table_name]
+
+        # 1回目: 失敗させたテーブル以外は取り込まれる
+        load_jobs = bq.start_file_to_table, bq.start_fileobj_to_table
+        fail_table_loads({failing})
+        try:
+            statuses, first = run_once(local_bq, jma)
+        finally:
+            bq.start_file_to_table, bq.start_fileobj_to_table = load_jobs
+        print(f"run 1: jma {statuses}, loaded {first}")
+        if failing in first:
+            errors.append(f"run 1: {failing} was loaded")
+
+        # 2回目: 失敗したテーブルに行のある気象台を取得し直して取り込み直す
+        statuses, second = run_once(local_bq, jma)
+        print(f"run 2: jma {statuses}, loaded {second}")
+        if statuses.get(200, 0) == 0:
+            errors.append("run 2: no office was fetched again (response cache saved)")
+        if failing not in second:
+            errors.append(f"run 2: {failing} was not re-imported")
+        for name in sorted(set(second) & set(first)):
+            errors.append(f"run 2: {name} was loaded again ({second[name]} rows)")
+
+        # 3回目: 全て取り込み済み
+        statuses, third = run_once(local_bq, jma)
+        print(f"run 3: jma {statuses}, loaded {third}")
+        if set(statuses) != {304}:
+            errors.append(f"run 3: responses {statuses} are not all 304")
+        if len(third) > 0:
+            errors.append(f"run 3: loaded {third}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--table",
+        default="week_temps",
+        help="1回目に取り込みを失敗させるテーブル(config.yamlのimport_dataのキー)",
+    )
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="config.yamlの上書き(例: load_mode=direct)",
+    )
+    parser.add_argument("--verbose", action="store_true", help="サービスのログを出す")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+
+    payloads = load_fixtures()
+    overrides = parse_overrides(args.set)
+    overrides[("response_cache", "enabled")] = True
+
+    errors = []
+    for watermark_enabled in (True, False):
+        print(f"report_watermark.enabled: {watermark_enabled}, settings: {args.set}")
+        overrides[("report_watermark", "enabled")] = watermark_enabled
+        errors += check(payloads, args.table, overrides)
+
+    for error in errors:
+        print(f"NG: {error}")
+    if len(errors) > 0:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+ローカル代替(localjma/localgcs/localbq)のエンドポイントごとの遅延・失敗の注入
+    書式: "latency=0.2,jitter=0.1,failure_rate=0.05"(秒, 秒, 0-1の割合)
+"""
+
+import random
+import threading
+import time
+
+
+class InjectedFailure(Exception):
+    """注入した失敗"""
+
+
+class Fault:
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        seed: int = 0,
+    ):
+
+        """
+        1エンドポイント分の遅延・失敗
+        params
+            latency: float: 1呼び出しごとの遅延(秒)
+            jitter: float: 遅延に加える揺らぎの最大値(秒。0からの一様乱数)
+            failure_rate: float: 失敗させる割合(0-1)
+            seed: int: 乱数シード
+
+        フィールド変数
+        self.latency: float
+        self.jitter: float
+        self.failure_rate: float
+        self.calls: int: 呼び出し回数
+        self.failures: int: 失敗させた回数
+        """
+
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.failures = 0
+        self.__random = random.Random(seed)
+        self.__lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str) -> "Fault":
+        """
+        "latency=0.2,failure_rate=0.05"の書式から生成
+        params
+            spec: str: 書式
+        return
+            Fault
+        """
+        values = {}
+        for item in filter(None, spec.split(",")):
+            key, value = item.split("=", 1)
+            values[key.strip()] = float(value)
+        return cls(**values)
+
+    def apply(self, endpoint: str):
+        """
+        遅延させ、失敗させる場合はInjectedFailureとする
+        params
+            endpoint: str: エンドポイント名(エラーメッセージ用)
+        """
+        with self.__lock:
+            self.calls += 1
+            delay = self.latency + self.__random.uniform(0, self.jitter)
+            failed = self.__random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+
+        if delay > 0:
+            time.sleep(delay)
+        if failed:
+            raise InjectedFailure(f"injected failure: {endpoint}")
+
+
+class Faults:
+    def __init__(self, specs: dict[str, str] = None):
+
+        """
+        エンドポイント名ごとのFault(指定のないエンドポイントは遅延・失敗なし)
+        params
+            specs: dict[str, str]: {エンドポイント名: Fault.parseの書式}
+
+        フィールド変数
+        self.faults: dict[str, Fault]
+        """
+
+        self.faults = {
+            endpoint: Fault.parse(spec) for endpoint, spec in (specs or {}).items()
+        }
+        self.__lock = threading.Lock()
+
+    def apply(self, endpoint: str):
+        """
+        エンドポイントの遅延・失敗を適用(呼び出し回数は指定のないエンドポイントも数える)
+        params
+            endpoint: str: エンドポイント名
+        """
+        with self.__lock:
+            fault = self.faults.setdefault(endpoint, Fault())
+        fault.apply(endpoint)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """エンドポイントごとの呼び出し回数・失敗回数"""
+        return {
+            endpoint: {"calls": fault.calls, "failures": fault.failures}
+            for endpoint, fault in sorted(self.faults.items())
+        }
@@ -0,0 +1,199 @@
+"""
+気象庁予報API(forecast/{area_code}.json)のレスポンスのフィクスチャ(全気象台分)
+    benchmarks/fixtures/forecast/{area_code}.json に1気象台1ファイルで保存する
+    作成方法(合成・記録)は benchmarks/fixtures/source.json に保存し、bench_parseのベースラインに記録する
+    --synthetic: payloads.pyの生成器で作る(オフラインで再現できる。既定のフィクスチャはこれで作成)
+    --record: 気象庁APIから実際のレスポンスを取得して保存する
+
+境界ケース(合成時)
+    内陸の気象台: 波(waves)がない
+    EMPTY_POPS_OFFICES: 週間予報の降水確率・信頼度が全て空文字
+    MISSING_RELIABILITIES_OFFICES: 週間予報の信頼度が空リスト(抽出時にその地方はエラーとして読み飛ばされる)
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.fixtures --synthetic
+    python -m benchmarks.fixtures --record
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+
+from typing import Any
+
+from benchmarks.payloads import JST, generate_payload
+from modules.weatherforcast import FORECAST_URL
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "forecast")
+SOURCE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "source.json")
+
+# 予報を発表する気象台(府県予報区)のコード
+OFFICE_CODES = [
+    "011000", "012000", "013000", "014030", "014100", "015000", "016000",
+    "017000", "020000", "030000", "040000", "050000", "060000", "070000",
+    "080000", "090000", "100000", "110000", "120000", "130000", "140000",
+    "150000", "160000", "170000", "180000", "190000", "200000", "210000",
+    "220000", "230000", "240000", "250000", "260000", "270000", "280000",
+    "290000", "300000", "310000", "320000", "330000", "340000", "350000",
+    "360000", "370000", "380000", "390000", "400000", "410000", "420000",
+    "430000", "440000", "450000", "460040", "460100", "471000", "472000",
+    "473000", "474000",
+]  # fmt: skip
+
+# 海に面していない(波の予報がない)気象台
+INLAND_OFFICES = {
+    "090000", "100000", "110000", "190000", "200000", "210000", "250000",
+    "290000",
+}  # fmt: skip
+
+# 週間予報の降水確率・信頼度が全て空文字の気象台(合成時)
+EMPTY_POPS_OFFICES = {"472000"}
+
+# 週間予報の信頼度が空リストの気象台(合成時)
+MISSING_RELIABILITIES_OFFICES = {"473000"}
+
+
+def synthesize_fixtures(seed: int = 0) -> dict[str, list[dict[str, Any]]]:
+    """
+    全気象台分のレスポンスを合成(境界ケースを含む)
+    params
+        seed: int: 乱数シード
+    return
+        {気象台コード: レスポンス}
+    """
+
+    rnd = random.Random(seed)
+    report_datetime = datetime.datetime(2021, 11, 20, 11, 0, 0, tzinfo=JST)
+
+    fixtures = {}
+    for area_code in OFFICE_CODES:
+        payload = generate_payload(
+            area_code=area_code,
+            report_datetime=report_datetime,
+            num_areas=rnd.randint(1, 7),
+            num_cities=rnd.randint(1, 5),
+            with_waves=area_code not in INLAND_OFFICES,
+            seed=seed,
+        )
+
+        week_areas = payload[1]["timeSeries"][0]["areas"]
+        if area_code in EMPTY_POPS_OFFICES:
+            for area in week_areas:
+                area["pops"] = [""] * len(area["pops"])
+                area["reliabilities"] = [""] * len(area["reliabilities"])
+        if area_code in MISSING_RELIABILITIES_OFFICES:
+            for area in week_areas:
+                area["reliabilities"] = []
+
+        fixtures[area_code] = payload
+    return fixtures
+
+
+def record_fixtures(timeout: float = 10) -> dict[str, list[dict[str, Any]]]:
+    """
+    気象庁APIから全気象台分のレスポンスを取得
+    params
+        timeout: float: リクエストのタイムアウト秒
+    return
+        {気象台コード: レスポンス}
+    """
+    import requests
+
+    fixtures = {}
+    with requests.Session() as session:
+        for area_code in OFFICE_CODES:
+            response = session.get(
+                FORECAST_URL.format(area_code=area_code), timeout=timeout
+            )
+            response.raise_for_status()
+            fixtures[area_code] = response.json()
+    return fixtures
+
+
+def save_fixtures(fixtures: dict[str, list[dict[str, Any]]], fixture_dir=FIXTURE_DIR):
+    """
+    フィクスチャを1気象台1ファイルで保存
+    params
+        fixtures: {気象台コード: レスポンス}
+        fixture_dir: 保存先ディレクトリ
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    for area_code, payload in fixtures.items():
+        with open(
+            os.path.join(fixture_dir, f"{area_code}.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+            f.write("\n")
+
+
+def save_fixture_source(source: dict[str, Any], source_path=SOURCE_PATH):
+    """
+    フィクスチャの作成方法を保存
+    params
+        source: dict[str, Any]: {"source": "synthetic"または"recorded", ...}
+        source_path: 保存先のパス
+    """
+    with open(source_path, "w", encoding="utf-8") as f:
+        json.dump(source, f, indent=2)
+        f.write("\n")
+
+
+def load_fixture_source(source_path=SOURCE_PATH) -> dict[str, Any]:
+    """
+    フィクスチャの作成方法を読み込む
+    params
+        source_path: 保存先のパス
+    return
+        {"source": "synthetic"または"recorded", ...}(保存されていなければ{"source": "unknown"})
+    """
+    if not os.path.exists(source_path):
+        return {"source": "unknown"}
+    with open(source_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_fixtures(fixture_dir=FIXTURE_DIR) -> dict[str, list[dict[str, Any]]]:
+    """
+    保存したフィクスチャを読み込む
+    params
+        fixture_dir: フィクスチャのディレクトリ
+    return
+        {気象台コード: レスポンス}(気象台コード順)
+    """
+    fixtures = {}
+    for filename in sorted(os.listdir(fixture_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(fixture_dir, filename), encoding="utf-8") as f:
+            fixtures[filename[: -len(".json")]] = json.load(f)
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--synthetic", action="store_true", help="合成して保存")
+    group.add_argument(
+        "--record", action="store_true", help="気象庁APIから取得して保存"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード(合成時)")
+    args = parser.parse_args()
+
+    if args.record:
+        fixtures = record_fixtures()
+        source = {
+            "source": "recorded",
+            "recorded_at": datetime.datetime.now(JST).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+    else:
+        fixtures = synthesize_fixtures(seed=args.seed)
+        source = {"source": "synthetic", "seed": args.seed}
+    save_fixtures(fixtures)
+    save_fixture_source(source)
+    print(f"saved {len(fixtures)} fixtures to {FIXTURE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
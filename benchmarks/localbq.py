@@ -0,0 +1,232 @@
+"""
+utils/bqのローカル代替(クエリ・取り込みジョブを記録するだけのシンク)
+    installでutils.bqのクエリ・取り込み関数とStorage Write APIのクライアントを差し替える
+    取り込みジョブは取り込み元のファイル(ローカル代替のGCSまたはメモリ上のファイル)の行数を数えて記録する
+    エンドポイント"bq.query", "bq.load", "bq.write"の遅延・失敗を注入できる(取り込みジョブは完了待ちで遅延させる)
+"""
+
+import csv
+import io
+import re
+import threading
+
+from benchmarks.faults import Faults, InjectedFailure
+from benchmarks.localbqwrite import LocalBigQueryWriteClient
+from utils import bq
+from utils import clients
+
+
+class Row:
+    def __init__(self, **values):
+        """クエリ結果の1行(列名の属性で値を参照する)"""
+        self.__dict__.update(values)
+
+
+class LocalJob:
+    def __init__(self, faults: Faults, endpoint: str, on_done=None):
+
+        """
+        完了待ち(result)で遅延・失敗を注入するジョブ
+        params
+            faults: Faults: 遅延・失敗の注入
+            endpoint: str: エンドポイント名
+            on_done: 完了時に呼ぶ関数
+        """
+
+        self.job_id = f"local-{id(self)}"
+        self.__faults = faults
+        self.__endpoint = endpoint
+        self.__on_done = on_done
+
+    def result(self):
+        self.__faults.apply(self.__endpoint)
+        if self.__on_done is not None:
+            self.__on_done()
+        return self
+
+
+class FaultyWriteClient(LocalBigQueryWriteClient):
+    def __init__(self, faults: Faults):
+        """書き込みストリームの作成時に遅延・失敗(エンドポイント"bq.write")を注入する"""
+        super().__init__()
+        self.__faults = faults
+
+    def create_write_stream(self, parent, write_stream):
+        self.__faults.apply("bq.write")
+        return super().create_write_stream(parent, write_stream)
+
+
+def count_rows(file_obj, source_format: str, skip_leading_rows: int) -> int:
+    """
+    取り込み元ファイルの行数
+    params
+        file_obj: バイナリモードのファイルオブジェクト
+        source_format: str: "CSV", "PARQUET", "AVRO"
+        skip_leading_rows: int: スキップ行数(CSVのみ)
+    return
+        行数
+    """
+    if source_format == "CSV":
+        reader = csv.reader(io.TextIOWrapper(file_obj, encoding="utf-8", newline=""))
+        return max(sum(1 for _ in reader) - skip_leading_rows, 0)
+    if source_format == "PARQUET":
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(file_obj).metadata.num_rows
+    import fastavro
+
+    return sum(1 for _ in fastavro.reader(file_obj))
+
+
+class LocalBigQuery:
+    def __init__(self, local_gcs, observatory_codes: list[str], faults: Faults = None):
+
+        """
+        クエリ・取り込みジョブを記録するutils/bqの代替
+        params
+            local_gcs: LocalGCS: gs://のURIを読むためのGCSの代替
+            observatory_codes: list[str]: 気象台コード一覧のクエリで返すコード
+            faults: Faults: 遅延・失敗の注入
+
+        フィールド変数
+        self.loaded_rows: dict[str, int]: テーブルIDごとの取り込んだ行数
+        self.queries: list[str]: 実行したクエリ
+        self.write_client: FaultyWriteClient: Storage Write APIの代替
+        """
+
+        self.local_gcs = local_gcs
+        self.observatory_codes = observatory_codes
+        self.faults = faults or Faults()
+        self.loaded_rows = {}
+        self.queries = []
+        self.write_client = FaultyWriteClient(self.faults)
+        self.__lock = threading.Lock()
+        self.__originals = {}
+
+    def install(self):
+        """utils.bqの関数とStorage Write APIのクライアントをこの代替に差し替える"""
+        for module, name in (
+            (bq, "exe_query"),
+            (bq, "start_file_to_table"),
+            (bq, "start_fileobj_to_table"),
+            (bq, "wait_load_job"),
+            (bq, "create_staging_table"),
+            (bq, "start_query"),
+            (bq, "wait_query_job"),
+            (bq, "delete_table"),
+            (clients, "get_bigquery_write_client"),
+        ):
+            self.__originals[(module, name)] = getattr(module, name)
+            setattr(module, name, getattr(self, name))
+
+    def uninstall(self):
+        """差し替えた関数を元に戻す"""
+        for (module, name), func in self.__originals.items():
+            setattr(module, name, func)
+        self.__originals = {}
+
+    def written_rows(self) -> dict[str, int]:
+        """Storage Write APIで反映された行数(テーブルパスごと)"""
+        return {
+            table_path: len(rows)
+            for table_path, rows in self.write_client.tables.items()
+        }
+
+    def get_bigquery_write_client(self):
+        return self.write_client
+
+    def exe_query(self, query: str):
+        with self.__lock:
+            self.queries.append(query)
+        try:
+            self.faults.apply("bq.query")
+        except InjectedFailure:
+            # utils.bq.exe_queryと同じく失敗時はNone
+            return None
+
+        if "m_meteorologicalobservatory" in query:
+            return [
+                Row(meteorological_observatory_code=code)
+                for code in self.observatory_codes
+            ]
+        if "partition_min" in query:
+            # ステージングテーブルのパーティション列の範囲(値は固定)
+            return [
+                Row(
+                    table_name=table_name,
+                    partition_min="2021-11-20 00:00:00",
+                    partition_max="2021-11-20 23:59:59",
+                )
+                for table_name in re.findall(r'"(\w+)" as table_name', query)
+            ]
+        return []
+
+    def __load_job(self, table_id: str, file_obj, source_format, skip_leading_rows):
+        rows = count_rows(file_obj, source_format, skip_leading_rows)
+
+        def on_done():
+            with self.__lock:
+                self.loaded_rows[table_id] = self.loaded_rows.get(table_id, 0) + rows
+
+        load_job = LocalJob(self.faults, "bq.load", on_done=on_done)
+        load_job.output_rows = rows
+        return load_job
+
+    def start_file_to_table(
+        self,
+        project_id: str,
+        dataset_name: str,
+        table_name: str,
+        table_schema_path: str,
+        source_file_uri: str,
+        skip_leading_rows: int = 1,
+        source_format: str = "CSV",
+        **kwargs,
+    ):
+        bucket_name, filepath = source_file_uri[len("gs://") :].split("/", 1)
+        with open(self.local_gcs.path(bucket_name, filepath), "rb") as f:
+            return self.__load_job(
+                f"{project_id}.{dataset_name}.{table_name}",
+                f,
+                source_format,
+                skip_leading_rows,
+            )
+
+    def start_fileobj_to_table(
+        self,
+        project_id: str,
+        dataset_name: str,
+        table_name: str,
+        table_schema_path: str,
+        file_obj,
+        skip_leading_rows: int = 1,
+        source_format: str = "CSV",
+        **kwargs,
+    ):
+        file_obj.seek(0)
+        data = io.BytesIO(file_obj.read())
+        file_obj.seek(0)
+        return self.__load_job(
+            f"{project_id}.{dataset_name}.{table_name}",
+            data,
+            source_format,
+            skip_leading_rows,
+        )
+
+    def wait_load_job(self, load_job):
+        load_job.result()
+        return load_job.output_rows
+
+    def create_staging_table(self, **kwargs):
+        self.faults.apply("bq.query")
+
+    def start_query(self, query: str):
+        with self.__lock:
+            self.queries.append(query)
+        return LocalJob(self.faults, "bq.query")
+
+    def wait_query_job(self, query_job):
+        query_job.result()
+
+    def delete_table(self, project_id, dataset_name, table_name, not_found_ok=True):
+        self.faults.apply("bq.query")
@@ -0,0 +1,198 @@
+"""
+BigQuery Storage Write APIのローカル代替(オフラインでbq.write_rows_to_tableを動かす)
+    LocalBigQueryWriteClient: BigQueryWriteClientと同じ呼び出し方で、書き込んだ行をメモリに保持する
+
+実行例(リポジトリのルートで)
+    python -m benchmarks.localbqwrite --offices 58 --stream-type PENDING
+    python -m benchmarks.localbqwrite --fail-table t_week_temps
+"""
+
+import argparse
+import datetime
+import threading
+import time
+
+from typing import Any, Callable, Optional
+
+from google.cloud.bigquery_storage_v1 import types
+from google.rpc import code_pb2, status_pb2
+
+from utils import bq
+
+# 行を検査する関数: (テーブル名, 行) -> エラーメッセージ(問題なければNone)
+RowValidator = Callable[[str, dict[str, Any]], Optional[str]]
+
+
+class LocalBigQueryWriteClient:
+    def __init__(self, row_validator: Optional[RowValidator] = None):
+        """
+        BigQueryWriteClientのローカル代替
+        行エラーのあるリクエストはBigQueryと同じくバッチごと書き込まない
+        params
+            row_validator: Optional[RowValidator]: 行エラーを起こすための検査関数
+
+        フィールド変数
+        self.row_validator: Optional[RowValidator]
+        self.streams: dict[str, dict]: ストリーム名ごとの状態
+        self.tables: dict[str, list[dict[str, Any]]]: テーブルパスごとの反映済みの行
+        """
+
+        self.row_validator = row_validator
+        self.streams = {}
+        self.tables = {}
+        self.__lock = threading.Lock()
+
+    def create_write_stream(self, parent: str, write_stream: types.WriteStream):
+        with self.__lock:
+            name = f"{parent}/streams/{len(self.streams)}"
+            self.streams[name] = {
+                "parent": parent,
+                "type": write_stream.type_,
+                "rows": [],
+                "finalized": False,
+            }
+        return types.WriteStream(name=name, type_=write_stream.type_)
+
+    def append_rows(self, requests, metadata=()):
+        stream = None
+        message_class = None
+        for request in requests:
+            if request.write_stream:
+                stream = self.streams[request.write_stream]
+            if "writer_schema" in request.proto_rows:
+                message_class = bq.to_proto_message_class(
+                    request.proto_rows.writer_schema.proto_descriptor
+                )
+            yield self.__append(stream, message_class, request)
+
+    def __append(self, stream: dict, message_class, request):
+        if stream["finalized"]:
+            return self.__error_response(code_pb2.FAILED_PRECONDITION, "finalized")
+        if request.offset is not None and request.offset != len(stream["rows"]):
+            return self.__error_response(
+                code_pb2.OUT_OF_RANGE,
+                f"offset {request.offset}, expected {len(stream['rows'])}",
+            )
+
+        table_name = stream["parent"].rsplit("/", 1)[1]
+        rows = []
+        row_errors = []
+        for index, serialized_row in enumerate(request.proto_rows.rows.serialized_rows):
+            message = message_class.FromString(serialized_row)
+            row = {field.name: value for field, value in message.ListFields()}
+            message = self.row_validator and self.row_validator(table_name, row)
+            if message:
+                row_errors.append(
+                    types.RowError(
+                        index=index,
+                        code=types.RowError.RowErrorCode.FIELDS_ERROR,
+                        message=message,
+                    )
+                )
+            rows.append(row)
+
+        if len(row_errors) > 0:
+            response = self.__error_response(code_pb2.INVALID_ARGUMENT, "row errors")
+            response.row_errors = row_errors
+            return response
+
+        with self.__lock:
+            offset = len(stream["rows"])
+            stream["rows"].extend(rows)
+            if stream["type"] == types.WriteStream.Type.COMMITTED:
+                self.tables.setdefault(stream["parent"], []).extend(rows)
+        return types.AppendRowsResponse(
+            append_result=types.AppendRowsResponse.AppendResult(offset=offset)
+        )
+
+    @staticmethod
+    def __error_response(code: int, message: str):
+        return types.AppendRowsResponse(
+            error=status_pb2.Status(code=code, message=message)
+        )
+
+    def finalize_write_stream(self, name: str):
+        stream = self.streams[name]
+        stream["finalized"] = True
+        return types.FinalizeWriteStreamResponse(row_count=len(stream["rows"]))
+
+    def batch_commit_write_streams(self, request: dict):
+        stream_errors = []
+        with self.__lock:
+            for name in request["write_streams"]:
+                stream = self.streams[name]
+                if not stream["finalized"]:
+                    stream_errors.append(
+                        types.StorageError(
+                            code=types.StorageError.StorageErrorCode.STREAM_NOT_FOUND,
+                            entity=name,
+                            error_message="stream is not finalized",
+                        )
+                    )
+                    continue
+                self.tables.setdefault(stream["parent"], []).extend(stream["rows"])
+        return types.BatchCommitWriteStreamsResponse(
+            commit_time=datetime.datetime.now(datetime.timezone.utc),
+            stream_errors=stream_errors,
+        )
+
+    def rows(self, project_id: str, dataset_name: str, table_name: str):
+        """反映済みの行"""
+        return self.tables.get(
+            f"projects/{project_id}/datasets/{dataset_name}/tables/{table_name}", []
+        )
+
+
+def main():
+    from benchmarks.bench_parse_concat import build_batched
+    from benchmarks.payloads import generate_payloads
+    from utils import files
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--offices", type=int, default=58, help="気象台数")
+    parser.add_argument("--stream-type", default="PENDING", help="PENDING/COMMITTED")
+    parser.add_argument("--batch-rows", type=int, default=500, help="1リクエストの行数")
+    parser.add_argument("--fail-table", default=None, help="行エラーを起こすテーブル名")
+    args = parser.parse_args()
+
+    config = files.read_yaml("yamls/config.yaml")
+    dataframes = build_batched(generate_payloads(num_offices=args.offices))
+
+    # 指定テーブルの最初の行をエラーにする
+    failed_tables = set()
+
+    def fail_first_row(table_name, row):
+        if table_name == args.fail_table and table_name not in failed_tables:
+            failed_tables.add(table_name)
+            return "injected error"
+        return None
+
+    client = LocalBigQueryWriteClient(row_validator=fail_first_row)
+
+    for table_name, data in config["import_data"].items():
+        df = dataframes[table_name]
+        start = time.perf_counter()
+        row_errors, unwritten_rows = bq.write_rows_to_table(
+            project_id="local",
+            dataset_name=config["import_datasetname"],
+            table_name=data["import_table_name"],
+            table_schema_path=data["table_schema_path"],
+            df=df,
+            stream_type=args.stream_type,
+            batch_rows=args.batch_rows,
+            write_client=client,
+        )
+        elapsed = time.perf_counter() - start
+        written = client.rows(
+            "local", config["import_datasetname"], data["import_table_name"]
+        )
+        print(
+            f"{data['import_table_name']:>24}: {len(df):6d} rows"
+            f"  written {len(written):6d}  not written {len(unwritten_rows):6d}"
+            f"  row errors {len(row_errors):3d}"
+            f"  {elapsed * 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+utils/gcsのローカル代替(バケットをローカルディレクトリに置く)
+    installでutils.gcsの関数を差し替え、サービス・files経由の読み書きをローカルファイルにする
+    エンドポイント"gcs.download", "gcs.upload", "gcs.delete", "gcs.copy", "gcs.list"の遅延・失敗を注入できる
+    バッチリクエスト(batch_*)は1回のリクエストとして1度だけ注入する
+"""
+
+import os
+import shutil
+import uuid
+
+from typing import Callable, Optional
+
+from benchmarks.faults import Faults
+from utils import gcs
+
+
+class LocalBlobWriter:
+    def __init__(self, path: str, mode: str, on_close: Callable[[], None]):
+
+        """
+        一時ファイルに書き込み、closeで宛先に置き換えるファイルオブジェクト
+        (GCSと同じく書き込み完了まで宛先には現れない)
+        params
+            path: str: 宛先のパス
+            mode: str: "wb": バイナリ, "wt": テキスト(utf-8)
+            on_close: Callable[[], None]: 置き換える前に呼ぶ関数(遅延・失敗の注入)
+        """
+
+        self.path = path
+        self.__tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self.__on_close = on_close
+        if mode == "wt":
+            self.__file = open(self.__tmp_path, "w", encoding="utf-8", newline="")
+        else:
+            self.__file = open(self.__tmp_path, "wb")
+
+    def __getattr__(self, name):
+        return getattr(self.__file, name)
+
+    def write(self, data):
+        return self.__file.write(data)
+
+    def close(self):
+        if self.__file.closed:
+            return
+        self.__file.close()
+        try:
+            self.__on_close()
+        except Exception:
+            os.remove(self.__tmp_path)
+            raise
+        os.replace(self.__tmp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+            return
+        # 書き込みに失敗した場合は宛先に置かない
+        self.__file.close()
+        os.remove(self.__tmp_path)
+
+
+class LocalGCS:
+    def __init__(self, root_dir: str, faults: Faults = None):
+
+        """
+        バケットをroot_dir/{バケット名}に置くutils/gcsの代替
+        params
+            root_dir: str: バケットを置くディレクトリ
+            faults: Faults: 遅延・失敗の注入
+
+        フィールド変数
+        self.root_dir: str
+        self.faults: Faults
+        """
+
+        self.root_dir = root_dir
+        self.faults = faults or Faults()
+        self.__originals = {}
+
+    def path(self, bucket_name: str, filepath: str) -> str:
+        """オブジェクトのローカルパス"""
+        return os.path.join(self.root_dir, bucket_name, filepath)
+
+    def install(self):
+        """utils.gcsの関数をこの代替に差し替える"""
+        for name in (
+            "from_gcs",
+            "to_gcs",
+            "download_as_text",
+            "upload_from_string",
+            "upload_from_file",
+            "open_blob_writer",
+            "delete_blob",
+            "parallel_delete_blobs",
+            "batch_copy_blobs",
+            "batch_move_blobs",
+            "find_objects",
+        ):
+            self.__originals[name] = getattr(gcs, name)
+            setattr(gcs, name, getattr(self, name))
+
+    def uninstall(self):
+        """utils.gcsの関数を元に戻す"""
+        for name, func in self.__originals.items():
+            setattr(gcs, name, func)
+        self.__originals = {}
+
+    def __prepare(self, bucket_name: str, filepath: str) -> str:
+        path = self.path(bucket_name, filepath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def from_gcs(self, bucket_name: str, filepath: str, download_path: str):
+        self.faults.apply("gcs.download")
+        shutil.copyfile(self.path(bucket_name, filepath), download_path)
+
+    def to_gcs(self, bucket_name: str, filepath: str, upload_path: str):
+        self.faults.apply("gcs.upload")
+        shutil.copyfile(upload_path, self.__prepare(bucket_name, filepath))
+
+    def download_as_text(self, bucket_name: str, filepath: str) -> Optional[str]:
+        self.faults.apply("gcs.download")
+        path = self.path(bucket_name, filepath)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def upload_from_string(
+        self,
+        bucket_name: str,
+        filepath: str,
+        data: str,
+        content_type: str = "text/plain",
+    ):
+        self.faults.apply("gcs.upload")
+        with open(self.__prepare(bucket_name, filepath), "w", encoding="utf-8") as f:
+            f.write(data)
+
+    def upload_from_file(self, bucket_name: str, filepath: str, file_obj):
+        self.faults.apply("gcs.upload")
+        file_obj.seek(0)
+        with open(self.__prepare(bucket_name, filepath), "wb") as f:
+            shutil.copyfileobj(file_obj, f)
+
+    def open_blob_writer(self, bucket_name: str, filepath: str, mode: str = "wb"):
+        return LocalBlobWriter(
+            self.__prepare(bucket_name, filepath),
+            mode,
+            on_close=lambda: self.faults.apply("gcs.upload"),
+        )
+
+    def delete_blob(self, bucket_name, blob_name):
+        self.faults.apply("gcs.delete")
+        self.__delete(bucket_name, blob_name)
+
+    def __delete(self, bucket_name: str, blob_name: str):
+        path = self.path(bucket_name, blob_name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def parallel_delete_blobs(
+        self, bucket_name: str, blob_names: list[str], max_workers: int = 8
+    ):
+        if len(blob_names) == 0:
+            return
+        self.faults.apply("gcs.delete")
+        for blob_name in blob_names:
+            self.__delete(bucket_name, blob_name)
+
+    def batch_copy_blobs(
+        self,
+        bucket_name: str,
+        blob_names: list[str],
+        destination_bucket_name: str,
+        destination_blob_names: Optional[list[str]] = None,
+    ):
+        if len(blob_names) == 0:
+            return
+        self.faults.apply("gcs.copy")
+        for blob_name, destination_blob_name in zip(
+            blob_names, destination_blob_names or blob_names
+        ):
+            source = self.path(bucket_name, blob_name)
+            if os.path.exists(source):
+                shutil.copyfile(
+                    source,
+                    self.__prepare(destination_bucket_name, destination_blob_name),
+                )
+
+    def batch_move_blobs(
+        self,
+        bucket_name: str,
+        blob_names: list[str],
+        destination_bucket_name: str,
+        destination_blob_names: Optional[list[str]] = None,
+    ):
+        self.batch_copy_blobs(
+            bucket_name, blob_names, destination_bucket_name, destination_blob_names
+        )
+        self.parallel_delete_blobs(bucket_name, blob_names)
+
+    def find_objects(self, bucket_name: str, prefix: str) -> list[str]:
+        self.faults.apply("gcs.list")
+        bucket_dir = os.path.join(self.root_dir, bucket_name)
+        names = []
+        for dirpath, _, filenames in os.walk(bucket_dir):
+            for filename in filenames:
+                if filename.endswith(".tmp"):
+                    continue
+                name = os.path.relpath(os.path.join(dirpath, filename), bucket_dir)
+                name = name.replace(os.sep, "/")
+                if name.startswith(prefix):
+                    names.append(name)
+        return sorted(names)
@@ -0,0 +1,110 @@
+"""
+気象庁予報APIのローカル代替(記録したレスポンスを返すHTTPサーバ)
+    /bosai/forecast/data/forecast/{area_code}.json にフィクスチャを返す
+    ETagによる条件付きリクエスト(304)に対応し、エンドポイント"jma"の遅延・失敗(503)を注入できる
+"""
+
+import hashlib
+import json
+import re
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from benchmarks.faults import Faults, InjectedFailure
+
+FORECAST_PATH = re.compile(r"^/bosai/forecast/data/forecast/(\d+)\.json$")
+
+
+class LocalJMAServer:
+    def __init__(self, payloads: dict[str, Any], faults: Faults = None):
+
+        """
+        フィクスチャを返すHTTPサーバ(startで別スレッドで起動)
+        params
+            payloads: dict[str, Any]: {気象台コード: レスポンス}
+            faults: Faults: 遅延・失敗の注入(エンドポイント名"jma")
+
+        フィールド変数
+        self.bodies: dict[str, tuple[bytes, str]]: {気象台コード: (本文, ETag)}
+        self.faults: Faults
+        self.stats: dict[str, int]: ステータスコードごとの応答数
+        """
+
+        self.bodies = {}
+        for area_code, payload in payloads.items():
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.bodies[area_code] = (body, f'"{hashlib.md5(body).hexdigest()}"')
+        self.faults = faults or Faults()
+        self.stats = {}
+        self.__stats_lock = threading.Lock()
+        self.__server = None
+        self.__thread = None
+
+    @property
+    def forecast_url(self) -> str:
+        """modules.weatherforcast.FORECAST_URLと同じ書式のURL"""
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}/bosai/forecast/data/forecast/{{area_code}}.json"
+
+    def start(self):
+        """空いているポートで起動"""
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler_class())
+        self.__server.daemon_threads = True
+        self.__thread = threading.Thread(
+            target=self.__server.serve_forever, daemon=True
+        )
+        self.__thread.start()
+
+    def stop(self):
+        """停止"""
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__server = None
+
+    def record_response(self, status: int):
+        """応答したステータスコードを数える"""
+        with self.__stats_lock:
+            self.stats[status] = self.stats.get(status, 0) + 1
+
+    def __handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                match = FORECAST_PATH.match(self.path)
+                if match is None or match.group(1) not in server.bodies:
+                    return self.__respond(404)
+
+                try:
+                    server.faults.apply("jma")
+                except InjectedFailure:
+                    return self.__respond(503)
+
+                body, etag = server.bodies[match.group(1)]
+                if self.headers.get("If-None-Match") == etag:
+                    return self.__respond(304, headers={"ETag": etag})
+                return self.__respond(
+                    200,
+                    body=body,
+                    headers={"ETag": etag, "Content-Type": "application/json"},
+                )
+
+            def __respond(self, status: int, body: bytes = b"", headers=None):
+                server.record_response(status)
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # アクセスログは出さない
+                pass
+
+        return Handler
@@ -0,0 +1,204 @@
+"""
+ベンチマーク用に気象庁予報API(forecast/{area_code}.json)と同じ構造のレスポンスを生成する
+"""
+
+import random
+import datetime
+
+from typing import Any
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+
+def _iso(dt: datetime.datetime) -> str:
+    return dt.isoformat(timespec="seconds")
+
+
+def _temps(rnd: random.Random, days: int, blank_first: bool = True) -> list[str]:
+    values = [str(rnd.randint(-5, 30)) for _ in range(days)]
+    if blank_first:
+        values[0] = ""
+    return values
+
+
+def generate_payload(
+    area_code: str,
+    report_datetime: datetime.datetime,
+    num_areas: int = 3,
+    num_cities: int = 2,
+    with_waves: bool = True,
+    seed: int = 0,
+) -> list[dict[str, Any]]:
+    """
+    1気象台分の予報レスポンスを生成
+    params
+        area_code: str: 気象台コード
+        report_datetime: datetime.datetime: 気象情報レポート日時(JST)
+        num_areas: int: 地方(予報区)数
+        num_cities: int: 代表都市数
+        with_waves: bool: 波の予報を含めるか(内陸の気象台は含まれない)
+        seed: int: 乱数シード
+    return
+        予報APIのレスポンスをjsonとして読み込んだもの
+    """
+
+    rnd = random.Random(f"{area_code}-{seed}")
+    office = f"{area_code}気象台"
+    today = report_datetime.replace(hour=0, minute=0, second=0)
+    days = [today + datetime.timedelta(days=i) for i in range(8)]
+
+    areas = [
+        {"name": f"{office}地方{i}", "code": f"{area_code[:4]}{i:02d}"}
+        for i in range(num_areas)
+    ]
+    cities = [
+        {"name": f"{office}都市{i}", "code": f"{area_code[:2]}{i:03d}"}
+        for i in range(num_cities)
+    ]
+
+    fewdays_areas = []
+    for area in areas:
+        fewdays_area = {
+            "area": area,
+            "weatherCodes": [
+                rnd.choice(["100", "101", "200", "300"]) for _ in range(3)
+            ],
+            "weathers": [
+                rnd.choice(["晴れ", "くもり", "雨", "晴れ 時々 くもり"])
+                for _ in range(3)
+            ],
+            "winds": [
+                rnd.choice(["北の風", "南の風 やや強く", "西の風"]) for _ in range(3)
+            ],
+        }
+        if with_waves:
+            fewdays_area["waves"] = [
+                rnd.choice(["0.5メートル", "1メートル"]) for _ in range(3)
+            ]
+        fewdays_areas.append(fewdays_area)
+
+    return [
+        {
+            "publishingOffice": office,
+            "reportDatetime": _iso(report_datetime),
+            "timeSeries": [
+                {
+                    "timeDefines": [
+                        _iso(report_datetime),
+                        _iso(days[1]),
+                        _iso(days[2]),
+                    ],
+                    "areas": fewdays_areas,
+                },
+                {
+                    "timeDefines": [
+                        _iso(today + datetime.timedelta(hours=h))
+                        for h in (12, 24, 30, 36, 42)
+                    ],
+                    "areas": [
+                        {
+                            "area": area,
+                            "pops": [str(rnd.randint(0, 10) * 10) for _ in range(5)],
+                        }
+                        for area in areas
+                    ],
+                },
+                {
+                    "timeDefines": [
+                        _iso(days[1]),
+                        _iso(days[1] + datetime.timedelta(hours=9)),
+                    ],
+                    "areas": [
+                        {"area": city, "temps": _temps(rnd, 2, blank_first=False)}
+                        for city in cities
+                    ],
+                },
+            ],
+        },
+        {
+            "publishingOffice": office,
+            "reportDatetime": _iso(report_datetime),
+            "timeSeries": [
+                {
+                    "timeDefines": [_iso(day) for day in days[1:]],
+                    "areas": [
+                        {
+                            "area": area,
+                            "weatherCodes": [
+                                rnd.choice(["100", "101", "200"]) for _ in range(7)
+                            ],
+                            "pops": [""]
+                            + [str(rnd.randint(0, 10) * 10) for _ in range(6)],
+                            "reliabilities": ["", ""]
+                            + [rnd.choice("ABC") for _ in range(5)],
+                        }
+                        for area in areas
+                    ],
+                },
+                {
+                    "timeDefines": [_iso(day) for day in days[1:]],
+                    "areas": [
+                        {
+                            "area": city,
+                            "tempsMin": _temps(rnd, 7),
+                            "tempsMinUpper": _temps(rnd, 7),
+                            "tempsMinLower": _temps(rnd, 7),
+                            "tempsMax": _temps(rnd, 7),
+                            "tempsMaxUpper": _temps(rnd, 7),
+                            "tempsMaxLower": _temps(rnd, 7),
+                        }
+                        for city in cities
+                    ],
+                },
+            ],
+            "tempAverage": {
+                "areas": [
+                    {
+                        "area": city,
+                        "min": f"{rnd.uniform(-5, 20):.1f}",
+                        "max": f"{rnd.uniform(5, 30):.1f}",
+                    }
+                    for city in cities
+                ]
+            },
+            "precipAverage": {
+                "areas": [
+                    {
+                        "area": city,
+                        "min": str(rnd.randint(0, 20)),
+                        "max": str(rnd.randint(20, 80)),
+                    }
+                    for city in cities
+                ]
+            },
+        },
+    ]
+
+
+def generate_payloads(
+    num_offices: int = 58, seed: int = 0
+) -> dict[str, list[dict[str, Any]]]:
+    """
+    複数気象台分の予報レスポンスを生成
+    params
+        num_offices: int: 気象台数(実運用は58前後)
+        seed: int: 乱数シード
+    return
+        {気象台コード: レスポンス}
+    """
+
+    rnd = random.Random(seed)
+    report_datetime = datetime.datetime(2021, 11, 20, 11, 0, 0, tzinfo=JST)
+
+    payloads = {}
+    for i in range(num_offices):
+        area_code = f"{(i + 1) * 10000 + 10000:06d}"
+        payloads[area_code] = generate_payload(
+            area_code=area_code,
+            report_datetime=report_datetime,
+            num_areas=rnd.randint(1, 7),
+            num_cities=rnd.randint(1, 5),
+            with_waves=rnd.random() < 0.7,
+            seed=seed,
+        )
+    return payloads
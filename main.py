@@ -1,10 +1,78 @@
+import time
+
+# コールドスタート計測用(このモジュールの読み込み開始時刻)
+_import_started = time.perf_counter()
+
+import os
+import json
 import base64
 import logging
 
 from services import weatherforcastservice
 
+from utils import decorator
+from utils import metrics
 from utils.logger import setup_logger
 
+# このモジュールの読み込みにかかった秒数(インスタンス起動時に1度だけ)
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
+# インスタンス起動後の最初の実行か
+_cold_start = True
+
+
+def profile_requested(pubsub_message: str) -> bool:
+    """
+    この実行をプロファイリングするか
+    Pub/Subメッセージが{"profile": true}のJSON、または環境変数 _PROFILE が "1"/"true" の場合
+    """
+    if os.environ.get("_PROFILE", "").lower() in ("1", "true"):
+        return True
+    try:
+        payload = json.loads(pubsub_message)
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and payload.get("profile") is True
+
+
+def report_run(logger: logging.Logger, started: float, succeeded: bool, profiler):
+    """
+    実行のまとめをログに出力し、メトリクスとプロファイリング結果を出力する
+    Args
+        logger: mainのlogger
+        started: float: 実行開始時刻(time.perf_counter)
+        succeeded: bool: 取り込みまで成功したか
+        profiler: RunProfiler(プロファイリングしない場合はNone)
+    """
+    global _cold_start
+
+    # コールドスタート時はモジュール読み込みと初回実行(遅延importを含む)の時間を記録
+    if _cold_start:
+        logger.info(
+            f"cold start: import {IMPORT_SECONDS * 1000:.0f} ms,"
+            f" first run {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+
+    # 実行のまとめを1件の構造化ログとして出力(jsonPayload.run_summary)
+    summary = decorator.finish_run()
+    summary["succeeded"] = succeeded
+    summary["cold_start"] = _cold_start
+    logger.info(
+        f"run summary: {summary['seconds'] * 1000:.0f} ms",
+        extra={"json_fields": {"run_summary": summary}},
+    )
+    _cold_start = False
+
+    # 実行のメトリクスを出力
+    weatherforcastservice.export_run_metrics()
+
+    # プロファイリング結果をアップロード(失敗しても取り込みには影響しないのでログのみ)
+    if profiler is not None:
+        try:
+            weatherforcastservice.upload_profile(profiler=profiler)
+        except Exception:
+            logger.exception("failed to upload profile")
+
 
 def main(event, context):
     """Triggered from a message on a Cloud Pub/Sub topic.
@@ -12,32 +80,61 @@ def main(event, context):
          event (dict): Event payload.
          context (google.cloud.functions.Context): Metadata for the event.
     """
+    started = time.perf_counter()
+
     pubsub_message = base64.b64decode(event["data"]).decode("utf-8")
-    # ただのトリガーなのでpubsumメッセージ内容は無視
+    # ただのトリガーなのでpubsumメッセージ内容はプロファイリングの指定以外は無視
 
     # loggerの設定
     setup_logger()
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
 
+    # 段階ごとの区間(時間・行数・バイト数)の記録を開始
+    decorator.start_run()
+    # メトリクスは1回の実行分を出力する
+    metrics.registry.reset()
+
+    # 指定された場合のみこの実行をプロファイリング(取り込みまで)
+    profiler = None
+    if profile_requested(pubsub_message):
+        profiler = weatherforcastservice.start_profile()
+    succeeded = False
+
     try:
         # 全気象台分リクエスト実行しローカルにcsv出力→ GCSアップロード
-        weatherforcastservice.request_weather_forecast()
+        table_names = weatherforcastservice.request_weather_forecast()
 
-        # 出力したCSVファイルをBigQueryへinsert
-        weatherforcastservice.gcsweatherforecastfiles_to_bqtable()
+        # 出力したCSVファイルをBigQueryへinsert(更新がなければファイルもないのでスキップ)
+        if len(table_names) > 0:
+            weatherforcastservice.gcsweatherforecastfiles_to_bqtable(
+                table_names=table_names
+            )
 
         logger.info("[completed] tenmado-load")
+        succeeded = True
 
     except Exception as e:
 
         logger.exception("tenmado-load error")
 
+        # 取り込めなかった予報を次回取得し直せるようレスポンスキャッシュを破棄
+        weatherforcastservice.clear_response_cache()
+
     finally:
-        # ローカルcsvを削除
-        weatherforcastservice.delete_localweatherforecastfiles()
+        # プロファイリングを終了(後片付けは計測しない。失敗しても後片付けは行う)
+        try:
+            if profiler is not None:
+                profiler.stop()
+        finally:
+            try:
+                # ローカルcsvを削除
+                weatherforcastservice.delete_localweatherforecastfiles()
 
-        # GCSのcsvを削除
-        weatherforcastservice.delete_insertedgcsweatherforecastfiles()
+                # GCSのcsvを削除
+                weatherforcastservice.delete_insertedgcsweatherforecastfiles()
+            finally:
+                # 後片付けに失敗しても実行のまとめ・メトリクスは出力する
+                report_run(logger, started, succeeded, profiler)
 
     return
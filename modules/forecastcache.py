@@ -0,0 +1,210 @@
+import os
+import json
+import logging
+import threading
+
+from typing import Any, Optional
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ForecastResponseCache:
+    def __init__(self, cache_dir: str):
+
+        """
+        気象台コードごとに予報APIレスポンスの検証子(ETag/Last-Modified)と本文を保存するキャッシュ
+        条件付きリクエスト(If-None-Match/If-Modified-Since)に使う
+        取得したレスポンスは取り込み待ち(stage)として保持し、取り込み後に確定(commit)して保存する
+        取り込みに失敗したテーブルのある気象台は未取り込みのテーブル(pending_tables)を付けて保存し、
+        次回は条件付きリクエストにせず取得し直す(304となり取り込み直せないため)
+        params
+            cache_dir: str: キャッシュファイルを置くディレクトリ
+
+        フィールド変数
+        self.cache_dir: str
+        self.pending: dict[str, dict[str, Any]]: 今回の実行で取り込み中の気象台のレスポンス
+        """
+
+        self.cache_dir = cache_dir
+        self.pending = {}
+        self.__lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __cache_path(self, area_code: str) -> str:
+        return f"{self.cache_dir}/{area_code}.json"
+
+    def load(self, area_code: str) -> Optional[dict[str, Any]]:
+        """
+        キャッシュを読み込む
+        params
+            area_code: str: 気象台コード
+        return
+            {"etag": str, "last_modified": str, "body": str, "pending_tables": list[str]} (キャッシュがなければNone)
+        """
+
+        cache_path = self.__cache_path(area_code)
+        if not os.path.exists(cache_path):
+            return None
+
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            # 壊れたキャッシュは無いものとして扱う
+            logger.warning(f"broken response cache: {cache_path}")
+            return None
+
+    def save(
+        self,
+        area_code: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        body: str,
+        pending_tables: Optional[list[str]] = None,
+    ):
+        """
+        キャッシュを保存する
+        params
+            area_code: str: 気象台コード
+            etag: Optional[str]: レスポンスのETagヘッダ
+            last_modified: Optional[str]: レスポンスのLast-Modifiedヘッダ
+            body: str: レスポンス本文
+            pending_tables: Optional[list[str]]: このレスポンスの行を取り込めていないテーブル名
+        """
+
+        cache_path = self.__cache_path(area_code)
+        tmp_path = f"{cache_path}.tmp"
+
+        # 書き込み途中のファイルを読まないよう一時ファイルから置き換える
+        with open(tmp_path, mode="w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "etag": etag,
+                    "last_modified": last_modified,
+                    "body": body,
+                    "pending_tables": pending_tables or [],
+                },
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, cache_path)
+
+    def stage(
+        self,
+        area_code: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        body: str,
+        table_names: list[str],
+    ):
+        """
+        取り込み中のレスポンスとして登録(commitするまで保存しない)
+        params
+            area_code: str: 気象台コード
+            etag: Optional[str]: レスポンスのETagヘッダ
+            last_modified: Optional[str]: レスポンスのLast-Modifiedヘッダ
+            body: str: レスポンス本文
+            table_names: list[str]: この気象台の行を取り込むテーブル名
+        """
+        with self.__lock:
+            self.pending[area_code] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "body": body,
+                "table_names": set(table_names),
+                "rejected": set(),
+            }
+
+    def reject(self, table_name: str) -> list[str]:
+        """
+        テーブルの取り込みに失敗したとして、そのテーブルに行を取り込む気象台の未取り込みのテーブルにする
+        params
+            table_name: str: テーブル名
+        return
+            そのテーブルに行を取り込む気象台コード
+        """
+        with self.__lock:
+            rejected = [
+                area_code
+                for area_code, item in self.pending.items()
+                if table_name in item["table_names"]
+            ]
+            for area_code in rejected:
+                self.pending[area_code]["rejected"].add(table_name)
+        return rejected
+
+    def commit(self):
+        """
+        取り込み中のレスポンスのキャッシュを保存する(取り込みに失敗したテーブルはpending_tablesに残す)
+        """
+        with self.__lock:
+            pending = self.pending
+            self.pending = {}
+
+        for area_code, item in pending.items():
+            self.save(
+                area_code=area_code,
+                etag=item["etag"],
+                last_modified=item["last_modified"],
+                body=item["body"],
+                pending_tables=sorted(item["rejected"]),
+            )
+        incomplete = sum(1 for item in pending.values() if len(item["rejected"]) > 0)
+        logger.info(
+            f"saved response cache of {len(pending)} observatories"
+            f" ({incomplete} with pending tables)"
+        )
+
+    def discard(self):
+        """取り込み中のレスポンスを破棄(前回の実行が途中で失敗した場合など)"""
+        with self.__lock:
+            self.pending = {}
+
+    def conditional_headers(self, area_code: str) -> dict[str, str]:
+        """
+        条件付きリクエスト用のヘッダを作成
+        params
+            area_code: str: 気象台コード
+        return
+            リクエストヘッダ(キャッシュがない、または未取り込みのテーブルがあれば空)
+        """
+
+        cache = self.load(area_code)
+        if cache is None or len(cache.get("pending_tables", [])) > 0:
+            return {}
+
+        headers = {}
+        if cache.get("etag"):
+            headers["If-None-Match"] = cache["etag"]
+        if cache.get("last_modified"):
+            headers["If-Modified-Since"] = cache["last_modified"]
+
+        return headers
+
+    def pending_tables(self, area_code: str, body: str) -> Optional[list[str]]:
+        """
+        前回と同じレスポンスの場合に、まだ取り込めていないテーブル
+        params
+            area_code: str: 気象台コード
+            body: str: 今回のレスポンス本文
+        return
+            未取り込みのテーブル名(全て取り込み済みなら空。キャッシュがない、またはレスポンスが更新されていればNone)
+        """
+
+        cache = self.load(area_code)
+        if cache is None or cache["body"] != body:
+            return None
+        return list(cache.get("pending_tables", []))
+
+    def clear(self):
+        """
+        キャッシュを全削除する(次回は全気象台を取得し直す)
+        """
+
+        self.discard()
+
+        for filename in os.listdir(self.cache_dir):
+            os.remove(f"{self.cache_dir}/{filename}")
+        logger.info(f"cleared response cache: {self.cache_dir}")
@@ -0,0 +1,318 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+from typing import Any
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+# 各テーブルの列(出力順)
+TABLE_COLUMNS: dict[str, list[str]] = {
+    "fewdays_weather": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "area_code",
+        "area_name",
+        "forecast_target_date",
+        "weather_code",
+        "weather",
+        "winds",
+        "waves",
+    ],
+    "tomorrow_pops": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "area_code",
+        "area_name",
+        "forecast_target_date",
+        "pops0006",
+        "pops0612",
+        "pops1218",
+        "pops1824",
+    ],
+    "tomorrow_temps": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "city_code",
+        "city_name",
+        "forecast_target_date",
+        "lowest_temperature",
+        "highest_temperature",
+    ],
+    "week_weather": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "area_code",
+        "area_name",
+        "forecast_target_date",
+        "weather_code",
+        "pop",
+        "reliability",
+    ],
+    "week_temps": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "city_code",
+        "city_name",
+        "forecast_target_date",
+        "lowest_temperature",
+        "lowest_temperature_upper",
+        "lowest_temperature_lower",
+        "highest_temperature",
+        "highest_temperature_upper",
+        "highest_temperature_lower",
+    ],
+    "past_tempavg": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "city_code",
+        "city_name",
+        "lowest_temperature",
+        "highest_temperature",
+    ],
+    "past_precopitationavg": [
+        "get_datetime",
+        "report_datetime",
+        "meteorological_observatory_name",
+        "city_code",
+        "city_name",
+        "precopitation_min",
+        "precopitation_max",
+    ],
+}
+
+# 辞書符号化(カテゴリ型)で持つ列
+# 気象台ごとに同じ値の列や、週間予報で7日分繰り返される列
+CATEGORY_COLUMNS = [
+    "get_datetime",
+    "report_datetime",
+    "meteorological_observatory_name",
+    "area_code",
+    "area_name",
+    "city_code",
+    "city_name",
+    "forecast_target_date",
+]
+
+# 予報日時("%Y-%m-%dT%H:%M:%S%z")から日付("%Y-%m-%d")に変換する列(CATEGORY_COLUMNSに含める)
+DATE_COLUMNS = ["forecast_target_date"]
+
+
+class ColumnBuffer:
+    def __init__(self, capacity: int = 1024, dtype=object):
+        """
+        事前確保した配列に値を追記していく列バッファ
+        容量が足りなくなったら倍に拡張する
+        params
+            capacity: int: 初期容量(行数)
+            dtype: 配列の型
+
+        フィールド変数
+        self.values: np.ndarray
+        self.size: int
+        """
+
+        self.values = np.empty(max(capacity, 1), dtype=dtype)
+        self.size = 0
+
+    def __reserve(self, n: int):
+        required = self.size + n
+        if required <= len(self.values):
+            return
+
+        capacity = len(self.values)
+        while capacity < required:
+            capacity *= 2
+        values = np.empty(capacity, dtype=self.values.dtype)
+        values[: self.size] = self.values[: self.size]
+        self.values = values
+
+    def extend(self, values: list[Any]):
+        """
+        値を追記
+        params
+            values: list[Any]: 追記する値
+        """
+        n = len(values)
+        self.__reserve(n)
+        self.values[self.size : self.size + n] = values
+        self.size += n
+
+    def fill(self, value: Any, n: int):
+        """
+        同じ値をn行分追記
+        params
+            value: Any: 追記する値
+            n: int: 行数
+        """
+        self.__reserve(n)
+        self.values[self.size : self.size + n] = value
+        self.size += n
+
+    def to_array(self) -> np.ndarray:
+        """追記済みの値の配列(コピーしない)"""
+        return self.values[: self.size]
+
+
+class CategoryBuffer(ColumnBuffer):
+    def __init__(self, capacity: int = 1024):
+        """
+        値を辞書符号化して追記していく列バッファ
+        値ごとに振った整数コードだけを配列に持ち、値そのものは1度だけ保持する
+        params
+            capacity: int: 初期容量(行数)
+
+        フィールド変数
+        self.values: np.ndarray: 整数コード(欠損は-1)
+        self.size: int
+        self.categories: list[Any]: コード順の値
+        """
+
+        super().__init__(capacity=capacity, dtype=np.int32)
+        self.categories = []
+        self.__codes: dict[Any, int] = {}
+
+    def __code(self, value: Any) -> int:
+        if value is None or (isinstance(value, float) and np.isnan(value)):
+            return -1
+
+        code = self.__codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            self.__codes[value] = code
+            self.categories.append(value)
+        return code
+
+    def extend(self, values: list[Any]):
+        super().extend([self.__code(value) for value in values])
+
+    def fill(self, value: Any, n: int):
+        super().fill(self.__code(value), n)
+
+    def to_array(self) -> pd.Categorical:
+        """追記済みの値のカテゴリ型配列"""
+        return pd.Categorical.from_codes(
+            super().to_array(), categories=pd.Index(self.categories, dtype=object)
+        )
+
+
+class ForecastTableBuilder:
+    def __init__(self, table_name: str, capacity: int = 1024):
+        """
+        1テーブル分の行を列ごとのバッファに溜めていき、最後に1度だけDataFrameにする
+        params
+            table_name: str: テーブル名(TABLE_COLUMNSのキー)
+            capacity: int: 各列バッファの初期容量(行数)
+
+        フィールド変数
+        self.table_name: str
+        self.columns: list[str]
+        self.buffers: dict[str, ColumnBuffer]
+        self.num_rows: int
+        """
+
+        self.table_name = table_name
+        self.columns = TABLE_COLUMNS[table_name]
+        self.buffers = {
+            column: (
+                CategoryBuffer(capacity)
+                if column in CATEGORY_COLUMNS
+                else ColumnBuffer(capacity)
+            )
+            for column in self.columns
+        }
+        self.num_rows = 0
+
+    def append(self, n: int, **values: Any):
+        """
+        n行分の値を追記
+        listの値はそのまま、それ以外の値はn行分繰り返して追記する
+        長さの合わない列がある場合はどの列にも追記せずValueErrorとする
+        params
+            n: int: 行数
+            values: Any: 列名ごとの値(全列を指定する)
+        """
+
+        if set(values) != set(self.columns):
+            raise ValueError(
+                f"{self.table_name}: columns mismatch {sorted(set(values) ^ set(self.columns))}"
+            )
+        for column, value in values.items():
+            if isinstance(value, list) and len(value) != n:
+                raise ValueError(
+                    f"{self.table_name}.{column}: expected {n} values, got {len(value)}"
+                )
+
+        for column, value in values.items():
+            if isinstance(value, list):
+                self.buffers[column].extend(value)
+            else:
+                self.buffers[column].fill(value, n)
+        self.num_rows += n
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        溜めた行をDataFrameにする
+        CATEGORY_COLUMNSの列はカテゴリ型になる
+        日付列の変換はカテゴリ(重複を除いた値)に対して1度だけ行う
+        return
+            TABLE_COLUMNSの列順のDataFrame
+        """
+
+        data = {}
+        for column in self.columns:
+            values = self.buffers[column].to_array()
+            if column in DATE_COLUMNS:
+                values = self.__to_date_strings(values)
+            data[column] = values
+
+        return pd.DataFrame(data, columns=self.columns)
+
+    @staticmethod
+    def __to_date_strings(values: pd.Categorical) -> pd.Categorical:
+        dates = pd.to_datetime(values.categories).strftime("%Y-%m-%d")
+        # 日時が違っても同じ日付になるカテゴリはまとめる
+        date_codes, date_categories = pd.factorize(dates)
+        # 欠損(code: -1)は末尾に足した-1を参照させる
+        codes = np.append(date_codes, -1)[values.codes]
+        return pd.Categorical.from_codes(codes, categories=date_categories)
+
+
+class ForecastTables:
+    def __init__(self, capacity: int = 1024):
+        """
+        実行単位で全気象台の行を溜めるテーブルごとのビルダー
+        params
+            capacity: int: 各列バッファの初期容量(行数)
+
+        フィールド変数
+        self.builders: dict[str, ForecastTableBuilder]
+        """
+
+        self.builders = {
+            table_name: ForecastTableBuilder(table_name, capacity=capacity)
+            for table_name in TABLE_COLUMNS
+        }
+
+    def __getitem__(self, table_name: str) -> ForecastTableBuilder:
+        return self.builders[table_name]
+
+    def to_dataframe(self, table_name: str) -> pd.DataFrame:
+        """
+        テーブルのDataFrameを作成
+        params
+            table_name: str: テーブル名(TABLE_COLUMNSのキー)
+        return
+            DataFrame
+        """
+        return self.builders[table_name].to_dataframe()
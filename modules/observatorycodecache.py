@@ -0,0 +1,128 @@
+import json
+import time
+import logging
+import threading
+
+from typing import Callable, Optional
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ObservatoryCodeCache:
+    def __init__(
+        self,
+        fetch: Callable[[], list[str]],
+        load_snapshot: Callable[[], Optional[str]],
+        save_snapshot: Callable[[str], None],
+        ttl_seconds: float = 86400,
+    ):
+
+        """
+        気象台コード一覧のキャッシュ
+        プロセス内のメモリとスナップショット(ローカルファイルやGCS)に保持し、TTLを過ぎたらその場で取得し直す
+        (Cloud Functionsは関数が返るとCPUが割り当てられなくなり、裏で取得し直すスレッドは止まるため)
+        取得に失敗した場合は古くてもメモリ・スナップショットの一覧を使う
+        params
+            fetch: Callable[[], list[str]]: 一覧を取得する関数(失敗時は例外)
+            load_snapshot: Callable[[], Optional[str]]: スナップショットを読む関数(なければNone)
+            save_snapshot: Callable[[str], None]: スナップショットを書く関数
+            ttl_seconds: float: 取得し直すまでの秒数
+
+        フィールド変数
+        self.ttl_seconds: float
+        self.codes: Optional[list[str]]: メモリ上の一覧
+        self.fetched_at: float: 一覧を取得した時刻(UNIX時間)
+        """
+
+        self.__fetch = fetch
+        self.__load_snapshot = load_snapshot
+        self.__save_snapshot = save_snapshot
+        self.ttl_seconds = ttl_seconds
+        self.codes = None
+        self.fetched_at = 0.0
+        self.__lock = threading.Lock()
+
+    def get(self) -> list[str]:
+        """
+        気象台コード一覧を取得
+        メモリ→スナップショットの順に探し、どちらにもなければその場で取得する
+        TTLを過ぎていれば取得し直す(失敗した場合は古い一覧を返す)
+        return
+            気象台コード一覧
+        """
+
+        with self.__lock:
+            if self.codes is None:
+                self.__restore()
+
+            if self.codes is None:
+                # 初回(スナップショットもない)はその場で取得する
+                self.__update(self.__fetch_codes())
+            elif self.is_stale():
+                self.__refresh()
+
+            return self.codes
+
+    def is_stale(self) -> bool:
+        """TTLを過ぎているか"""
+        return time.time() - self.fetched_at >= self.ttl_seconds
+
+    def refresh(self):
+        """
+        一覧を取得し直してメモリとスナップショットを更新
+        失敗した場合はメモリ上の一覧をそのまま使う(一覧がなければ例外)
+        """
+        with self.__lock:
+            self.__refresh()
+
+    def __refresh(self):
+        try:
+            codes = self.__fetch_codes()
+        except Exception:
+            if self.codes is None:
+                raise
+            logger.exception(
+                f"failed to fetch observatory codes, using {len(self.codes)} cached codes"
+            )
+            return
+        self.__update(codes)
+
+    def __restore(self):
+        try:
+            snapshot = self.__load_snapshot()
+        except Exception:
+            logger.exception("failed to load observatory code snapshot")
+            return
+        if snapshot is None:
+            return
+
+        try:
+            data = json.loads(snapshot)
+            codes = list(data["codes"])
+            fetched_at = float(data["fetched_at"])
+        except Exception:
+            # 壊れたスナップショットは無いものとして扱う
+            logger.warning("broken observatory code snapshot")
+            return
+        self.codes = codes
+        self.fetched_at = fetched_at
+        logger.info(f"restored {len(self.codes)} observatory codes from snapshot")
+
+    def __fetch_codes(self) -> list[str]:
+        codes = self.__fetch()
+        if len(codes) == 0:
+            raise ValueError("empty observatory code list")
+        return codes
+
+    def __update(self, codes: list[str]):
+        self.codes = codes
+        self.fetched_at = time.time()
+        try:
+            self.__save_snapshot(
+                json.dumps({"codes": self.codes, "fetched_at": self.fetched_at})
+            )
+        except Exception:
+            logger.exception("failed to save observatory code snapshot")
+        logger.info(f"fetched {len(self.codes)} observatory codes")
@@ -0,0 +1,169 @@
+import json
+import logging
+import threading
+
+from typing import Callable, Optional
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ReportWatermark:
+    def __init__(
+        self,
+        load_snapshot: Callable[[], Optional[str]],
+        save_snapshot: Callable[[str], None],
+    ):
+
+        """
+        気象台・テーブルごとの取り込み済みの気象情報レポート日時(テーブルの区分(明日明後日分/1週間分)のレポート日時)
+        レポート日時が進んでいないテーブルは取り込み済みとして抽出・アップロードを省く
+        取り込みに成功したテーブルのみ確定(commit)し、スナップショット(ローカルファイルやGCS)に保存する
+        (同じ区分の他のテーブルが失敗しても、成功したテーブルは次回取り込み直さない)
+        params
+            load_snapshot: Callable[[], Optional[str]]: スナップショットを読む関数(なければNone)
+            save_snapshot: Callable[[str], None]: スナップショットを書く関数
+
+        フィールド変数
+        self.watermarks: Optional[dict[str, dict[str, str]]]: {気象台コード: {テーブル名: レポート日時}}
+        self.pending: dict[str, dict[str, str]]: 今回の実行で取り込み中のレポート日時
+        self.rejected: set[str]: 取り込みに失敗したテーブル名
+        """
+
+        self.__load_snapshot = load_snapshot
+        self.__save_snapshot = save_snapshot
+        self.watermarks = None
+        self.pending = {}
+        self.rejected = set()
+        self.__lock = threading.Lock()
+
+    def advanced_tables(
+        self, area_code: str, report_datetimes: dict[str, str]
+    ) -> list[str]:
+        """
+        レポート日時が取り込み済みより進んでいるテーブル
+        レポート日時は"%Y-%m-%d %H:%M:%S"の文字列なので文字列のまま比較する
+        params
+            area_code: str: 気象台コード
+            report_datetimes: dict[str, str]: {テーブル名: レポート日時}
+        return
+            進んでいるテーブル名(取り込み済みのないテーブルを含む)
+        """
+
+        with self.__lock:
+            if self.watermarks is None:
+                self.__restore()
+            loaded = self.watermarks.get(area_code, {})
+
+        return [
+            table_name
+            for table_name, report_datetime in report_datetimes.items()
+            if table_name not in loaded or report_datetime > loaded[table_name]
+        ]
+
+    def stage(self, area_code: str, table_name: str, report_datetime: str):
+        """
+        取り込み中のレポート日時として登録(commitするまで取り込み済みにならない)
+        params
+            area_code: str: 気象台コード
+            table_name: str: テーブル名
+            report_datetime: str: レポート日時
+        """
+        with self.__lock:
+            self.pending.setdefault(area_code, {})[table_name] = report_datetime
+
+    def reject(self, table_name: str):
+        """
+        テーブルの取り込みに失敗したとしてcommitの対象から外す
+        params
+            table_name: str: テーブル名
+        """
+        with self.__lock:
+            self.rejected.add(table_name)
+
+    def commit(self):
+        """
+        取り込み中のレポート日時のうち、失敗していないテーブルを取り込み済みに確定してスナップショットに保存
+        保存の直前にスナップショットを読み直してマージする(他のインスタンスが進めた分を巻き戻さない)
+        """
+
+        with self.__lock:
+            # 他のインスタンスが前回の読み込み以降に保存した分とマージする
+            # (読み直してから保存するまでの間に保存された分は失われうるが、その場合は次回取り込み直すだけ)
+            watermarks = self.__read_snapshot()
+            for area_code, table_datetimes in (self.watermarks or {}).items():
+                for table_name, report_datetime in table_datetimes.items():
+                    self.__advance(watermarks, area_code, table_name, report_datetime)
+
+            committed = 0
+            for area_code, table_datetimes in self.pending.items():
+                for table_name, report_datetime in table_datetimes.items():
+                    if table_name in self.rejected:
+                        continue
+                    if self.__advance(
+                        watermarks, area_code, table_name, report_datetime
+                    ):
+                        committed += 1
+
+            self.watermarks = watermarks
+            rejected = sorted(self.rejected)
+            self.pending = {}
+            self.rejected = set()
+
+            if committed > 0:
+                try:
+                    self.__save_snapshot(json.dumps(self.watermarks))
+                except Exception:
+                    logger.exception("failed to save report watermark snapshot")
+
+        logger.info(f"committed {committed} report watermarks, rejected: {rejected}")
+
+    def discard(self):
+        """
+        取り込み中のレポート日時を破棄(前回の実行が途中で失敗した場合など)
+        取り込み済みのレポート日時は次に使うときにスナップショットから読み直す(他のインスタンスが進めた分を反映する)
+        """
+        with self.__lock:
+            self.watermarks = None
+            self.pending = {}
+            self.rejected = set()
+
+    @staticmethod
+    def __advance(
+        watermarks: dict, area_code: str, table_name: str, report_datetime: str
+    ) -> bool:
+        # 進める場合のみ更新する(巻き戻さない)
+        loaded = watermarks.setdefault(area_code, {})
+        if table_name in loaded and report_datetime <= loaded[table_name]:
+            return False
+        loaded[table_name] = report_datetime
+        return True
+
+    def __restore(self):
+        self.watermarks = self.__read_snapshot()
+        logger.info(
+            f"restored report watermarks of {len(self.watermarks)} observatories"
+        )
+
+    def __read_snapshot(self) -> dict[str, dict[str, str]]:
+        try:
+            snapshot = self.__load_snapshot()
+        except Exception:
+            logger.exception("failed to load report watermark snapshot")
+            return {}
+        if snapshot is None:
+            return {}
+
+        try:
+            return {
+                str(area_code): {
+                    str(table_name): str(report_datetime)
+                    for table_name, report_datetime in table_datetimes.items()
+                }
+                for area_code, table_datetimes in json.loads(snapshot).items()
+            }
+        except Exception:
+            # 壊れたスナップショットは無いものとして扱う(全て取り込み直す)
+            logger.warning("broken report watermark snapshot")
+            return {}
@@ -1,25 +1,81 @@
+from __future__ import annotations
+
 import requests
 import json
+import math
 import datetime
 import logging
+import functools
+
+from typing import TYPE_CHECKING, Any, Optional, Union
 
-import numpy as np
-import pandas as pd
+from modules.forecastcache import ForecastResponseCache
+from utils import decorator
+from utils import httpclient
+from utils import metrics
 
-from typing import Any
+# pandas・numpyを使うテーブル作成部分は予報の更新があった場合のみimportする
+if TYPE_CHECKING:
+    import pandas as pd
+    from modules.forecasttable import ForecastTableBuilder, ForecastTables
 
 # loggerの設定
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# 気象庁予報APIのURL
+FORECAST_URL = "https://www.jma.go.jp/bosai/forecast/data/forecast/{area_code}.json"
+
+# 気象庁APIのメトリクス(気象台ごと)
+JMA_REQUESTS = metrics.counter(
+    "jma_requests", "気象庁APIへのリクエスト数", ("area_code", "status")
+)
+JMA_RESPONSE_BYTES = metrics.counter(
+    "jma_response_bytes", "気象庁APIのレスポンスのバイト数", ("area_code",)
+)
+JMA_FETCH_SECONDS = metrics.histogram(
+    "jma_fetch_seconds", "気象庁APIのレスポンス時間(秒。リトライを含む)", ("area_code",)
+)
+
+# レスポンスの区分(明日明後日分[0]: "fewdays", 1週間分[1]: "week")ごとのテーブル
+# 区分ごとに気象情報レポート日時(reportDatetime)が異なる
+PRODUCT_TABLES = {
+    "fewdays": ["fewdays_weather", "tomorrow_pops", "tomorrow_temps"],
+    "week": ["week_weather", "week_temps", "past_tempavg", "past_precopitationavg"],
+}
+# テーブルごとの区分
+TABLE_PRODUCTS = {
+    table_name: product
+    for product, table_names in PRODUCT_TABLES.items()
+    for table_name in table_names
+}
 
-class WeatherForecast:
-    def __init__(self, area_code):
 
+class WeatherForecast:
+    def __init__(
+        self,
+        area_code,
+        session: Optional[requests.Session] = None,
+        timeout: Optional[Union[float, tuple[float, float]]] = None,
+        cache: Optional[ForecastResponseCache] = None,
+    ):
         """
+        予報APIをリクエストして生成する
+        取得済みのレスポンスから生成する場合は from_bytes / from_json を使う
+        各DataFrameは初回アクセス時にレスポンスから抽出しキャッシュする
+        params
+            area_code: str: 気象台コード
+            session: Optional[requests.Session]: リクエストに使うセッション(省略時は共有セッション)
+            timeout: Optional[Union[float, tuple[float, float]]]: リクエストのタイムアウト秒(接続, 読み込み)
+            cache: Optional[ForecastResponseCache]: 条件付きリクエスト用のレスポンスキャッシュ
+
         フィールド変数
         self.area_code: str
         self.get_datetime: str
+        self.is_modified: bool: 前回取得時から予報が更新されていたか(Falseのとき各DataFrameは作成できない)
+        self.etag: Optional[str]: レスポンスのETagヘッダ(is_modifiedがTrueの場合のみ)
+        self.last_modified: Optional[str]: レスポンスのLast-Modifiedヘッダ(is_modifiedがTrueの場合のみ)
+        self.response_text: str: レスポンス本文(is_modifiedがTrueの場合のみ)
         self.response_dict: dict[str, Any]
         self.fewdays_weather_df: pd.DataFrame
         self.tomorrow_pops_df: pd.DataFrame
@@ -27,126 +83,249 @@ class WeatherForecast:
         self.week_weather_df: pd.DataFrame
         self.week_temps_df: pd.DataFrame
         self.past_tempavg_df: pd.DataFrame
-        self.past_pricipitationavg_df: pd.DataFrame
+        self.past_precopitationavg_df: pd.DataFrame
         """
 
         self.area_code = area_code
         # 取得日
-        self.get_datetime = datetime.datetime.now(
-            datetime.timezone(datetime.timedelta(hours=9), "JST")
-        ).strftime("%Y-%m-%d %H:%M:%S")
+        self.get_datetime = self.__now()
 
         # 予報APIを叩く
-        url = f"https://www.jma.go.jp/bosai/forecast/data/forecast/{area_code}.json"
-        response = requests.get(url)
-
-        self.response_dict = json.loads(response.text)
-
-        # レスポンス情報から各種予報データ取得
-        self.__extract_forecast_from_response()
+        url = FORECAST_URL.format(area_code=area_code)
+        if session is None:
+            session = httpclient.get_session()
+        headers = {} if cache is None else cache.conditional_headers(area_code)
+        with decorator.span("fetch", area_code=area_code) as span:
+            response = session.get(url, headers=headers, timeout=timeout)
+            span.set(status=response.status_code, bytes=len(response.content))
+        JMA_REQUESTS.inc(area_code=area_code, status=response.status_code)
+        JMA_RESPONSE_BYTES.inc(len(response.content), area_code=area_code)
+        JMA_FETCH_SECONDS.observe(span.seconds, area_code=area_code)
+        response.raise_for_status()
+
+        # 前回取得時から更新されていなければ抽出しない
+        self.is_modified = response.status_code != 304
+        if not self.is_modified:
+            self.response_dict = None
+            return
+
+        # レスポンスキャッシュへの保存は取り込みに成功してから(サービス側でstage/commit)
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.response_text = response.text
+        self.response_dict = json.loads(self.response_text)
+
+    @classmethod
+    def from_bytes(
+        cls, area_code, content: bytes, get_datetime: Optional[str] = None
+    ) -> "WeatherForecast":
+        """
+        取得済みのレスポンス本文から生成する(リクエストしない)
+        params
+            area_code: str: 気象台コード
+            content: bytes: 予報APIのレスポンス本文
+            get_datetime: Optional[str]: 取得日時(省略時は現在日時)
+        return
+            WeatherForecast
+        """
+        return cls.from_json(
+            area_code=area_code,
+            response_dict=json.loads(content),
+            get_datetime=get_datetime,
+        )
 
-    def __extract_forecast_from_response(self):
+    @classmethod
+    def from_json(
+        cls,
+        area_code,
+        response_dict: list[dict[str, Any]],
+        get_datetime: Optional[str] = None,
+    ) -> "WeatherForecast":
         """
-        レスポンス内容から各予報値を取得しそれぞれのDataFrameに格納する
+        パース済みのレスポンスから生成する(リクエストしない)
+        params
+            area_code: str: 気象台コード
+            response_dict: list[dict[str, Any]]: 予報APIのレスポンスをjsonとして読み込んだもの
+            get_datetime: Optional[str]: 取得日時(省略時は現在日時)
+        return
+            WeatherForecast
         """
+        weather_forecast = cls.__new__(cls)
+        weather_forecast.area_code = area_code
+        weather_forecast.get_datetime = (
+            cls.__now() if get_datetime is None else get_datetime
+        )
+        weather_forecast.is_modified = True
+        weather_forecast.response_dict = response_dict
+        return weather_forecast
 
-        # 明日明後日分の情報([0])を取得
-        fewdays_forecast_response_dict = self.response_dict[0]
-        # 気象情報レポート日時
-        report_datetime: str = datetime.datetime.strptime(
-            fewdays_forecast_response_dict["reportDatetime"], "%Y-%m-%dT%H:%M:%S%z"
+    @staticmethod
+    def __now() -> str:
+        return datetime.datetime.now(
+            datetime.timezone(datetime.timedelta(hours=9), "JST")
         ).strftime("%Y-%m-%d %H:%M:%S")
-        # 気象台名
-        meteorological_observatory_name = fewdays_forecast_response_dict[
-            "publishingOffice"
-        ]
-        # 明日明後日の予報情報を取得
-        self.__extract_fewdays_weather(
-            fewdays_weather_dict=fewdays_forecast_response_dict["timeSeries"][0],
-            report_datetime=report_datetime,
-            meteorological_observatory_name=meteorological_observatory_name,
-        )
-        # 明日の降水確率を取得
-        self.__extract_tomorrow_pops(
-            tomorrow_pops_dict=fewdays_forecast_response_dict["timeSeries"][1],
-            report_datetime=report_datetime,
-            meteorological_observatory_name=meteorological_observatory_name,
-        )
-        # 明日の気温を取得(代表都市)
-        self.__extract_tomorrow_temps(
-            tomorrow_temps_dict=fewdays_forecast_response_dict["timeSeries"][2],
-            report_datetime=report_datetime,
-            meteorological_observatory_name=meteorological_observatory_name,
-        )
 
-        # 1週間分の情報([1])を取得
-        week_forecast_response_dict = self.response_dict[1]
+    def __report_info(self, index: int) -> tuple[str, str]:
+        """
+        レスポンスの明日明後日分([0]) または 1週間分([1]) の気象情報レポート日時と気象台名を取得
+        params
+            index: int: 0: 明日明後日分, 1: 1週間分
+        return
+            (気象情報レポート日時, 気象台名)
+        """
+        forecast_response_dict = self.response_dict[index]
         # 気象情報レポート日時
         report_datetime: str = datetime.datetime.strptime(
-            week_forecast_response_dict["reportDatetime"], "%Y-%m-%dT%H:%M:%S%z"
+            forecast_response_dict["reportDatetime"], "%Y-%m-%dT%H:%M:%S%z"
         ).strftime("%Y-%m-%d %H:%M:%S")
         # 気象台名
-        meteorological_observatory_name = week_forecast_response_dict[
-            "publishingOffice"
-        ]
-        # 1週間分の天気情報を取得
-        self.__extract_week_weather(
-            week_weather_dict=week_forecast_response_dict["timeSeries"][0],
-            report_datetime=report_datetime,
-            meteorological_observatory_name=meteorological_observatory_name,
-        )
-        # 1週間分の気温を取得(代表都市)
-        self.__extract_week_temps(
-            week_temps_dict=week_forecast_response_dict["timeSeries"][1],
-            report_datetime=report_datetime,
-            meteorological_observatory_name=meteorological_observatory_name,
-        )
+        meteorological_observatory_name = forecast_response_dict["publishingOffice"]
 
-        # 向こう1週間の平年気温
-        self.__extract_past_tempavg(
-            past_tempavg_dict=week_forecast_response_dict["tempAverage"],
-            report_datetime=report_datetime,
-            meteorological_observatory_name=meteorological_observatory_name,
-        )
+        return report_datetime, meteorological_observatory_name
+
+    @functools.cached_property
+    def fewdays_report_datetime(self) -> str:
+        """明日明後日分の気象情報レポート日時"""
+        return self.__report_info(0)[0]
+
+    @functools.cached_property
+    def week_report_datetime(self) -> str:
+        """1週間分の気象情報レポート日時"""
+        return self.__report_info(1)[0]
+
+    def report_datetimes(self) -> dict[str, str]:
+        """
+        区分(PRODUCT_TABLESのキー)ごとの気象情報レポート日時
+        return
+            {"fewdays": 明日明後日分のレポート日時, "week": 1週間分のレポート日時}
+        """
+        return {
+            "fewdays": self.fewdays_report_datetime,
+            "week": self.week_report_datetime,
+        }
+
+    @functools.cached_property
+    def fewdays_weather_df(self) -> pd.DataFrame:
+        """明日明後日の予報"""
+        return self.__build_dataframe("fewdays_weather")
+
+    @functools.cached_property
+    def tomorrow_pops_df(self) -> pd.DataFrame:
+        """明日の降水確率"""
+        return self.__build_dataframe("tomorrow_pops")
+
+    @functools.cached_property
+    def tomorrow_temps_df(self) -> pd.DataFrame:
+        """明日の気温(代表都市)"""
+        return self.__build_dataframe("tomorrow_temps")
+
+    @functools.cached_property
+    def week_weather_df(self) -> pd.DataFrame:
+        """1週間分の天気"""
+        return self.__build_dataframe("week_weather")
+
+    @functools.cached_property
+    def week_temps_df(self) -> pd.DataFrame:
+        """1週間分の気温(代表都市)"""
+        return self.__build_dataframe("week_temps")
+
+    @functools.cached_property
+    def past_tempavg_df(self) -> pd.DataFrame:
+        """向こう1週間の平年気温"""
+        return self.__build_dataframe("past_tempavg")
+
+    @functools.cached_property
+    def past_precopitationavg_df(self) -> pd.DataFrame:
+        """向こう1週間の平年降水量"""
+        return self.__build_dataframe("past_precopitationavg")
+
+    def __build_dataframe(self, table_name: str) -> pd.DataFrame:
+        """
+        この気象台分のみのDataFrameを作成
+        params
+            table_name: str: テーブル名(TABLE_COLUMNSのキー)
+        """
+        from modules.forecasttable import ForecastTableBuilder
+
+        table = ForecastTableBuilder(table_name, capacity=64)
+        self.__extract(table_name, table)
+        return table.to_dataframe()
+
+    def append_to(
+        self, tables: ForecastTables, table_names: Optional[list[str]] = None
+    ):
+        """
+        実行単位のビルダーに各テーブルの行を追記する
+        全気象台分を追記してから ForecastTables.to_dataframe で1度だけDataFrameにする
+        params
+            tables: ForecastTables: 追記先
+            table_names: Optional[list[str]]: 追記するテーブル名(省略時は全テーブル)
+        """
+        if table_names is None:
+            table_names = list(tables.builders)
+        for table_name in table_names:
+            self.__extract(table_name, tables[table_name])
 
-        # 向こう1週間の平年降水量
-        self.__extract_past_precipitationavg(
-            past_precipitationavg_dict=week_forecast_response_dict["precipAverage"],
+    def __extract(self, table_name: str, table: ForecastTableBuilder):
+        """
+        テーブル名に対応する予報値をレスポンスから抽出しtableへ追記する
+        params
+            table_name: str: テーブル名(TABLE_COLUMNSのキー)
+            table: ForecastTableBuilder: 追記先
+        """
+
+        # (明日明後日分[0] or 1週間分[1], 該当予報値辞書, 抽出メソッド)
+        if table_name == "fewdays_weather":
+            index, key, extract = 0, 0, self.__extract_fewdays_weather
+        elif table_name == "tomorrow_pops":
+            index, key, extract = 0, 1, self.__extract_tomorrow_pops
+        elif table_name == "tomorrow_temps":
+            index, key, extract = 0, 2, self.__extract_tomorrow_temps
+        elif table_name == "week_weather":
+            index, key, extract = 1, 0, self.__extract_week_weather
+        elif table_name == "week_temps":
+            index, key, extract = 1, 1, self.__extract_week_temps
+        elif table_name == "past_tempavg":
+            index, key, extract = 1, "tempAverage", self.__extract_past_tempavg
+        elif table_name == "past_precopitationavg":
+            index, key, extract = (
+                1,
+                "precipAverage",
+                self.__extract_past_precipitationavg,
+            )
+        else:
+            raise ValueError(f"unknown table: {table_name}")
+
+        forecast_response_dict = self.response_dict[index]
+        if isinstance(key, int):
+            forecast_dict = forecast_response_dict["timeSeries"][key]
+        else:
+            forecast_dict = forecast_response_dict[key]
+
+        report_datetime, meteorological_observatory_name = self.__report_info(index)
+        extract(
+            forecast_dict,
             report_datetime=report_datetime,
             meteorological_observatory_name=meteorological_observatory_name,
+            table=table,
         )
 
-        return
-
     def __extract_fewdays_weather(
         self,
         fewdays_weather_dict: dict[str, Any],
         report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        数日分(2日分?)の予報値を抽出しDataFrameに格納する
+        数日分(2日分?)の予報値を抽出しtableへ追記する
         Args:
             fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        # 地方コード
-        area_codes: list[str] = []
-        # 地方名
-        area_names: list[str] = []
-        # 予報対象日
-        forecast_target_dates: list[str] = []
-        # 天気コード
-        weather_codes: list[str] = []
-        # 天気
-        weathers: list[str] = []
-        # 風
-        winds: list[str] = []
-        # 波
-        waves: list[str] = []
-
         # 明日明後日の日時情報を準備
         datetimes = fewdays_weather_dict["timeDefines"][1:]
         # エリアごとの情報
@@ -154,86 +333,48 @@ class WeatherForecast:
 
         for area in areas:
             try:
-                area_codes += [area["area"]["code"]] * len(datetimes)
-                area_names += [area["area"]["name"]] * len(datetimes)
-                forecast_target_dates += datetimes
-                weather_codes += area["weatherCodes"][1:]
-                weathers += area["weathers"][1:]
-                winds += area["winds"][1:]
-                waves += area.get("waves", [np.nan] * (len(datetimes) + 1))[1:]
+                table.append(
+                    len(datetimes),
+                    # 取得日時
+                    get_datetime=self.get_datetime,
+                    # 気象情報レポート日時
+                    report_datetime=report_datetime,
+                    # 気象台名
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    # 地方コード
+                    area_code=area["area"]["code"],
+                    # 地方名
+                    area_name=area["area"]["name"],
+                    # 予報対象日
+                    forecast_target_date=datetimes,
+                    # 天気コード
+                    weather_code=area["weatherCodes"][1:],
+                    # 天気
+                    weather=area["weathers"][1:],
+                    # 風
+                    winds=area["winds"][1:],
+                    # 波
+                    waves=area.get("waves", [math.nan] * (len(datetimes) + 1))[1:],
+                )
             except Exception as e:
                 logger.exception(f"area is {area}")
 
-        fewdays_weather_df = pd.DataFrame(
-            {
-                "area_code": area_codes,
-                "area_name": area_names,
-                "forecast_target_date": forecast_target_dates,
-                "weather_code": weather_codes,
-                "weather": weathers,
-                "winds": winds,
-                "waves": waves,
-            }
-        )
-
-        # 取得日時
-        fewdays_weather_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        fewdays_weather_df["report_datetime"] = report_datetime
-        # 気象台名
-        fewdays_weather_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        fewdays_weather_df["forecast_target_date"] = pd.to_datetime(
-            fewdays_weather_df["forecast_target_date"]
-        ).dt.strftime("%Y-%m-%d")
-
-        # 列並び替え
-        self.fewdays_weather_df = fewdays_weather_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "area_code",
-                "area_name",
-                "forecast_target_date",
-                "weather_code",
-                "weather",
-                "winds",
-                "waves",
-            ]
-        ]
-
     def __extract_tomorrow_pops(
         self,
         tomorrow_pops_dict: dict[str, Any],
         report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        明日分の降水確率予報値を抽出しDataFrameに格納する
+        明日分の降水確率予報値を抽出しtableへ追記する
         Args:
-            fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
+            tomorrow_pops_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        # 地方コード
-        area_codes: list[str] = []
-        # 地方名
-        area_names: list[str] = []
-        # 予報対象日
-        forecast_target_dates: list[str] = []
-        # 降水確率0-6 (pop = probability of precipitation の略)
-        pops0006: list[int] = []
-        # 降水確率6-12
-        pops0612: list[int] = []
-        # 降水確率12-18
-        pops1218: list[int] = []
-        # 降水確率18-24
-        pops1824: list[int] = []
-
         # 降水確率予報日
         datetimes = tomorrow_pops_dict["timeDefines"][1]
 
@@ -242,82 +383,42 @@ class WeatherForecast:
 
         for area in areas:
             try:
-                area_codes += [area["area"]["code"]]
-                area_names += [area["area"]["name"]]
-                forecast_target_dates += [datetimes]
-                pops0006 += [area["pops"][1]]
-                pops0612 += [area["pops"][2]]
-                pops1218 += [area["pops"][3]]
-                pops1824 += [area["pops"][4]]
+                table.append(
+                    1,
+                    get_datetime=self.get_datetime,
+                    report_datetime=report_datetime,
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    area_code=area["area"]["code"],
+                    area_name=area["area"]["name"],
+                    forecast_target_date=datetimes,
+                    # 降水確率0-6 (pop = probability of precipitation の略)
+                    pops0006=area["pops"][1],
+                    # 降水確率6-12
+                    pops0612=area["pops"][2],
+                    # 降水確率12-18
+                    pops1218=area["pops"][3],
+                    # 降水確率18-24
+                    pops1824=area["pops"][4],
+                )
             except Exception as e:
                 logger.exception(f"area is {area}")
 
-        tomorrow_pops_df = pd.DataFrame(
-            {
-                "area_code": area_codes,
-                "area_name": area_names,
-                "forecast_target_date": forecast_target_dates,
-                "pops0006": pops0006,
-                "pops0612": pops0612,
-                "pops1218": pops1218,
-                "pops1824": pops1824,
-            }
-        )
-
-        # 取得日時
-        tomorrow_pops_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        tomorrow_pops_df["report_datetime"] = report_datetime
-        # 気象台名
-        tomorrow_pops_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        tomorrow_pops_df["forecast_target_date"] = pd.to_datetime(
-            tomorrow_pops_df["forecast_target_date"]
-        ).dt.strftime("%Y-%m-%d")
-
-        # 列並び替え
-        self.tomorrow_pops_df = tomorrow_pops_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "area_code",
-                "area_name",
-                "forecast_target_date",
-                "pops0006",
-                "pops0612",
-                "pops1218",
-                "pops1824",
-            ]
-        ]
-
     def __extract_tomorrow_temps(
         self,
         tomorrow_temps_dict: dict[str, Any],
-        report_datetime: SyntaxError(),
+        report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        明日分の気温予報値を抽出しDataFrameに格納する
+        明日分の気温予報値を抽出しtableへ追記する
         Args:
-            fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
+            tomorrow_temps_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        # 代表都市コード
-        city_codes: list[str] = []
-        # 代表都市名
-        city_names: list[str] = []
-        # 予報対象日
-        forecast_target_dates: list[str] = []
-        # 最高気温
-        lowest_temperatures: list[float] = []
-        # 最低気温
-        highest_temperatures: list[float] = []
-
         # 気温予報日
         datetimes = tomorrow_temps_dict["timeDefines"][0]
         # エリアごとの気温
@@ -325,72 +426,40 @@ class WeatherForecast:
 
         for area in areas:
             try:
-                city_codes += [area["area"]["code"]]
-                city_names += [area["area"]["name"]]
-                forecast_target_dates += [datetimes]
-                lowest_temperatures += [area["temps"][0]]
-                highest_temperatures += [area["temps"][1]]
+                table.append(
+                    1,
+                    get_datetime=self.get_datetime,
+                    report_datetime=report_datetime,
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    # 代表都市コード
+                    city_code=area["area"]["code"],
+                    # 代表都市名
+                    city_name=area["area"]["name"],
+                    forecast_target_date=datetimes,
+                    # 最低気温
+                    lowest_temperature=area["temps"][0],
+                    # 最高気温
+                    highest_temperature=area["temps"][1],
+                )
             except Exception as e:
                 logger.exception(f"area is {area}")
 
-        tomorrow_temps_df = pd.DataFrame(
-            {
-                "city_code": city_codes,
-                "city_name": city_names,
-                "forecast_target_date": forecast_target_dates,
-                "lowest_temperature": lowest_temperatures,
-                "highest_temperature": highest_temperatures,
-            }
-        )
-
-        # 取得日時
-        tomorrow_temps_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        tomorrow_temps_df["report_datetime"] = report_datetime
-        # 気象台名
-        tomorrow_temps_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        tomorrow_temps_df["forecast_target_date"] = pd.to_datetime(
-            tomorrow_temps_df["forecast_target_date"]
-        ).dt.strftime("%Y-%m-%d")
-
-        self.tomorrow_temps_df = tomorrow_temps_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "city_code",
-                "city_name",
-                "forecast_target_date",
-                "lowest_temperature",
-                "highest_temperature",
-            ]
-        ]
-
     def __extract_week_weather(
         self,
         week_weather_dict: dict[str, Any],
         report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        1週間分の気象予報値を抽出しDataFrameに格納する
+        1週間分の気象予報値を抽出しtableへ追記する
         Args:
-            fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
+            week_weather_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        # 変数宣言
-        area_codes: list[str] = []
-        area_names: list[str] = []
-        forecast_target_dates: list[str] = []
-        weather_codes: list[str] = []
-        pops: list[int] = []
-        reliabilities: list[str] = []
-
         # 1週間の日時情報を準備
         datetimes = week_weather_dict["timeDefines"]
         # エリアごとの情報
@@ -398,82 +467,42 @@ class WeatherForecast:
 
         for area in areas:
             try:
-                area_codes += [area["area"]["code"]] * len(datetimes)
-                area_names += [area["area"]["name"]] * len(datetimes)
-                forecast_target_dates += datetimes
-                # 天気コード
-                weather_codes += area["weatherCodes"]
-                # 降水確率
-                pops += [i if i != "" else np.nan for i in area["pops"]]
-                # 信頼度
-                reliabilities += [
-                    i if i != "" else np.nan for i in area["reliabilities"]
-                ]
+                table.append(
+                    len(datetimes),
+                    get_datetime=self.get_datetime,
+                    report_datetime=report_datetime,
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    area_code=area["area"]["code"],
+                    area_name=area["area"]["name"],
+                    forecast_target_date=datetimes,
+                    # 天気コード
+                    weather_code=area["weatherCodes"],
+                    # 降水確率
+                    pop=[i if i != "" else math.nan for i in area["pops"]],
+                    # 信頼度
+                    reliability=[
+                        i if i != "" else math.nan for i in area["reliabilities"]
+                    ],
+                )
             except Exception as e:
                 logger.exception(f"area is {area}")
 
-        week_weather_df = pd.DataFrame(
-            {
-                "area_code": area_codes,
-                "area_name": area_names,
-                "forecast_target_date": forecast_target_dates,
-                "weather_code": weather_codes,
-                "pop": pops,
-                "reliability": reliabilities,
-            }
-        )
-
-        # 取得日時
-        week_weather_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        week_weather_df["report_datetime"] = report_datetime
-        # 気象台名
-        week_weather_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        week_weather_df["forecast_target_date"] = pd.to_datetime(
-            week_weather_df["forecast_target_date"]
-        ).dt.strftime("%Y-%m-%d")
-
-        self.week_weather_df = week_weather_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "area_code",
-                "area_name",
-                "forecast_target_date",
-                "weather_code",
-                "pop",
-                "reliability",
-            ]
-        ]
-
     def __extract_week_temps(
         self,
         week_temps_dict: dict[str, Any],
         report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        1週間分の気温予報値を抽出しDataFrameに格納する
+        1週間分の気温予報値を抽出しtableへ追記する
         Args:
-            fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
+            week_temps_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        city_codes: list[str] = []
-        city_names: list[str] = []
-        forecast_target_dates: list[str] = []
-        lowest_temperatures: list[float] = []
-        lowest_temperature_uppers: list[float] = []
-        lowest_temperature_lowers: list[float] = []
-        highest_temperatures: list[float] = []
-        highest_temperature_uppers: list[float] = []
-        highest_temperature_lowers: list[float] = []
-
         # 1週間の日時情報を準備
         datetimes = week_temps_dict["timeDefines"]
         # エリアごとの情報
@@ -482,198 +511,106 @@ class WeatherForecast:
         for city in cities:
 
             try:
-                city_codes += [city["area"]["code"]] * len(datetimes)
-                city_names += [city["area"]["name"]] * len(datetimes)
-                forecast_target_dates += datetimes
-                # 最低気温
-                lowest_temperatures += [
-                    i if i != "" else np.nan for i in city["tempsMin"]
-                ]
-                lowest_temperature_uppers += [
-                    i if i != "" else np.nan for i in city["tempsMinUpper"]
-                ]
-                lowest_temperature_lowers += [
-                    i if i != "" else np.nan for i in city["tempsMinLower"]
-                ]
-                # 最高気温
-                highest_temperatures += [
-                    i if i != "" else np.nan for i in city["tempsMax"]
-                ]
-                highest_temperature_uppers += [
-                    i if i != "" else np.nan for i in city["tempsMaxUpper"]
-                ]
-                highest_temperature_lowers += [
-                    i if i != "" else np.nan for i in city["tempsMaxLower"]
-                ]
+                table.append(
+                    len(datetimes),
+                    get_datetime=self.get_datetime,
+                    report_datetime=report_datetime,
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    city_code=city["area"]["code"],
+                    city_name=city["area"]["name"],
+                    forecast_target_date=datetimes,
+                    # 最低気温
+                    lowest_temperature=[
+                        i if i != "" else math.nan for i in city["tempsMin"]
+                    ],
+                    lowest_temperature_upper=[
+                        i if i != "" else math.nan for i in city["tempsMinUpper"]
+                    ],
+                    lowest_temperature_lower=[
+                        i if i != "" else math.nan for i in city["tempsMinLower"]
+                    ],
+                    # 最高気温
+                    highest_temperature=[
+                        i if i != "" else math.nan for i in city["tempsMax"]
+                    ],
+                    highest_temperature_upper=[
+                        i if i != "" else math.nan for i in city["tempsMaxUpper"]
+                    ],
+                    highest_temperature_lower=[
+                        i if i != "" else math.nan for i in city["tempsMaxLower"]
+                    ],
+                )
             except Exception as e:
                 logger.exception(f"city is {city}")
 
-        week_temps_df = pd.DataFrame(
-            {
-                "city_code": city_codes,
-                "city_name": city_names,
-                "forecast_target_date": forecast_target_dates,
-                "lowest_temperature": lowest_temperatures,
-                "lowest_temperature_upper": lowest_temperature_uppers,
-                "lowest_temperature_lower": lowest_temperature_lowers,
-                "highest_temperature": highest_temperatures,
-                "highest_temperature_upper": highest_temperature_uppers,
-                "highest_temperature_lower": highest_temperature_lowers,
-            }
-        )
-
-        # 取得日時
-        week_temps_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        week_temps_df["report_datetime"] = report_datetime
-        # 気象台名
-        week_temps_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        week_temps_df["forecast_target_date"] = pd.to_datetime(
-            week_temps_df["forecast_target_date"]
-        ).dt.strftime("%Y-%m-%d")
-
-        self.week_temps_df = week_temps_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "city_code",
-                "city_name",
-                "forecast_target_date",
-                "lowest_temperature",
-                "lowest_temperature_upper",
-                "lowest_temperature_lower",
-                "highest_temperature",
-                "highest_temperature_upper",
-                "highest_temperature_lower",
-            ]
-        ]
-
     def __extract_past_tempavg(
         self,
         past_tempavg_dict: dict[str, Any],
         report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        向こう1週間の平年気温を抽出しDataFrameに格納する
+        向こう1週間の平年気温を抽出しtableへ追記する
         Args:
-            fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
+            past_tempavg_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        city_codes: list[str] = []
-        city_names: list[str] = []
-        lowest_temperatures: list[float] = []
-        highest_temperatures: list[float] = []
-
         # エリアごとの情報
         cities = past_tempavg_dict["areas"]
 
         for city in cities:
             try:
-                city_codes += [city["area"]["code"]]
-                city_names += [city["area"]["name"]]
-                # 最低気温
-                lowest_temperatures += [city["min"]]
-                # 最高気温
-                highest_temperatures += [city["max"]]
+                table.append(
+                    1,
+                    get_datetime=self.get_datetime,
+                    report_datetime=report_datetime,
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    city_code=city["area"]["code"],
+                    city_name=city["area"]["name"],
+                    # 最低気温
+                    lowest_temperature=city["min"],
+                    # 最高気温
+                    highest_temperature=city["max"],
+                )
             except Exception as e:
                 logger.exception(f"city is {city}")
 
-        past_tempavg_df = pd.DataFrame(
-            {
-                "city_code": city_codes,
-                "city_name": city_names,
-                "lowest_temperature": lowest_temperatures,
-                "highest_temperature": highest_temperatures,
-            }
-        )
-
-        # 取得日時
-        past_tempavg_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        past_tempavg_df["report_datetime"] = report_datetime
-        # 気象台名
-        past_tempavg_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        self.past_tempavg_df = past_tempavg_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "city_code",
-                "city_name",
-                "lowest_temperature",
-                "highest_temperature",
-            ]
-        ]
-
     def __extract_past_precipitationavg(
         self,
         past_precipitationavg_dict: dict[str, Any],
         report_datetime: str,
         meteorological_observatory_name: str,
+        table: ForecastTableBuilder,
     ):
         """
-        向こう1週間の平年降水量を抽出しDataFrameに格納する
+        向こう1週間の平年降水量を抽出しtableへ追記する
         Args:
-            fewdays_weather_dict: dict[str, Any]: 該当予報値辞書
+            past_precipitationavg_dict: dict[str, Any]: 該当予報値辞書
             report_datetime: str: 気象情報レポート日時
             meteorological_observatory_name: str: 気象台名
+            table: ForecastTableBuilder: 追記先
         """
 
-        city_codes: list[str] = []
-        city_names: list[str] = []
-        precopitation_mins: list[float] = []
-        precopitation_maxs: list[float] = []
-
         # エリアごとの情報
         cities = past_precipitationavg_dict["areas"]
 
         for city in cities:
             try:
-                city_codes += [city["area"]["code"]]
-                city_names += [city["area"]["name"]]
-                # 最低気温
-                precopitation_mins += [city["min"]]
-                # 最高気温
-                precopitation_maxs += [city["max"]]
+                table.append(
+                    1,
+                    get_datetime=self.get_datetime,
+                    report_datetime=report_datetime,
+                    meteorological_observatory_name=meteorological_observatory_name,
+                    city_code=city["area"]["code"],
+                    city_name=city["area"]["name"],
+                    # 最低降水量
+                    precopitation_min=city["min"],
+                    # 最高降水量
+                    precopitation_max=city["max"],
+                )
             except Exception as e:
                 logger.exception(f"city is {city}")
-
-        past_precopitationavg_df = pd.DataFrame(
-            {
-                "city_code": city_codes,
-                "city_name": city_names,
-                "precopitation_min": precopitation_mins,
-                "precopitation_max": precopitation_maxs,
-            }
-        )
-
-        # 取得日時
-        past_precopitationavg_df["get_datetime"] = self.get_datetime
-        # 気象情報レポート日時
-        past_precopitationavg_df["report_datetime"] = report_datetime
-        # 気象台名
-        past_precopitationavg_df[
-            "meteorological_observatory_name"
-        ] = meteorological_observatory_name
-
-        self.past_precopitationavg_df = past_precopitationavg_df[
-            [
-                "get_datetime",
-                "report_datetime",
-                "meteorological_observatory_name",
-                "city_code",
-                "city_name",
-                "precopitation_min",
-                "precopitation_max",
-            ]
-        ]
@@ -0,0 +1,49 @@
+import logging
+
+from utils import bq
+from utils import decorator
+from utils.logger import setup_logger
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+@decorator.set_config
+def bootstrap_tables(config) -> dict[str, str]:
+    """取り込み用のデータセット・テーブルをスキーマ定義(tableschemas/)と設定のレイアウトに合わせて生成・更新
+    パーティション・クラスタリング・パーティションの有効期限・パーティション列の絞り込み必須をconfig["import_data"]から反映する
+    何度実行しても同じ状態になる(変更がなければ何もしない)
+    Args
+        config: 設定値
+    return
+        {テーブル名(config["import_data"]のキー): "created" / "updated" / "unchanged"}
+    """
+
+    # 取り込み用とステージングテーブル用のデータセット
+    dataset_names = [config["import_datasetname"]]
+    if config["merge"]["staging_datasetname"] not in dataset_names:
+        dataset_names.append(config["merge"]["staging_datasetname"])
+    for dataset_name in dataset_names:
+        if not bq.exists_dataset(dataset_name):
+            bq.create_dataset(dataset_name)
+
+    results = {}
+    for table_name, data in config["import_data"].items():
+        results[table_name] = bq.ensure_table(
+            table_id=f"{config['project_id']}.{config['import_datasetname']}.{data['import_table_name']}",
+            schema_path=data["table_schema_path"],
+            partition_field=data["partition_field"],
+            clustering_fields=data.get("clustering_fields"),
+            partition_expiration_days=data.get("partition_expiration_days"),
+            require_partition_filter=data.get("require_partition_filter", False),
+        )
+        logger.info(f"{data['import_table_name']}: {results[table_name]}")
+
+    return results
+
+
+if __name__ == "__main__":
+    # 実行例(リポジトリのルートで): _PROJECT_ID=... python -m services.bootstrapservice
+    setup_logger()
+    bootstrap_tables()
@@ -1,19 +1,57 @@
+from __future__ import annotations
+
+import io
+import glob
+import os
+import time
+import uuid
 import datetime
 import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional, Union
 
-import pandas as pd
-
-from modules.weatherforcast import WeatherForecast
+from modules.weatherforcast import WeatherForecast, TABLE_PRODUCTS
+from modules.forecastcache import ForecastResponseCache
+from modules.observatorycodecache import ObservatoryCodeCache
+from modules.reportwatermark import ReportWatermark
 from utils import gcs
 from utils import bq
 from utils import files
 from utils import jinja2
 from utils import decorator
+from utils import httpclient
+from utils import metrics
+
+# テーブル作成(pandas・numpy)は予報の更新があった場合のみimportする
+if TYPE_CHECKING:
+    from modules.forecasttable import ForecastTables
 
 # loggerの設定
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# テーブルごとのメトリクス(パーティションごとに取り込む場合もテーブル名で集計)
+TABLE_ROWS = metrics.counter("table_rows", "抽出した行数", ("table",))
+IMPORT_FILE_BYTES = metrics.counter(
+    "import_file_bytes", "取り込み用ファイルのバイト数", ("table",)
+)
+BQ_LOAD_SECONDS = metrics.histogram(
+    "bq_load_seconds",
+    "BigQueryへの取り込み時間(秒。ジョブの投入から完了まで)",
+    ("table",),
+)
+BQ_LOADED_ROWS = metrics.counter(
+    "bq_loaded_rows", "BigQueryに取り込んだ行数", ("table",)
+)
+
+# ウォームインスタンスで使い回す気象台コード一覧のキャッシュ(get_observatory_code_cacheで生成)
+_observatory_code_cache: Optional[ObservatoryCodeCache] = None
+# ウォームインスタンスで使い回す取り込み済みレポート日時(get_report_watermarkで生成)
+_report_watermark: Optional[ReportWatermark] = None
+# ウォームインスタンスで使い回すレスポンスキャッシュ(get_response_cacheで生成)
+_response_cache: Optional[ForecastResponseCache] = None
+
 
 def fetch_meteorological_observatory_codes(project_id: str):
     """気象庁コード一覧取得
@@ -25,178 +63,1264 @@ def fetch_meteorological_observatory_codes(project_id: str):
         query_base=query_base, params={"project_id": project_id}
     )
 
-    results = bq.exe_query(query)
-    meteorological_observatory_codes = [
-        row.meteorological_observatory_code for row in results
-    ]
+    with decorator.span("query_observatory_codes") as span:
+        results = bq.exe_query(query)
+        if results is None:
+            # exe_queryは失敗時にログを出してNoneを返す
+            raise RuntimeError("failed to fetch meteorological observatory codes")
+        meteorological_observatory_codes = [
+            row.meteorological_observatory_code for row in results
+        ]
+        span.set(rows=len(meteorological_observatory_codes))
 
     return meteorological_observatory_codes
 
 
-@decorator.set_config
-def request_weather_forecast(config):
-    """予報をリクエストしcsvファイル出力しGCSへアップロード
+def snapshot_functions(config: dict, snapshot: str, snapshot_path: str) -> tuple:
+    """スナップショットを読み書きする関数を生成
     Args
         config: 設定値
+        snapshot: 保存先 "gcs": バケット(コールドスタートでも使える) / "local": tmp_file_dir
+        snapshot_path: 保存先のパス(バケットまたはtmp_file_dirからの相対パス)
+    return
+        (読む関数(なければNone), 書く関数)
     """
 
-    # 気象庁コード一覧取得
-    meteorological_observatory_codes = fetch_meteorological_observatory_codes(
-        project_id=config["project_id"]
+    if snapshot == "gcs":
+
+        def load_snapshot() -> Optional[str]:
+            return gcs.download_as_text(
+                bucket_name=config["bucket_name"], filepath=snapshot_path
+            )
+
+        def save_snapshot(data: str):
+            gcs.upload_from_string(
+                bucket_name=config["bucket_name"],
+                filepath=snapshot_path,
+                data=data,
+                content_type="application/json",
+            )
+
+    else:
+        local_path = f"{config['tmp_file_dir']}/{snapshot_path}"
+
+        def load_snapshot() -> Optional[str]:
+            if not files.exists(local_path):
+                return None
+            return files.read_file(local_path)
+
+        def save_snapshot(data: str):
+            files.write_file(local_path, data)
+
+    return load_snapshot, save_snapshot
+
+
+def get_observatory_code_cache(config: dict) -> ObservatoryCodeCache:
+    """気象台コード一覧のキャッシュを取得
+    初回呼び出し時に生成し、以降(ウォームインスタンスでの次回実行も含む)は同じキャッシュを返す
+    Args
+        config: 設定値
+    return
+        ObservatoryCodeCache
+    """
+    global _observatory_code_cache
+
+    if _observatory_code_cache is not None:
+        return _observatory_code_cache
+
+    settings = config["observatory_codes"]
+    load_snapshot, save_snapshot = snapshot_functions(
+        config=config,
+        snapshot=settings["snapshot"],
+        snapshot_path=settings["snapshot_path"],
     )
 
-    # 各DFを結合するためのリストを準備
-    fewdays_weather_dfs: list[pd.DataFrame] = []
-    tomorrow_pops_dfs: list[pd.DataFrame] = []
-    tomorrow_temps_dfs: list[pd.DataFrame] = []
-    week_weather_dfs: list[pd.DataFrame] = []
-    week_temps_dfs: list[pd.DataFrame] = []
-    past_tempavg_dfs: list[pd.DataFrame] = []
-    past_precopitationavg_dfs: list[pd.DataFrame] = []
+    _observatory_code_cache = ObservatoryCodeCache(
+        fetch=functools.partial(
+            fetch_meteorological_observatory_codes, project_id=config["project_id"]
+        ),
+        load_snapshot=load_snapshot,
+        save_snapshot=save_snapshot,
+        ttl_seconds=settings["ttl_seconds"],
+    )
+    return _observatory_code_cache
 
-    # それぞれの気象庁コードに対してリクエストし、予報を集約したDataFrameを得る
-    for meteorological_observatory_code in meteorological_observatory_codes:
 
-        # コンストラクタでリクエストとDataFrameへの格納をしている
-        weather_forcast = WeatherForecast(meteorological_observatory_code)
+def get_report_watermark(config: dict) -> Optional[ReportWatermark]:
+    """取り込み済みレポート日時を取得
+    初回呼び出し時に生成し、以降(ウォームインスタンスでの次回実行も含む)は同じものを返す
+    Args
+        config: 設定値
+    return
+        ReportWatermark(report_watermark.enabledがfalseの場合はNone)
+    """
+    global _report_watermark
 
-        # 各DataFrameをリストに追加(後で結合)
-        fewdays_weather_dfs.append(weather_forcast.fewdays_weather_df)
-        tomorrow_pops_dfs.append(weather_forcast.tomorrow_pops_df)
-        tomorrow_temps_dfs.append(weather_forcast.tomorrow_temps_df)
-        week_weather_dfs.append(weather_forcast.week_weather_df)
-        week_temps_dfs.append(weather_forcast.week_temps_df)
-        past_tempavg_dfs.append(weather_forcast.past_tempavg_df)
-        past_precopitationavg_dfs.append(weather_forcast.past_precopitationavg_df)
+    settings = config["report_watermark"]
+    if not settings["enabled"]:
+        return None
+    if _report_watermark is not None:
+        return _report_watermark
 
-    # DataFrame結合
-    fewdays_weather_df = pd.concat(fewdays_weather_dfs)
-    tomorrow_pops_df = pd.concat(tomorrow_pops_dfs)
-    tomorrow_temps_df = pd.concat(tomorrow_temps_dfs)
-    week_weather_df = pd.concat(week_weather_dfs)
-    week_temps_df = pd.concat(week_temps_dfs)
-    past_tempavg_df = pd.concat(past_tempavg_dfs)
-    past_precopitationavg_df = pd.concat(past_precopitationavg_dfs)
+    load_snapshot, save_snapshot = snapshot_functions(
+        config=config,
+        snapshot=settings["snapshot"],
+        snapshot_path=settings["snapshot_path"],
+    )
+    _report_watermark = ReportWatermark(
+        load_snapshot=load_snapshot, save_snapshot=save_snapshot
+    )
+    return _report_watermark
 
-    # ファイル出力し GCSへアップロード
-    files.to_csvfile(
-        df=fewdays_weather_df,
-        filename=config["import_data"]["fewdays_weather"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+
+def get_response_cache(config: dict) -> Optional[ForecastResponseCache]:
+    """前回取得時のレスポンスキャッシュを取得
+    初回呼び出し時に生成し、以降(ウォームインスタンスでの次回実行も含む)は同じものを返す
+    Args
+        config: 設定値
+    return
+        ForecastResponseCache(response_cache.enabledがfalseの場合はNone)
+    """
+    global _response_cache
+
+    if not config["response_cache"]["enabled"]:
+        return None
+    if _response_cache is not None:
+        return _response_cache
+
+    _response_cache = ForecastResponseCache(
+        cache_dir=f"{config['tmp_file_dir']}/{config['response_cache']['dirname']}"
     )
-    files.to_csvfile(
-        df=tomorrow_pops_df,
-        filename=config["import_data"]["tomorrow_pops"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+    return _response_cache
+
+
+def reject_imported_table(config: dict, table_name: str):
+    """テーブルの取り込みに失敗した場合、次回そのテーブルのみ取り込み直せるようにする
+    そのテーブルの取り込み済みレポート日時を進めず、そのテーブルに行を取り込む気象台のレスポンスキャッシュに未取り込みとして残す
+    (同じ区分の他のテーブルは取り込み済みになるので、次回取り込み直さない)
+    Args
+        config: 設定値
+        table_name: テーブル名(config["import_data"]のキー。パーティション付きも可)
+    """
+    table_name = split_import_name(table_name)[0]
+    watermark = get_report_watermark(config)
+    if watermark is not None:
+        watermark.reject(table_name)
+    cache = get_response_cache(config)
+    if cache is not None:
+        rejected = cache.reject(table_name)
+        if len(rejected) > 0:
+            logger.info(
+                f"{table_name} is pending in responses of {len(rejected)} observatories"
+            )
+    return
+
+
+def commit_imported_tables(config: dict):
+    """取り込みに成功したテーブルの取り込み済みレポート日時を進め、気象台のレスポンスキャッシュを保存する
+    Args
+        config: 設定値
+    """
+    watermark = get_report_watermark(config)
+    if watermark is not None:
+        watermark.commit()
+    cache = get_response_cache(config)
+    if cache is not None:
+        cache.commit()
+    return
+
+
+def fetch_weather_forecasts(
+    meteorological_observatory_codes: list[str],
+    max_workers: int = 1,
+    session=None,
+    timeout: Optional[Union[float, tuple[float, float]]] = None,
+    cache: Optional[ForecastResponseCache] = None,
+) -> list[WeatherForecast]:
+    """気象台ごとに予報をリクエスト
+    max_workersが2以上の場合はスレッドプールで並行にリクエストする
+    params
+        meteorological_observatory_codes: list[str]: 気象庁コードの一覧リスト
+        max_workers: int: 同時リクエスト数の上限
+        session: requests.Session: リクエストに使うセッション(省略時は共有セッション)
+        timeout: Optional[Union[float, tuple[float, float]]]: リクエストのタイムアウト秒
+        cache: Optional[ForecastResponseCache]: 条件付きリクエスト用のレスポンスキャッシュ
+    return
+        WeatherForecastのリスト(気象庁コード一覧と同じ順序)
+    """
+
+    new_weather_forecast = functools.partial(
+        WeatherForecast, session=session, timeout=timeout, cache=cache
     )
-    files.to_csvfile(
-        df=tomorrow_temps_df,
-        filename=config["import_data"]["tomorrow_temps"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+
+    if max_workers <= 1:
+        return [
+            new_weather_forecast(meteorological_observatory_code)
+            for meteorological_observatory_code in meteorological_observatory_codes
+        ]
+
+    # mapは入力順に結果を返すので完了順によらず並びは一定
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(new_weather_forecast, meteorological_observatory_codes)
+        )
+
+
+def split_import_name(import_name: str) -> tuple:
+    """取り込み名をテーブル名とパーティションに分ける
+    write_modeが"partition"の場合の取り込み名は"{テーブル名}${パーティション}"になる
+    Args
+        import_name: 取り込み名
+    return
+        (テーブル名(config["import_data"]のキー), パーティション("%Y%m%d"。なければNone))
+    """
+    table_name, _, partition = import_name.partition("$")
+    return table_name, partition or None
+
+
+def partition_filename(filename: str, partition: str) -> str:
+    """パーティションごとの取り込み用ファイル名
+    Args
+        filename: 取り込み用ファイル名(config["import_data"]のfilename)
+        partition: パーティション("%Y%m%d")
+    return
+        "{拡張子を除いたファイル名}_{パーティション}{拡張子}"
+    """
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_{partition}{ext}"
+
+
+def import_table_data(config: dict, import_name: str) -> dict:
+    """取り込み名に対応する取り込みテーブルの設定値
+    パーティション付きの場合はfilenameをパーティションごとのファイル名にし、partitionを加える
+    Args
+        config: 設定値
+        import_name: 取り込み名(テーブル名または"{テーブル名}${パーティション}")
+    return
+        取り込みテーブルの設定値(config["import_data"]の要素)
+    """
+    table_name, partition = split_import_name(import_name)
+    data = config["import_data"][table_name]
+    if partition is None:
+        return data
+    return {
+        **data,
+        "filename": partition_filename(data["filename"], partition),
+        "partition": partition,
+    }
+
+
+def split_import_dataframes(dataframes: dict, config: dict) -> dict:
+    """テーブルごとのDataFrameをDAYパーティションごとに分割(write_modeが"partition"の場合)
+    Args
+        dataframes: {テーブル名(config["import_data"]のキー): DataFrame}
+        config: 設定値
+    return
+        {"{テーブル名}${パーティション}": DataFrame}
+    """
+    partitioned = {}
+    for table_name, df in dataframes.items():
+        partition_field = config["import_data"][table_name]["partition_field"]
+        for partition, partition_df in bq.split_by_partition(
+            df, partition_field
+        ).items():
+            partitioned[bq.partition_decorator(table_name, partition)] = partition_df
+
+    logger.info(f"split {len(dataframes)} tables into {len(partitioned)} partitions")
+    return partitioned
+
+
+def conform_import_dataframe(df, data: dict):
+    """取り込み用ファイルの形式(csv/parquet/avro)に合わせてDataFrameをスキーマ定義に合わせて変換
+    Args
+        df: DataFrame
+        data: 取り込みテーブルの設定値(config["import_data"]の要素)
+    return
+        (変換後のDataFrame, ファイル形式, 書き込み用スキーマ(csvはNone))
+    """
+
+    file_format = data.get("format", "csv")
+
+    # 形式ごとにスキーマ定義に合わせて変換
+    schema = None
+    if file_format == "parquet":
+        df = bq.conform_dataframe(df, table_schema_path=data["table_schema_path"])
+        schema = bq.to_arrow_schema(data["table_schema_path"])
+    elif file_format == "avro":
+        df = bq.conform_dataframe(
+            df, table_schema_path=data["table_schema_path"], datetime_as_string=True
+        )
+        schema = bq.to_avro_schema(
+            data["table_schema_path"], name=data["import_table_name"]
+        )
+    elif file_format != "csv":
+        raise ValueError(f"unknown file format: {file_format}")
+
+    return df, file_format, schema
+
+
+def output_import_file(df, data: dict, config: dict):
+    """取り込み用ファイルを設定された形式(csv/parquet/avro)で出力しGCSへアップロード
+    upload_modeが"stream"の場合はローカルに書き出さずGCSへ直接出力する
+    Args
+        df: DataFrame
+        data: 取り込みテーブルの設定値(config["import_data"]の要素)
+        config: 設定値
+    return
+        出力したファイルのバイト数
+    """
+
+    df, file_format, schema = conform_import_dataframe(df, data)
+
+    if config["upload_mode"] == "stream":
+        return files.to_gcsfile(
+            df=df,
+            filename=data["filename"],
+            bucket_name=config["bucket_name"],
+            gcs_filename_prefix=config["gcs_import_dir"],
+            file_format=file_format,
+            schema=schema,
+            compression=data.get("compression"),
+        )
+
+    if file_format == "csv":
+        files.to_csvfile(
+            df=df,
+            filename=data["filename"],
+            local_dir=config["tmp_file_dir"],
+            bucket_name=config["bucket_name"],
+            gcs_filename_prefix=config["gcs_import_dir"],
+            index=False,
+        )
+    elif file_format == "parquet":
+        files.to_parquetfile(
+            df=df,
+            filename=data["filename"],
+            local_dir=config["tmp_file_dir"],
+            schema=schema,
+            compression=data.get("compression", "snappy"),
+            bucket_name=config["bucket_name"],
+            gcs_filename_prefix=config["gcs_import_dir"],
+        )
+    else:
+        files.to_avrofile(
+            df=df,
+            filename=data["filename"],
+            local_dir=config["tmp_file_dir"],
+            schema=schema,
+            codec=data.get("compression", "deflate"),
+            bucket_name=config["bucket_name"],
+            gcs_filename_prefix=config["gcs_import_dir"],
+        )
+
+    return os.path.getsize(f"{config['tmp_file_dir']}/{data['filename']}")
+
+
+def errordir_timestamp() -> str:
+    """エラーディレクトリ用タイムスタンプ(JST)
+    return
+        "%Y%m%d%H%M%S"
+    """
+    now = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=9), "JST"))
+    return now.strftime("%Y%m%d%H%M%S")
+
+
+def validate_import_dataframes(tables: ForecastTables, config: dict) -> dict:
+    """テーブルごとのDataFrameをスキーマ定義と照合し、取り込めるものだけ返す
+    照合に失敗したテーブルは取り込みジョブを待たずにcsvにしてGCSのエラーディレクトリにアップロードする
+    Args
+        tables: ForecastTables: 全気象台分の行を溜めたテーブル
+        config: 設定値
+    return
+        {テーブル名: DataFrame}(config["import_data"]の順。行のないテーブルは含まない)
+    """
+
+    now_str = None
+    dataframes = {}
+    for table_name, data in config["import_data"].items():
+        with decorator.span("to_dataframe", table=table_name) as span:
+            df = tables.to_dataframe(table_name)
+            span.set(rows=len(df))
+        TABLE_ROWS.inc(len(df), table=table_name)
+        if len(df) == 0:
+            # 全気象台で取り込み済みの区分のテーブルは出力しない
+            continue
+        try:
+            bq.validate_dataframe(
+                df,
+                table_schema_path=data["table_schema_path"],
+                column_aliases=data.get("column_aliases"),
+            )
+        except ValueError:
+            logger.exception(f"Schema Error: {table_name}")
+            reject_imported_table(config=config, table_name=table_name)
+            now_str = now_str or errordir_timestamp()
+            upload_importbuffer_to_errordir(
+                config=config, data=data, buffer=files.to_buffer(df), now_str=now_str
+            )
+            continue
+        dataframes[table_name] = df
+
+    return dataframes
+
+
+@decorator.set_config
+def request_weather_forecast(config) -> list[str]:
+    """予報をリクエストしcsvファイル出力しGCSへアップロード
+    load_modeが"gcs"以外の場合はBQのテーブルへの取り込みまで行う(write_modeが"merge"の場合はMERGEまで)
+    Args
+        config: 設定値
+    return
+        取り込み対象のテーブル名(config["import_data"]のキー)のリスト
+        (予報の更新がない場合やスキーマ定義と合わないテーブルは含まない。空のときファイルは出力しない)
+        (write_modeが"partition"の場合は"{テーブル名}${パーティション}"のリスト)
+
+    write_modeが"partition"の場合、その日のパーティションは今回の実行の行だけに置き換わる
+    気象庁は1日に複数回(5時・11時・17時)発表するため、同じ日の前の発表分の行は削除される
+    (日ごとに全行を取り込み直す再処理用。response_cache・report_watermarkで省いた気象台・区分の行も削除されるため併用できない)
+    """
+
+    # パーティションを置き換える場合、今回取り込まない行が削除されるので省く設定とは併用しない
+    if config["write_mode"] == "partition":
+        if config["load_mode"] == "storage_write":
+            raise ValueError(
+                'write_mode "partition" requires load_mode "gcs" or "direct"'
+            )
+        if config["response_cache"]["enabled"] or config["report_watermark"]["enabled"]:
+            raise ValueError(
+                'write_mode "partition" requires response_cache and report_watermark disabled'
+            )
+
+    # 取り込み済みレポート日時とレスポンスキャッシュ(前回の実行が途中で失敗した場合の取り込み中の分は破棄)
+    watermark = get_report_watermark(config)
+    if watermark is not None:
+        watermark.discard()
+    cache = get_response_cache(config)
+    if cache is not None:
+        cache.discard()
+
+    # 気象庁コード一覧取得(キャッシュが古ければ取得し直す)
+    meteorological_observatory_codes = get_observatory_code_cache(config).get()
+
+    # 共有セッション(ウォームインスタンスでは前回実行時のコネクションを再利用)
+    session = httpclient.get_session(
+        pool_maxsize=config["http"]["pool_maxsize"],
+        retries=config["http"]["retries"],
+        backoff_factor=config["http"]["backoff_factor"],
     )
-    files.to_csvfile(
-        df=week_weather_df,
-        filename=config["import_data"]["week_weather"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+
+    # それぞれの気象庁コードに対してリクエスト
+    # (前回取得時のレスポンスキャッシュがあれば条件付きリクエストとし、更新のない気象台はダウンロード・抽出しない)
+    weather_forcasts = fetch_weather_forecasts(
+        meteorological_observatory_codes=meteorological_observatory_codes,
+        max_workers=config["request_max_workers"],
+        session=session,
+        timeout=tuple(config["http"]["timeout"]),
+        cache=cache,
     )
-    files.to_csvfile(
-        df=week_temps_df,
-        filename=config["import_data"]["week_temps"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+
+    # 更新のあった気象台のみ取り込む
+    weather_forcasts = [
+        weather_forcast
+        for weather_forcast in weather_forcasts
+        if weather_forcast.is_modified
+    ]
+    logger.info(
+        f"updated offices: {len(weather_forcasts)}/{len(meteorological_observatory_codes)}"
     )
-    files.to_csvfile(
-        df=past_tempavg_df,
-        filename=config["import_data"]["past_tempavg"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+    if len(weather_forcasts) == 0:
+        return []
+
+    # 全気象台分の行を溜めるテーブルごとのビルダー
+    from modules.forecasttable import ForecastTables
+
+    tables = ForecastTables(
+        capacity=config["table_buffer_rows"] * len(weather_forcasts)
     )
-    files.to_csvfile(
-        df=past_precopitationavg_df,
-        filename=config["import_data"]["past_precopitationavg"]["filename"],
-        local_dir=config["tmp_file_dir"],
-        bucket_name=config["bucket_name"],
-        gcs_filename_prefix=config["gcs_import_dir"],
-        index=False,
+    advanced_count = 0
+    for weather_forcast in weather_forcasts:
+        if watermark is not None:
+            # レポート日時が取り込み済みより進んでいるテーブルのみ抽出する
+            report_datetimes = weather_forcast.report_datetimes()
+            table_datetimes = {
+                table_name: report_datetimes[product]
+                for table_name, product in TABLE_PRODUCTS.items()
+            }
+            table_names = watermark.advanced_tables(
+                weather_forcast.area_code, table_datetimes
+            )
+            for table_name in table_names:
+                watermark.stage(
+                    weather_forcast.area_code,
+                    table_name,
+                    table_datetimes[table_name],
+                )
+        elif cache is not None:
+            # 前回と同じレスポンスは取り込めていないテーブルのみ抽出する
+            table_names = cache.pending_tables(
+                weather_forcast.area_code, weather_forcast.response_text
+            )
+            if table_names is None:
+                table_names = list(TABLE_PRODUCTS)
+        else:
+            table_names = list(TABLE_PRODUCTS)
+
+        # レスポンスキャッシュは取り込み後に、失敗したテーブルを未取り込みとして保存する
+        if cache is not None:
+            cache.stage(
+                area_code=weather_forcast.area_code,
+                etag=weather_forcast.etag,
+                last_modified=weather_forcast.last_modified,
+                body=weather_forcast.response_text,
+                table_names=table_names,
+            )
+        if len(table_names) == 0:
+            continue
+        with decorator.span("parse", area_code=weather_forcast.area_code):
+            weather_forcast.append_to(tables, table_names=table_names)
+        advanced_count += 1
+
+    logger.info(f"advanced offices: {advanced_count}/{len(weather_forcasts)}")
+    if advanced_count == 0:
+        # 取り込むものがないのでレスポンスキャッシュのみ保存する
+        commit_imported_tables(config)
+        return []
+
+    # テーブルごとに1度だけDataFrameにし、アップロード前にスキーマ定義と照合
+    dataframes = validate_import_dataframes(tables=tables, config=config)
+    if len(dataframes) == 0:
+        # 全テーブルが照合に失敗した場合も、失敗したテーブルを未取り込みとしてレスポンスキャッシュを保存する
+        # (取り込み処理が呼ばれずcommitされないと、取り込むもののなかった気象台まで次回取得し直すため)
+        commit_imported_tables(config)
+        return []
+
+    # パーティションごとに置き換えるため日ごとに分ける
+    if config["write_mode"] == "partition":
+        dataframes = split_import_dataframes(dataframes=dataframes, config=config)
+
+    # GCSを経由せずメモリ上のファイルから直接BQへ取り込む
+    if config["load_mode"] == "direct":
+        dataframes_to_bqtable(dataframes=dataframes, config=config)
+        commit_imported_tables(config)
+        return list(dataframes)
+
+    # GCSを経由せずStorage Write APIで行を書き込む
+    if config["load_mode"] == "storage_write":
+        write_dataframes_to_bqtable(dataframes=dataframes, config=config)
+        commit_imported_tables(config)
+        return list(dataframes)
+
+    # ファイル出力し GCSへアップロード
+    for import_name, df in dataframes.items():
+        with decorator.span("output_file", table=import_name, rows=len(df)) as span:
+            size = output_import_file(
+                df=df, data=import_table_data(config, import_name), config=config
+            )
+            span.set(bytes=size)
+        IMPORT_FILE_BYTES.inc(size, table=split_import_name(import_name)[0])
+
+    return list(dataframes)
+
+
+def dataframes_to_bqtable(dataframes: dict, config: dict):
+    """テーブルごとのDataFrameをメモリ上のファイルにしてBQのテーブルへ直接insert(load_modeが"direct"の場合)
+    取り込みに失敗したテーブルはファイルをGCSのエラーディレクトリにアップロードする
+    Args
+        dataframes: {テーブル名(config["import_data"]のキー): DataFrame}
+            (write_modeが"partition"の場合はキーが"{テーブル名}${パーティション}"で、パーティションごとに置き換える)
+        config: 設定値
+    """
+
+    # エラーディレクトリ用タイムスタンプを準備
+    now_str = errordir_timestamp()
+    run_id = import_run_id(now_str)
+
+    # 取り込み用のメモリ上のファイルを先に全テーブル分作る
+    buffers = {}
+    source_formats = {}
+    for table_name, df in dataframes.items():
+        data = import_table_data(config, table_name)
+        try:
+            with decorator.span("serialize", table=table_name, rows=len(df)) as span:
+                df, file_format, schema = conform_import_dataframe(df, data)
+                buffers[table_name] = files.to_buffer(
+                    df,
+                    file_format=file_format,
+                    schema=schema,
+                    compression=data.get("compression"),
+                )
+                span.set(bytes=buffers[table_name].getbuffer().nbytes)
+            IMPORT_FILE_BYTES.inc(
+                span.attrs["bytes"], table=split_import_name(table_name)[0]
+            )
+            source_formats[table_name] = file_format.upper()
+        except:
+            logger.exception(f"Import Error: {data['filename']} to BigQuery Table")
+            reject_imported_table(config=config, table_name=table_name)
+            buffer = buffers.pop(table_name, None)
+            if buffer is not None:
+                upload_importbuffer_to_errordir(
+                    config=config, data=data, buffer=buffer, now_str=now_str
+                )
+
+    def start_load_job(table_name, dataset_name, load_table_name, partition_field):
+        data = import_table_data(config, table_name)
+        return bq.start_fileobj_to_table(
+            project_id=config["project_id"],
+            dataset_name=dataset_name,
+            table_name=load_table_name,
+            table_schema_path=data["table_schema_path"],
+            file_obj=buffers[table_name],
+            replace="partition" in data,
+            partition_field=partition_field,
+            skip_leading_rows=data["skip_leading_rows"],
+            source_format=source_formats[table_name],
+        )
+
+    def record_failure(table_name):
+        upload_importbuffer_to_errordir(
+            config=config,
+            data=import_table_data(config, table_name),
+            buffer=buffers[table_name],
+            now_str=now_str,
+        )
+
+    load_import_tables(
+        config=config,
+        table_names=list(buffers),
+        run_id=run_id,
+        start_load_job=start_load_job,
+        record_failure=record_failure,
     )
 
     return
 
 
 @decorator.set_config
-def gcsweatherforecastfiles_to_bqtable(config):
-    """GCS上に保存した予報CSVファイルをBQのテーブルへinsert
+def gcsweatherforecastfiles_to_bqtable(config, table_names: Optional[list[str]] = None):
+    """GCS上に保存した予報ファイルをBQのテーブルへinsert
+    load_modeが"gcs"以外の場合は取り込み済みなので何もしない
     Args
         config: 設定値
+        table_names: 取り込むテーブル名(config["import_data"]のキー)のリスト(省略時は全テーブル)
+            (write_modeが"partition"の場合は"{テーブル名}${パーティション}"のリストで、パーティションごとに置き換える)
     """
+    if config["load_mode"] != "gcs":
+        return
 
     # エラーディレクトリ用タイムスタンプを準備
-    now = datetime.datetime.now(datetime.timezone(datetime.timedelta(hours=9), "JST"))
-    now_str = now.strftime("%Y%m%d%H%M%S")
+    now_str = errordir_timestamp()
+    run_id = import_run_id(now_str)
+
+    if table_names is None:
+        table_names = list(config["import_data"])
+
+    def start_load_job(table_name, dataset_name, load_table_name, partition_field):
+        data = import_table_data(config, table_name)
+        return bq.start_file_to_table(
+            project_id=config["project_id"],
+            dataset_name=dataset_name,
+            table_name=load_table_name,
+            table_schema_path=data["table_schema_path"],
+            source_file_uri=f"gs://{config['bucket_name']}/{config['gcs_import_dir']}/{data['filename']}",
+            replace="partition" in data,
+            partition_field=partition_field,
+            skip_leading_rows=data["skip_leading_rows"],
+            source_format=data.get("format", "csv").upper(),
+        )
+
+    failed_data = []
+    load_import_tables(
+        config=config,
+        table_names=table_names,
+        run_id=run_id,
+        start_load_job=start_load_job,
+        record_failure=lambda table_name: failed_data.append(
+            import_table_data(config, table_name)
+        ),
+    )
+
+    # 失敗したテーブルのファイルはまとめてエラーディレクトリにコピー
+    if len(failed_data) > 0:
+        copy_importfiles_to_errordir(
+            config=config, failed_data=failed_data, now_str=now_str
+        )
+
+    # 取り込みに成功した区分のレポート日時を取り込み済みにし、レスポンスキャッシュを保存する
+    commit_imported_tables(config)
+
+    return
 
-    for data in config["import_data"].values():
 
+def load_import_tables(
+    config: dict,
+    table_names: list[str],
+    run_id: str,
+    start_load_job: Callable,
+    record_failure: Callable[[str], None],
+):
+    """テーブルごとの取り込みジョブを全て投入してからまとめて待つ(BigQuery側で並行に処理される)
+    write_modeが"merge"の場合はステージングテーブルからMERGEし、ステージングテーブルを削除する
+    失敗したテーブルは取り込み済みレポート日時・レスポンスキャッシュを進めず、record_failureを呼ぶ
+    Args
+        config: 設定値
+        table_names: 取り込み名(テーブル名または"{テーブル名}${パーティション}")のリスト
+        run_id: 取り込み実行ごとのID
+        start_load_job: (table_name, dataset_name, load_table_name, partition_field)を受け取り、取り込みジョブを投入して返す関数
+        record_failure: 取り込みに失敗した取り込み名を受け取る関数(エラーディレクトリへの保存)
+    """
+
+    # 全テーブル分の取り込みジョブを先に投入
+    load_jobs = {}
+    submitted = {}
+    for table_name in table_names:
+        data = import_table_data(config, table_name)
         try:
-            bq.file_to_table(
-                project_id=config["project_id"],
-                dataset_name=config["import_datasetname"],
-                table_name=data["import_table_name"],
-                table_schema_path=data["table_schema_path"],
-                source_file_uri=f"gs://{config['bucket_name']}/{config['gcs_import_dir']}/{data['filename']}",
-                replace=False,
-                partition_field=data["partition_field"],
-                skip_leading_rows=data["skip_leading_rows"],
+            dataset_name, load_table_name, partition_field = load_destination(
+                config=config, table_name=table_name, run_id=run_id
+            )
+            submitted[table_name] = time.perf_counter()
+            load_jobs[table_name] = start_load_job(
+                table_name=table_name,
+                dataset_name=dataset_name,
+                load_table_name=load_table_name,
+                partition_field=partition_field,
             )
         except:
-            gcs.copy_blob(
-                bucket_name=config["bucket_name"],
-                blob_name=f"{config['gcs_import_dir']}/{data['filename']}",
-                destination_bucket_name=config["bucket_name"],
-                destination_blob_name=f"{config['gcs_error_dir']}/{now_str}/{data['filename']}",
+            logger.exception(f"Import Error: {data['filename']} to BigQuery Table")
+            reject_imported_table(config=config, table_name=table_name)
+            record_failure(table_name)
+
+    # 投入したジョブの完了をまとめて待つ(失敗はテーブルごとに扱う)
+    loaded_table_names = []
+    for table_name, load_job in load_jobs.items():
+        data = import_table_data(config, table_name)
+        try:
+            # 投入から完了までを計測
+            with decorator.span(
+                "load", started=submitted[table_name], table=table_name
+            ) as span:
+                span.set(rows=bq.wait_load_job(load_job))
+            observe_load(table_name, span)
+        except:
+            logger.exception(f"Import Error: {data['filename']} to BigQuery Table")
+            reject_imported_table(config=config, table_name=table_name)
+            record_failure(table_name)
+            continue
+        loaded_table_names.append(table_name)
+
+    # ステージングテーブルから取り込みテーブルへMERGE(write_modeが"merge"の場合)
+    if config["write_mode"] == "merge":
+        for table_name in merge_staging_tables(
+            config=config, table_names=loaded_table_names, run_id=run_id
+        ):
+            record_failure(table_name)
+        delete_staging_tables(config=config, table_names=table_names, run_id=run_id)
+
+    return
+
+
+def copy_importfiles_to_errordir(config: dict, failed_data: list[dict], now_str: str):
+    """取り込みに失敗したファイルをGCSのエラーディレクトリに1回のバッチリクエストでコピー
+    Args
+        config: 設定値
+        failed_data: 取り込みに失敗したテーブルの設定値(config["import_data"]の要素)のリスト
+        now_str: エラーディレクトリ用タイムスタンプ
+    """
+    gcs.batch_copy_blobs(
+        bucket_name=config["bucket_name"],
+        blob_names=[
+            f"{config['gcs_import_dir']}/{data['filename']}" for data in failed_data
+        ],
+        destination_bucket_name=config["bucket_name"],
+        destination_blob_names=[
+            f"{config['gcs_error_dir']}/{now_str}/{data['filename']}"
+            for data in failed_data
+        ],
+    )
+    return
+
+
+def write_dataframes_to_bqtable(dataframes: dict, config: dict):
+    """テーブルごとのDataFrameをStorage Write APIでBQのテーブルへ書き込む(load_modeが"storage_write"の場合)
+    反映されなかった行はcsvにしてGCSのエラーディレクトリにアップロードする
+    全行が反映されなかったテーブルは取り込み済みレポート日時・レスポンスキャッシュを進めない(次回取り込み直す)
+    stream_typeが"committed"で一部の行だけ反映された場合は、取り込み直すと反映済みの行が重複するので進める
+    (反映されなかったバッチの行はエラーディレクトリにのみ残る)
+    Args
+        dataframes: {テーブル名(config["import_data"]のキー): DataFrame}
+        config: 設定値
+    """
+
+    # エラーディレクトリ用タイムスタンプを準備
+    now_str = errordir_timestamp()
+    run_id = import_run_id(now_str)
+
+    written_table_names = []
+    for table_name, df in dataframes.items():
+        data = config["import_data"][table_name]
+        try:
+            dataset_name, load_table_name, _ = load_destination(
+                config=config, table_name=table_name, run_id=run_id
+            )
+            with decorator.span("write_rows", table=table_name, rows=len(df)) as span:
+                row_errors, unwritten_rows = bq.write_rows_to_table(
+                    project_id=config["project_id"],
+                    dataset_name=dataset_name,
+                    table_name=load_table_name,
+                    table_schema_path=data["table_schema_path"],
+                    df=df,
+                    stream_type=config["storage_write"]["stream_type"].upper(),
+                    batch_rows=config["storage_write"]["batch_rows"],
+                )
+                span.set(rows=len(df) - len(unwritten_rows))
+        except:
+            # 書き込みを始める前(committedの場合)またはコミット前(pendingの場合)の失敗なので何も反映されていない
+            logger.exception(f"Write Error: {table_name} to BigQuery Table")
+            row_errors, unwritten_rows = [], list(range(len(df)))
+
+        for row_error in row_errors[:10]:
+            logger.error(f"Row Error: {table_name}: {row_error}")
+
+        if len(unwritten_rows) < len(df):
+            observe_load(table_name, span)
+            written_table_names.append(table_name)
+        else:
+            reject_imported_table(config=config, table_name=table_name)
+
+        if len(unwritten_rows) > 0:
+            logger.error(
+                f"Not written: {table_name}: {len(unwritten_rows)}/{len(df)} rows"
+            )
+            upload_importbuffer_to_errordir(
+                config=config,
+                data=data,
+                buffer=files.to_buffer(df.iloc[unwritten_rows]),
+                now_str=now_str,
+            )
+
+    # ステージングテーブルから取り込みテーブルへMERGE(write_modeが"merge"の場合)
+    if config["write_mode"] == "merge":
+        for table_name in merge_staging_tables(
+            config=config, table_names=written_table_names, run_id=run_id
+        ):
+            upload_importbuffer_to_errordir(
+                config=config,
+                data=config["import_data"][table_name],
+                buffer=files.to_buffer(dataframes[table_name]),
+                now_str=now_str,
             )
-            logger.error(f"Import Error: {data['filename']} to BigQuery Table")
+        delete_staging_tables(
+            config=config, table_names=list(dataframes), run_id=run_id
+        )
+
+    return
+
+
+def observe_load(import_name: str, span: decorator.Span):
+    """取り込みに成功したテーブルの時間・行数をメトリクスに記録
+    Args
+        import_name: 取り込み名(テーブル名または"{テーブル名}${パーティション}")
+        span: 取り込みの区間(rowsに取り込んだ行数)
+    """
+    table_name, _ = split_import_name(import_name)
+    BQ_LOAD_SECONDS.observe(span.seconds, table=table_name)
+    BQ_LOADED_ROWS.inc(span.attrs.get("rows") or 0, table=table_name)
+    return
 
+
+def import_run_id(now_str: str) -> str:
+    """取り込み実行ごとのID(ステージングテーブル名に付け、重複実行とぶつからないようにする)
+    Args
+        now_str: エラーディレクトリ用タイムスタンプ
+    return
+        "{タイムスタンプ}_{ランダムな8文字}"
+    """
+    return f"{now_str}_{uuid.uuid4().hex[:8]}"
+
+
+def staging_table_name(config: dict, table_name: str, run_id: str) -> str:
+    """ステージングテーブル名
+    Args
+        config: 設定値
+        table_name: テーブル名(config["import_data"]のキー)
+        run_id: 取り込み実行ごとのID
     return
+        "{取り込みテーブル名}_staging_{run_id}"
+    """
+    return f"{config['import_data'][table_name]['import_table_name']}_staging_{run_id}"
 
 
+def load_destination(config: dict, table_name: str, run_id: str) -> tuple:
+    """取り込み先のテーブル
+    write_modeが"merge"の場合は有効期限付きのステージングテーブルを生成してそちらに取り込む
+    write_modeが"partition"の場合はパーティションデコレータ付きのテーブル名を返す
+    Args
+        config: 設定値
+        table_name: テーブル名(config["import_data"]のキー。パーティション付きも可)
+        run_id: 取り込み実行ごとのID
+    return
+        (データセット名, テーブル名, パーティション列(ステージングテーブルはNone))
+    """
+
+    data = import_table_data(config, table_name)
+    if config["write_mode"] != "merge":
+        load_table_name = data["import_table_name"]
+        if "partition" in data:
+            # パーティションデコレータでそのパーティションのみに書き込む
+            load_table_name = bq.partition_decorator(load_table_name, data["partition"])
+        return config["import_datasetname"], load_table_name, data["partition_field"]
+
+    dataset_name = config["merge"]["staging_datasetname"]
+    load_table_name = staging_table_name(config, table_name, run_id)
+    bq.create_staging_table(
+        project_id=config["project_id"],
+        dataset_name=dataset_name,
+        table_name=load_table_name,
+        table_schema_path=data["table_schema_path"],
+        expiration_minutes=config["merge"]["staging_expiration_minutes"],
+    )
+    return dataset_name, load_table_name, None
+
+
+def fetch_staging_partition_ranges(
+    config: dict, table_names: list[str], run_id: str
+) -> dict[str, tuple]:
+    """ステージングテーブルごとのパーティション列の範囲を1回のクエリで取得
+    Args
+        config: 設定値
+        table_names: テーブル名(config["import_data"]のキー)のリスト
+        run_id: 取り込み実行ごとのID
+    return
+        {テーブル名: (最小値, 最大値)}(行がない場合は(None, None))
+    """
+
+    query_base: str = files.read_file("sqls/fetch_staging_partition_ranges.sql")
+    query = jinja2.embed_to_query(
+        query_base=query_base,
+        params={
+            "project_id": config["project_id"],
+            "staging_dataset_name": config["merge"]["staging_datasetname"],
+            "tables": [
+                {
+                    "table_name": table_name,
+                    "staging_table_name": staging_table_name(
+                        config, table_name, run_id
+                    ),
+                    "partition_field": config["import_data"][table_name][
+                        "partition_field"
+                    ],
+                }
+                for table_name in table_names
+            ],
+        },
+    )
+
+    results = bq.exe_query(query)
+    if results is None:
+        # exe_queryは失敗時にログを出してNoneを返す
+        raise RuntimeError("failed to fetch staging partition ranges")
+
+    return {row.table_name: (row.partition_min, row.partition_max) for row in results}
+
+
+def build_merge_query(
+    config: dict, table_name: str, run_id: str, partition_range: tuple
+) -> str:
+    """ステージングテーブルから取り込みテーブルへのMERGEクエリをスキーマ定義から組み立てる
+    Args
+        config: 設定値
+        table_name: テーブル名(config["import_data"]のキー)
+        run_id: 取り込み実行ごとのID
+        partition_range: ステージングテーブルのパーティション列の(最小値, 最大値)
+    return
+        MERGEクエリ
+    """
+
+    data = config["import_data"][table_name]
+    fields = bq.read_table_schema(data["table_schema_path"])
+    partition_types = {field["name"]: field["type"] for field in fields}
+
+    query_base: str = files.read_file("sqls/merge_import_table.sql")
+    return jinja2.embed_to_query(
+        query_base=query_base,
+        params={
+            "project_id": config["project_id"],
+            "dataset_name": config["import_datasetname"],
+            "table_name": data["import_table_name"],
+            "staging_dataset_name": config["merge"]["staging_datasetname"],
+            "staging_table_name": staging_table_name(config, table_name, run_id),
+            "merge_keys": data["merge_keys"],
+            "update_columns": [
+                field["name"]
+                for field in fields
+                if field["name"] not in data["merge_keys"]
+            ],
+            "partition_field": data["partition_field"],
+            "partition_type": partition_types[data["partition_field"]],
+            "partition_min": partition_range[0],
+            "partition_max": partition_range[1],
+        },
+    )
+
+
+def merge_staging_tables(
+    config: dict, table_names: list[str], run_id: str
+) -> list[str]:
+    """ステージングテーブルから取り込みテーブルへMERGE(write_modeが"merge"の場合)
+    全テーブル分のMERGEを先に投入してからまとめて待つ
+    失敗したテーブルは取り込み済みレポート日時を進めない
+    Args
+        config: 設定値
+        table_names: ステージングテーブルへの取り込みに成功したテーブル名(config["import_data"]のキー)のリスト
+        run_id: 取り込み実行ごとのID
+    return
+        MERGEに失敗したテーブル名のリスト
+    """
+
+    if len(table_names) == 0:
+        return []
+
+    failed_table_names = []
+    try:
+        partition_ranges = fetch_staging_partition_ranges(
+            config=config, table_names=table_names, run_id=run_id
+        )
+    except:
+        logger.exception("Merge Error: staging partition ranges")
+        partition_ranges = {}
+
+    query_jobs = {}
+    submitted = {}
+    for table_name in table_names:
+        try:
+            partition_range = partition_ranges[table_name]
+            if partition_range[0] is None:
+                # ステージングテーブルに行がない
+                continue
+            submitted[table_name] = time.perf_counter()
+            query_jobs[table_name] = bq.start_query(
+                build_merge_query(
+                    config=config,
+                    table_name=table_name,
+                    run_id=run_id,
+                    partition_range=partition_range,
+                )
+            )
+        except:
+            logger.exception(f"Merge Error: {table_name} to BigQuery Table")
+            reject_imported_table(config=config, table_name=table_name)
+            failed_table_names.append(table_name)
+
+    for table_name, query_job in query_jobs.items():
+        try:
+            # 投入から完了までを計測
+            with decorator.span(
+                "merge", started=submitted[table_name], table=table_name
+            ):
+                bq.wait_query_job(query_job)
+        except:
+            logger.exception(f"Merge Error: {table_name} to BigQuery Table")
+            reject_imported_table(config=config, table_name=table_name)
+            failed_table_names.append(table_name)
+
+    return failed_table_names
+
+
+@decorator.timer("cleanup_staging_tables")
+def delete_staging_tables(config: dict, table_names: list[str], run_id: str):
+    """ステージングテーブルを削除(失敗しても有効期限で削除されるのでログのみ)
+    Args
+        config: 設定値
+        table_names: テーブル名(config["import_data"]のキー)のリスト
+        run_id: 取り込み実行ごとのID
+    """
+    for table_name in table_names:
+        try:
+            bq.delete_table(
+                project_id=config["project_id"],
+                dataset_name=config["merge"]["staging_datasetname"],
+                table_name=staging_table_name(config, table_name, run_id),
+            )
+        except:
+            logger.exception(f"failed to delete staging table of {table_name}")
+    return
+
+
+def upload_importbuffer_to_errordir(config: dict, data: dict, buffer, now_str: str):
+    """直接取り込みに失敗したメモリ上のファイルをGCSのエラーディレクトリにアップロード
+    Args
+        config: 設定値
+        data: 取り込みテーブルの設定値(config["import_data"]の要素)
+        buffer: 取り込もうとしたファイルの内容
+        now_str: エラーディレクトリ用タイムスタンプ
+    """
+    gcs.upload_from_file(
+        bucket_name=config["bucket_name"],
+        filepath=f"{config['gcs_error_dir']}/{now_str}/{data['filename']}",
+        file_obj=buffer,
+    )
+    return
+
+
+@decorator.timer("clear_response_cache")
+@decorator.set_config
+def clear_response_cache(config):
+    """レスポンスキャッシュを削除(取り込みに失敗した場合に次回全件取得し直すため)
+    Args
+        config: 設定値
+    """
+    cache = get_response_cache(config)
+    if cache is None:
+        return
+
+    cache.clear()
+    return
+
+
+@decorator.timer("cleanup_local_files")
 @decorator.set_config
 def delete_localweatherforecastfiles(config):
     """リクエスト後ローカルに保存したの予報CSVファイルを削除
+    upload_modeが"stream"またはload_modeが"gcs"以外の場合はローカルに保存しないので何もしない
     Args
         config: 設定値
     """
+    if config["upload_mode"] == "stream" or config["load_mode"] != "gcs":
+        return
+
     for data in config["import_data"].values():
+        if config["write_mode"] == "partition":
+            # パーティションごとのファイル
+            stem, ext = os.path.splitext(data["filename"])
+            for filepath in glob.glob(f"{config['tmp_file_dir']}/{stem}_*{ext}"):
+                files.delete_file(filepath=filepath)
+            continue
+
         files.delete_file(
             filepath=f"{config['tmp_file_dir']}/{data['filename']}",
         )
     return
 
 
+@decorator.timer("cleanup_gcs_files")
 @decorator.set_config
 def delete_insertedgcsweatherforecastfiles(config):
     """BQへinsertされたGCS上の予報CSVファイルを削除
+    load_modeが"gcs"以外の場合はGCSに保存しないので何もしない
     Args
         config: 設定値
     """
-    for data in config["import_data"].values():
-        gcs.delete_blob(
+    if config["load_mode"] != "gcs":
+        return
+
+    blob_names = [
+        f"{config['gcs_import_dir']}/{data['filename']}"
+        for data in config["import_data"].values()
+    ]
+    if config["write_mode"] == "partition":
+        # パーティションごとのファイルは取り込み用ディレクトリを1回だけ一覧して探す
+        prefixes = tuple(
+            f"{config['gcs_import_dir']}/{os.path.splitext(data['filename'])[0]}_"
+            for data in config["import_data"].values()
+        )
+        blob_names = [
+            blob_name
+            for blob_name in gcs.find_objects(
+                bucket_name=config["bucket_name"], prefix=f"{config['gcs_import_dir']}/"
+            )
+            if blob_name.startswith(prefixes)
+        ]
+
+    # 存在確認はせず並行に削除(取り込み前に失敗して無いファイルは削除済みとして扱う)
+    gcs.parallel_delete_blobs(bucket_name=config["bucket_name"], blob_names=blob_names)
+    return
+
+
+@decorator.set_config
+def export_run_metrics(config):
+    """1回の実行分のメトリクスを設定された出力先(config["metrics"]["exporters"])へ出力
+    出力に失敗しても取り込みには影響しないのでログのみ
+    Args
+        config: 設定値
+    """
+    for exporter in config["metrics"]["exporters"]:
+        try:
+            if exporter == "file":
+                export_metrics_file(config)
+            elif exporter == "cloud_monitoring":
+                metrics.export_to_cloud_monitoring(
+                    project_id=config["project_id"],
+                    metric_prefix=config["metrics"]["metric_prefix"],
+                )
+            else:
+                raise ValueError(f"unknown metrics exporter: {exporter}")
+        except:
+            logger.exception(f"failed to export metrics: {exporter}")
+    return
+
+
+def export_metrics_file(config: dict):
+    """メトリクスをOpenMetricsのテキストファイルとしてバケットまたはtmp_file_dirに保存
+    Args
+        config: 設定値
+    """
+    filepath = config["metrics"]["file_path"].format(timestamp=errordir_timestamp())
+    if config["metrics"]["file"] == "gcs":
+        gcs.upload_from_string(
             bucket_name=config["bucket_name"],
-            blob_name=f"{config['gcs_import_dir']}/{data['filename']}",
+            filepath=filepath,
+            data=metrics.registry.to_openmetrics(),
+            content_type="application/openmetrics-text; version=1.0.0; charset=utf-8",
         )
+        return
+
+    local_path = f"{config['tmp_file_dir']}/{filepath}"
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    metrics.write_openmetrics_file(local_path)
+    return
+
+
+@decorator.set_config
+def start_profile(config):
+    """この実行のプロファイリング(cProfile・tracemalloc)を開始
+    Args
+        config: 設定値
+    return
+        utils.profiler.RunProfiler: 開始したプロファイラ
+    """
+    # プロファイリングする実行でのみimportする
+    from utils.profiler import RunProfiler
+
+    profiler = RunProfiler(tracemalloc_frames=config["profile"]["tracemalloc_frames"])
+    profiler.start()
+    return profiler
+
+
+@decorator.set_config
+def upload_profile(config, profiler):
+    """プロファイリング結果をGCSのプロファイリング用ディレクトリ(gcs_profile_dir/{実行日時}/)にアップロード
+    Args
+        config: 設定値
+        profiler: utils.profiler.RunProfiler: stop済みのプロファイラ
+    """
+    prefix = f"{config['gcs_profile_dir']}/{errordir_timestamp()}"
+    top_n = config["profile"]["top_n"]
+
+    gcs.upload_from_file(
+        bucket_name=config["bucket_name"],
+        filepath=f"{prefix}/main.pstats",
+        file_obj=io.BytesIO(profiler.pstats_bytes()),
+    )
+    gcs.upload_from_string(
+        bucket_name=config["bucket_name"],
+        filepath=f"{prefix}/cumulative.txt",
+        data=profiler.stats_report(top_n),
+    )
+    gcs.upload_from_string(
+        bucket_name=config["bucket_name"],
+        filepath=f"{prefix}/allocations.txt",
+        data=profiler.allocation_report(top_n),
+    )
+    logger.info(f"uploaded profile to gs://{config['bucket_name']}/{prefix}")
     return
@@ -0,0 +1,14 @@
+-- ステージングテーブルごとのパーティション列の範囲を取得(MERGEで取り込みテーブルのパーティションを絞り込むため)
+
+{% for table in tables -%}
+select
+    "{{table.table_name}}" as table_name,
+    cast(min({{table.partition_field}}) as string) as partition_min,
+    cast(max({{table.partition_field}}) as string) as partition_max
+from `{{project_id}}.{{staging_dataset_name}}.{{table.staging_table_name}}`
+{% if not loop.last %}
+union all
+
+{% endif -%}
+{% endfor -%}
+;
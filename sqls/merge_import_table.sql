@@ -0,0 +1,33 @@
+-- ステージングテーブルの行を取り込みテーブルへMERGE
+-- 自然キー(merge_keys)が一致する行は置き換え、なければ追加する(再実行・重複実行でも行が重複しない)
+-- 取り込みテーブルはステージングテーブルのパーティション列の範囲のみ読む(定数で絞り込みパーティションを刈り込む)
+
+merge `{{project_id}}.{{dataset_name}}.{{table_name}}` as T
+using (
+    select
+        *
+    from `{{project_id}}.{{staging_dataset_name}}.{{staging_table_name}}`
+    where
+        true
+    -- 同じキーの行が複数ある場合は取得日時の新しい行のみ
+    qualify
+        row_number() over (
+            partition by
+                {{ merge_keys | join(", ") }}
+            order by
+                get_datetime desc
+        ) = 1
+) as S
+on
+    T.{{partition_field}} between {{partition_type}} "{{partition_min}}" and {{partition_type}} "{{partition_max}}"
+{%- for key in merge_keys %}
+    and T.{{key}} = S.{{key}}
+{%- endfor %}
+when matched then
+    update set
+{%- for column in update_columns %}
+        {{column}} = S.{{column}}{{ "," if not loop.last }}
+{%- endfor %}
+when not matched then
+    insert row
+;
@@ -1,12 +1,28 @@
+from __future__ import annotations
+
+import json
 import logging
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from utils import clients
 
-from google.cloud import bigquery
-from google.cloud.exceptions import NotFound
+# pandas・google-cloud-bigqueryは読み込みが重いので使う関数の中でimportする
+if TYPE_CHECKING:
+    import pandas as pd
+    from google.cloud import bigquery
 
 # loggerの設定
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# スキーマ定義ファイルパスごとの列定義(read_table_schemaで初回に読み込んで使い回す)
+_table_schemas: dict[str, list[dict[str, str]]] = {}
+_table_schemas_lock = threading.Lock()
+
+# 型変換できるか確認する型ごとの書式(スキーマ定義の型: 書式)
+DATETIME_FORMATS = {"DATE": "%Y-%m-%d", "DATETIME": "%Y-%m-%d %H:%M:%S"}
+
 
 def exe_query(query: str):
     """
@@ -18,7 +34,7 @@ def exe_query(query: str):
     """
 
     try:
-        client = bigquery.Client()
+        client = clients.get_bigquery_client()
 
         query_job = client.query(query)
 
@@ -35,7 +51,7 @@ def to_dataframe(query: str, use_bqstorage_api=False):
     use_bqstorage_apiがTrueのときbigquery storage api を用いて高速に取得できる
     """
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
     return (
         client.query(query)
         .result()
@@ -55,6 +71,8 @@ def to_dataframe_using_pdgbq(
     クエリの実行しDFへ持つ
     use_bqstorage_apiがTrueのときbigquery storage api を用いて高速に取得できる
     """
+    import pandas as pd
+
     return pd.read_gbq(
         query,
         project_id,
@@ -84,9 +102,10 @@ def from_dataframe_using_pdgbq(
 
 
 def exists_table(table_id):
+    from google.cloud.exceptions import NotFound
 
     # テーブルの存在確認
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
     try:
         client.get_table(table_id)  # Make an API request.
         logger.info("Table {} already exists.".format(table_id))
@@ -100,22 +119,36 @@ def exists_table(table_id):
         logger.exception("テーブル存在確認処理失敗")
 
 
-def create_table(table_id: str, schema_path: str, partition_field=None):
+def create_table(
+    table_id: str,
+    schema_path: str,
+    partition_field=None,
+    clustering_fields: Optional[list[str]] = None,
+    partition_expiration_days: Optional[float] = None,
+    require_partition_filter: bool = False,
+):
     """
     テーブルを生成
     params
         table_id: str: {project_id}:{dataset}:{table}
         schema_path: str: スキーマ定義されたjsonファイルのパス
         partition_field: str: パーティション分割列の設定をする場合その列を指定
+        clustering_fields: Optional[list[str]]: クラスタリング列(最大4列)
+        partition_expiration_days: Optional[float]: パーティションの有効期限(日)
+        require_partition_filter: bool: クエリにパーティション列の絞り込みを必須にするか
     """
-    client = bigquery.Client()
-    schema = client.schema_from_json(schema_path)
+    from google.cloud import bigquery
+
+    schema = schema_fields(schema_path)
+    client = clients.get_bigquery_client()
     table = bigquery.Table(table_id, schema=schema)
     if partition_field is not None:
         # パーティションの設定
-        table.time_partitioning = bigquery.TimePartitioning(
-            type_=bigquery.TimePartitioningType.DAY, field=partition_field
+        table.time_partitioning = time_partitioning(
+            partition_field, partition_expiration_days
         )
+        table.require_partition_filter = require_partition_filter
+    table.clustering_fields = clustering_fields
 
     # テーブル作成
     table = client.create_table(table)
@@ -124,6 +157,103 @@ def create_table(table_id: str, schema_path: str, partition_field=None):
     return
 
 
+def time_partitioning(
+    partition_field: str, partition_expiration_days: Optional[float] = None
+) -> bigquery.TimePartitioning:
+    """
+    DAYパーティションの設定を作成
+    params
+        partition_field: str: パーティション列
+        partition_expiration_days: Optional[float]: パーティションの有効期限(日。Noneは無期限)
+    returns
+        パーティションの設定
+    """
+    from google.cloud import bigquery
+
+    expiration_ms = None
+    if partition_expiration_days is not None:
+        expiration_ms = int(partition_expiration_days * 24 * 60 * 60 * 1000)
+
+    return bigquery.TimePartitioning(
+        type_=bigquery.TimePartitioningType.DAY,
+        field=partition_field,  # Name of the column to use for partitioning.
+        expiration_ms=expiration_ms,
+    )
+
+
+def ensure_table(
+    table_id: str,
+    schema_path: str,
+    partition_field=None,
+    clustering_fields: Optional[list[str]] = None,
+    partition_expiration_days: Optional[float] = None,
+    require_partition_filter: bool = False,
+) -> str:
+    """
+    テーブルがなければ生成し、あればスキーマ定義・レイアウト(クラスタリング・パーティションの有効期限・絞り込み必須)に合わせて更新する
+    何度実行しても同じ状態になる(変更がなければ更新しない)
+    スキーマは列の追加のみ、パーティション列は変更できない(異なる場合はValueError)
+    params
+        create_tableを参照
+    returns
+        "created", "updated", "unchanged"のいずれか
+    """
+    from google.cloud.exceptions import NotFound
+
+    client = clients.get_bigquery_client()
+    try:
+        table = client.get_table(table_id)
+    except NotFound:
+        create_table(
+            table_id,
+            schema_path,
+            partition_field=partition_field,
+            clustering_fields=clustering_fields,
+            partition_expiration_days=partition_expiration_days,
+            require_partition_filter=require_partition_filter,
+        )
+        return "created"
+
+    current_field = table.time_partitioning and table.time_partitioning.field
+    if current_field != partition_field:
+        raise ValueError(
+            f"{table_id}: partition field {current_field} cannot be changed to {partition_field}"
+        )
+
+    update_fields = []
+
+    # スキーマ定義に追加された列
+    existing_names = {field.name for field in table.schema}
+    new_fields = [
+        field
+        for field in schema_fields(schema_path)
+        if field.name not in existing_names
+    ]
+    if len(new_fields) > 0:
+        table.schema = list(table.schema) + new_fields
+        update_fields.append("schema")
+
+    if (table.clustering_fields or None) != (clustering_fields or None):
+        table.clustering_fields = clustering_fields
+        update_fields.append("clustering_fields")
+
+    if partition_field is not None:
+        partitioning = time_partitioning(partition_field, partition_expiration_days)
+        if table.time_partitioning.expiration_ms != partitioning.expiration_ms:
+            table.time_partitioning = partitioning
+            update_fields.append("time_partitioning")
+        if bool(table.require_partition_filter) != require_partition_filter:
+            table.require_partition_filter = require_partition_filter
+            update_fields.append("require_partition_filter")
+
+    if len(update_fields) == 0:
+        return "unchanged"
+
+    client.update_table(table, update_fields)
+    logger.info("updated table {}: {}".format(table_id, update_fields))
+    return "updated"
+
+
 def insert_table(table_id, data):
     """
     テーブルに挿入する
@@ -132,7 +262,7 @@ def insert_table(table_id, data):
         data: list[dict]: insertするデータ
     """
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
     # テーブルに追加
     try:
         errors = client.insert_rows_json(table_id, data)  # Make an API request.
@@ -147,7 +277,56 @@ def insert_table(table_id, data):
         return
 
 
-def file_to_table(
+def load_job_config(
+    table_schema_path: str,
+    replace: bool = False,
+    partition_field: str = None,
+    skip_leading_rows: int = 1,
+    source_format: str = "CSV",
+) -> bigquery.LoadJobConfig:
+    """
+    取り込みジョブの設定を作成
+    params:
+        table_schema_path: スキーマ定義ファイルパス
+        replace: bool: 置き換えるか否か(default: Flase)
+        partition_field: str: パーティションフィールド指定
+        skip_leading_rows: スキップ行数(CSVのみ)
+        source_format: str: ファイル形式 "CSV", "PARQUET", "AVRO"
+    returns:
+        取り込みジョブの設定
+    """
+    from google.cloud import bigquery
+
+    # 追記か置き換えか
+    if replace:
+        write_disposition = "WRITE_TRUNCATE"
+    else:
+        write_disposition = "WRITE_APPEND"
+
+    schema = schema_fields(table_schema_path)
+
+    job_config = bigquery.LoadJobConfig(
+        schema=schema,
+        source_format=getattr(bigquery.SourceFormat, source_format),
+        write_disposition=write_disposition,
+    )
+
+    # ファイル形式ごとの設定
+    if source_format == "CSV":
+        job_config.skip_leading_rows = skip_leading_rows
+    elif source_format == "AVRO":
+        # DATE/DATETIMEを論理型で取り込む
+        job_config.use_avro_logical_types = True
+
+    # パーティション列の指定があれば設定する
+    # (クラスタリング・パーティションの有効期限は既存テーブルと異なると取り込みエラーになるため指定しない。ensure_tableで設定する)
+    if partition_field is not None:
+        job_config.time_partitioning = time_partitioning(partition_field)
+
+    return job_config
+
+
+def start_file_to_table(
     project_id: str,
     dataset_name: str,
     table_name: str,
@@ -156,9 +335,11 @@ def file_to_table(
     replace: bool = False,
     partition_field: str = None,
     skip_leading_rows: int = 1,
-):
+    source_format: str = "CSV",
+) -> bigquery.LoadJob:
     """
-    csvデータをBQに取り込む処理
+    ファイル(csv/parquet/avro)をBQに取り込むジョブを投入する(完了は待たない)
+    複数テーブル分を先に投入してからwait_load_jobで待つとBigQuery側で並行に処理される
     params:
         project_id: str: プロジェクト名,
         dataset_name: str: データセット名,
@@ -167,52 +348,671 @@ def file_to_table(
         source_file_uri: str: 取り込み元ファイルURI("gs://"から始まるURI),
         replace: bool: 置き換えるか否か(default: Flase)
         partition_field: str: パーティションフィールド指定
-        skip_leading_rows: スキップ行数
+        skip_leading_rows: スキップ行数(CSVのみ)
+        source_format: str: ファイル形式 "CSV", "PARQUET", "AVRO"
     returns:
+        投入したジョブ
     """
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
 
     table_id = "{}.{}.{}".format(project_id, dataset_name, table_name)
 
-    # 追記か置き換えか
-    if replace:
-        write_disposition = "WRITE_TRUNCATE"
-    else:
-        write_disposition = "WRITE_APPEND"
+    job_config = load_job_config(
+        table_schema_path=table_schema_path,
+        replace=replace,
+        partition_field=partition_field,
+        skip_leading_rows=skip_leading_rows,
+        source_format=source_format,
+    )
 
-    schema = client.schema_from_json(table_schema_path)
+    return client.load_table_from_uri(source_file_uri, table_id, job_config=job_config)
 
-    # パーティション列の指定があれば設定する
-    if partition_field is None:
-        job_config = bigquery.LoadJobConfig(
-            schema=schema,
-            skip_leading_rows=skip_leading_rows,
-            source_format=bigquery.SourceFormat.CSV,
-            write_disposition=write_disposition,
+
+def start_fileobj_to_table(
+    project_id: str,
+    dataset_name: str,
+    table_name: str,
+    table_schema_path: str,
+    file_obj,
+    replace: bool = False,
+    partition_field: str = None,
+    skip_leading_rows: int = 1,
+    source_format: str = "CSV",
+) -> bigquery.LoadJob:
+    """
+    メモリ上のファイル(csv/parquet/avro)をGCSを経由せずBQに取り込むジョブを投入する(完了は待たない)
+    ファイル内容のアップロードまでは行い、ジョブの完了はwait_load_jobで待つ
+    params:
+        project_id: str: プロジェクト名,
+        dataset_name: str: データセット名,
+        table_name: str: テーブル名,
+        table_schema_path: スキーマ定義ファイルパス
+        file_obj: 取り込むファイルの内容(io.BytesIOなどバイナリモードのファイルオブジェクト)
+        replace: bool: 置き換えるか否か(default: Flase)
+        partition_field: str: パーティションフィールド指定
+        skip_leading_rows: スキップ行数(CSVのみ)
+        source_format: str: ファイル形式 "CSV", "PARQUET", "AVRO"
+    returns:
+        投入したジョブ
+    """
+
+    client = clients.get_bigquery_client()
+
+    table_id = "{}.{}.{}".format(project_id, dataset_name, table_name)
+
+    job_config = load_job_config(
+        table_schema_path=table_schema_path,
+        replace=replace,
+        partition_field=partition_field,
+        skip_leading_rows=skip_leading_rows,
+        source_format=source_format,
+    )
+
+    return client.load_table_from_file(
+        file_obj, table_id, rewind=True, job_config=job_config
+    )
+
+
+def wait_load_job(load_job: bigquery.LoadJob):
+    """
+    取り込みジョブの完了を待つ(失敗した場合は例外)
+    params:
+        load_job: bigquery.LoadJob: start_file_to_tableで投入したジョブ
+    return:
+        取り込んだ行数
+    """
+
+    load_job.result()  # Wait for the job to complete.
+
+    logger.info(
+        "Loaded {} rows to table {}".format(
+            load_job.output_rows, load_job.destination.table_id
         )
-    else:
-        job_config = bigquery.LoadJobConfig(
-            schema=schema,
-            skip_leading_rows=skip_leading_rows,
-            source_format=bigquery.SourceFormat.CSV,
-            time_partitioning=bigquery.TimePartitioning(
-                type_=bigquery.TimePartitioningType.DAY,
-                field=partition_field,  # Name of the column to use for partitioning.
+    )
+
+    return load_job.output_rows
+
+
+def file_to_table(
+    project_id: str,
+    dataset_name: str,
+    table_name: str,
+    table_schema_path: str,
+    source_file_uri: str,
+    replace: bool = False,
+    partition_field: str = None,
+    skip_leading_rows: int = 1,
+    source_format: str = "CSV",
+):
+    """
+    ファイル(csv/parquet/avro)をBQに取り込む処理(完了まで待つ)
+    params:
+        start_file_to_tableを参照
+    returns:
+    """
+
+    load_job = start_file_to_table(
+        project_id=project_id,
+        dataset_name=dataset_name,
+        table_name=table_name,
+        table_schema_path=table_schema_path,
+        source_file_uri=source_file_uri,
+        replace=replace,
+        partition_field=partition_field,
+        skip_leading_rows=skip_leading_rows,
+        source_format=source_format,
+    )
+    wait_load_job(load_job)
+
+    return
+
+
+def partition_decorator(table_name: str, partition: str) -> str:
+    """
+    パーティションデコレータ付きのテーブル名
+    取り込みジョブの宛先にするとそのパーティションのみに書き込む(WRITE_TRUNCATEでもそのパーティションのみ置き換え)
+    params:
+        table_name: str: テーブル名
+        partition: str: パーティション("%Y%m%d")
+    returns:
+        "{テーブル名}${パーティション}"
+    """
+    return f"{table_name}${partition}"
+
+
+def split_by_partition(df: pd.DataFrame, partition_field: str) -> dict:
+    """
+    DAYパーティションごとにDataFrameを分割
+    パーティション列はDATE/DATETIMEの文字列("%Y-%m-%d"から始まる)とする
+    params:
+        df: DataFrame
+        partition_field: str: パーティション列
+    returns:
+        {パーティション("%Y%m%d"): DataFrame}(パーティション順)
+    """
+
+    partitions = df[partition_field].astype(str).str[:10].str.replace("-", "")
+    return {
+        partition: partition_df.reset_index(drop=True)
+        for partition, partition_df in df.groupby(partitions, sort=True)
+    }
+
+
+def create_staging_table(
+    project_id: str,
+    dataset_name: str,
+    table_name: str,
+    table_schema_path: str,
+    expiration_minutes: int = 60,
+):
+    """
+    有効期限付きのステージングテーブル(パーティションなし)を生成
+    削除に失敗しても有効期限を過ぎるとBigQuery側で削除される
+    params:
+        project_id: str: プロジェクト名,
+        dataset_name: str: データセット名,
+        table_name: str: テーブル名,
+        table_schema_path: スキーマ定義ファイルパス
+        expiration_minutes: int: 有効期限(分)
+    """
+    import datetime
+
+    from google.cloud import bigquery
+
+    client = clients.get_bigquery_client()
+
+    table = bigquery.Table(
+        "{}.{}.{}".format(project_id, dataset_name, table_name),
+        schema=schema_fields(table_schema_path),
+    )
+    table.expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        minutes=expiration_minutes
+    )
+
+    client.create_table(table)
+    logger.info("created staging table {}".format(table.table_id))
+
+    return
+
+
+def start_query(query: str) -> bigquery.QueryJob:
+    """
+    クエリのジョブを投入する(完了は待たない)
+    複数のクエリを先に投入してからwait_query_jobで待つとBigQuery側で並行に処理される
+    params
+        query: str: 実行クエリ
+    returns
+        投入したジョブ
+    """
+
+    client = clients.get_bigquery_client()
+
+    return client.query(query)
+
+
+def wait_query_job(query_job: bigquery.QueryJob):
+    """
+    クエリのジョブの完了を待つ(失敗した場合は例外)
+    params:
+        query_job: bigquery.QueryJob: start_queryで投入したジョブ
+    """
+
+    query_job.result()  # Wait for the job to complete.
+
+    logger.info(
+        "Query job {} finished: {} rows affected, {} bytes processed".format(
+            query_job.job_id,
+            query_job.num_dml_affected_rows,
+            query_job.total_bytes_processed,
+        )
+    )
+
+    return
+
+
+def read_table_schema(table_schema_path: str) -> list[dict[str, str]]:
+    """
+    スキーマ定義ファイルを読み込む
+    ファイルを読むのは初回のみで、以降はプロセス内で使い回す(変更しないこと)
+    params:
+        table_schema_path: str: スキーマ定義ファイルパス
+    returns:
+        列定義(name, type, ...)のリスト
+    """
+
+    fields = _table_schemas.get(table_schema_path)
+    if fields is not None:
+        return fields
+
+    with _table_schemas_lock:
+        if table_schema_path not in _table_schemas:
+            with open(table_schema_path, encoding="utf-8") as f:
+                _table_schemas[table_schema_path] = json.load(f)
+        return _table_schemas[table_schema_path]
+
+
+def schema_fields(table_schema_path: str) -> list[bigquery.SchemaField]:
+    """
+    スキーマ定義ファイルからBigQueryのスキーマを作る(client.schema_from_jsonと同じ)
+    params:
+        table_schema_path: str: スキーマ定義ファイルパス
+    returns:
+        SchemaFieldのリスト
+    """
+    from google.cloud import bigquery
+
+    return [
+        bigquery.SchemaField.from_api_repr(field)
+        for field in read_table_schema(table_schema_path)
+    ]
+
+
+def clear_table_schemas():
+    """
+    読み込み済みのスキーマ定義を破棄(次回は読み込み直す)
+    """
+    with _table_schemas_lock:
+        _table_schemas.clear()
+
+
+def validate_dataframe(
+    df: pd.DataFrame,
+    table_schema_path: str,
+    column_aliases: Optional[dict[str, str]] = None,
+):
+    """
+    DataFrameがスキーマ定義通りに取り込めるかを取り込み前に確認する
+    列数・列名(列順で対応付け)と、DATE/DATETIME/FLOAT/INTEGER列の値が型変換できるかを確認する
+    空文字と欠損値はNULLとして扱う
+    カテゴリ型の列は重複を除いた値(カテゴリ)だけを確認する
+    params:
+        df: DataFrame
+        table_schema_path: str: スキーマ定義ファイルパス
+        column_aliases: Optional[dict[str, str]]: スキーマと名前が異なる列の対応(DataFrameの列名: スキーマの列名)
+    raises:
+        ValueError: 確認に失敗した内容(全列分)
+    """
+    import numpy as np
+    import pandas as pd
+
+    fields = read_table_schema(table_schema_path)
+    if len(fields) != len(df.columns):
+        raise ValueError(
+            f"column count mismatch: dataframe {len(df.columns)}, schema {len(fields)} ({table_schema_path})"
+        )
+
+    column_aliases = column_aliases or {}
+    errors = []
+    for position, (field, column) in enumerate(zip(fields, df.columns)):
+        name = column_aliases.get(column, column)
+        if name != field["name"]:
+            errors.append(
+                f"{position}: column name mismatch: dataframe {column}, schema {field['name']}"
+            )
+            continue
+
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = series.cat.categories.to_series()
+            has_null = bool((series.cat.codes.values == -1).any())
+        else:
+            values = series
+            has_null = False
+        values = values.astype(object)
+        values = values.mask(values == "")
+        isnull = values.isna().values
+        has_null = has_null or bool(isnull.any())
+
+        if field.get("mode") == "REQUIRED" and has_null:
+            errors.append(f"{column}: null values in REQUIRED column")
+
+        field_type = field["type"]
+        if field_type in DATETIME_FORMATS:
+            converted = pd.to_datetime(
+                values, format=DATETIME_FORMATS[field_type], errors="coerce"
+            )
+            invalid = converted.isna().values & ~isnull
+        elif field_type in ("FLOAT", "INTEGER"):
+            converted = pd.to_numeric(values, errors="coerce").astype("float64")
+            invalid = converted.isna().values & ~isnull
+            if field_type == "INTEGER":
+                numbers = converted.values
+                invalid |= ~isnull & ~np.isnan(numbers) & (numbers != np.floor(numbers))
+        else:
+            continue
+
+        if invalid.any():
+            errors.append(
+                f"{column}: {int(invalid.sum())} values not castable to {field_type}"
+                f" (e.g. {values[invalid].head(3).tolist()})"
+            )
+
+    if len(errors) > 0:
+        raise ValueError(f"schema mismatch ({table_schema_path}): {'; '.join(errors)}")
+
+    return
+
+
+def conform_dataframe(
+    df: pd.DataFrame, table_schema_path: str, datetime_as_string: bool = False
+) -> pd.DataFrame:
+    """
+    DataFrameの列名と型をスキーマ定義に合わせる(parquet/avro出力用)
+    CSVは列順で取り込むため列名がスキーマと異なる場合がある(例: area_code → small_area_code)ので列順で対応付ける
+    params:
+        df: DataFrame
+        table_schema_path: str: スキーマ定義ファイルパス
+        datetime_as_string: bool: DATETIME列を文字列のまま残すか(avro用)
+    returns:
+        スキーマの列名・型に変換したDataFrame
+    """
+    import pandas as pd
+
+    fields = read_table_schema(table_schema_path)
+    if len(fields) != len(df.columns):
+        raise ValueError(
+            f"column count mismatch: dataframe {len(df.columns)}, schema {len(fields)} ({table_schema_path})"
+        )
+
+    data = {}
+    for field, column in zip(fields, df.columns):
+        series = df[column].astype(object)
+        field_type = field["type"]
+        if field_type == "DATE":
+            series = pd.to_datetime(series, format="%Y-%m-%d").dt.date
+        elif field_type == "DATETIME" and not datetime_as_string:
+            series = pd.to_datetime(series, format="%Y-%m-%d %H:%M:%S")
+        elif field_type == "FLOAT":
+            series = pd.to_numeric(series).astype("float64")
+        elif field_type == "INTEGER":
+            series = pd.to_numeric(series).astype("Int64")
+        data[field["name"]] = series.values
+
+    return pd.DataFrame(data)
+
+
+def to_arrow_schema(table_schema_path: str):
+    """
+    スキーマ定義からparquet出力用のpyarrowスキーマを作る
+    params:
+        table_schema_path: str: スキーマ定義ファイルパス
+    returns:
+        pyarrow.Schema
+    """
+    import pyarrow as pa
+
+    arrow_types = {
+        "STRING": pa.string(),
+        "FLOAT": pa.float64(),
+        "INTEGER": pa.int64(),
+        "DATE": pa.date32(),
+        # タイムゾーンなしのTIMESTAMPはDATETIMEとして取り込まれる
+        "DATETIME": pa.timestamp("us"),
+    }
+    return pa.schema(
+        [
+            pa.field(field["name"], arrow_types[field["type"]])
+            for field in read_table_schema(table_schema_path)
+        ]
+    )
+
+
+def to_avro_schema(table_schema_path: str, name: str) -> dict:
+    """
+    スキーマ定義からavro出力用のスキーマを作る
+    params:
+        table_schema_path: str: スキーマ定義ファイルパス
+        name: str: レコード名
+    returns:
+        avroスキーマ
+    """
+
+    avro_types = {
+        "STRING": "string",
+        "FLOAT": "double",
+        "INTEGER": "long",
+        "DATE": {"type": "int", "logicalType": "date"},
+        # BigQueryはlogicalType datetimeの文字列をDATETIMEとして取り込む
+        "DATETIME": {"type": "string", "logicalType": "datetime"},
+    }
+    return {
+        "type": "record",
+        "name": name,
+        "fields": [
+            {"name": field["name"], "type": ["null", avro_types[field["type"]]]}
+            for field in read_table_schema(table_schema_path)
+        ],
+    }
+
+
+# スキーマ定義の型とprotobufのフィールド型の対応(Storage Write API用)
+# DATEはエポックからの日数(int32)、DATETIMEは"%Y-%m-%d %H:%M:%S"の文字列で送る
+PROTO_FIELD_TYPES = {
+    "STRING": "TYPE_STRING",
+    "FLOAT": "TYPE_DOUBLE",
+    "INTEGER": "TYPE_INT64",
+    "DATE": "TYPE_INT32",
+    "DATETIME": "TYPE_STRING",
+}
+
+
+def to_proto_descriptor(table_schema_path: str, name: str):
+    """
+    スキーマ定義からStorage Write API用のprotobufメッセージ定義を作る
+    全フィールドをoptional(proto2)にして欠損値はNULLとして書き込む
+    params:
+        table_schema_path: str: スキーマ定義ファイルパス
+        name: str: メッセージ名
+    returns:
+        google.protobuf.descriptor_pb2.DescriptorProto
+    """
+    from google.protobuf import descriptor_pb2
+
+    descriptor = descriptor_pb2.DescriptorProto(name=name)
+    for number, field in enumerate(read_table_schema(table_schema_path), start=1):
+        descriptor.field.add(
+            name=field["name"],
+            number=number,
+            type=getattr(
+                descriptor_pb2.FieldDescriptorProto, PROTO_FIELD_TYPES[field["type"]]
             ),
-            write_disposition=write_disposition,
+            label=descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL,
         )
+    return descriptor
+
+
+def to_proto_message_class(descriptor):
+    """
+    protobufメッセージ定義からメッセージクラスを作る
+    params:
+        descriptor: google.protobuf.descriptor_pb2.DescriptorProto
+    returns:
+        メッセージクラス
+    """
+    from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
 
-    load_job = client.load_table_from_uri(
-        source_file_uri, table_id, job_config=job_config
+    file_descriptor = descriptor_pb2.FileDescriptorProto(
+        name=f"{descriptor.name}.proto", syntax="proto2"
     )
+    file_descriptor.message_type.add().CopyFrom(descriptor)
 
-    load_job.result()  # Wait for the job to complete.
+    # 呼び出しごとに別のプールに登録し、同名のメッセージ定義の衝突を避ける
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_descriptor)
+    message_descriptor = pool.FindMessageTypeByName(descriptor.name)
 
-    table = client.get_table(table_id)
-    logger.info("Loaded {} rows to table {}".format(table.num_rows, table_id))
+    if hasattr(message_factory, "GetMessageClass"):
+        return message_factory.GetMessageClass(message_descriptor)
+    return message_factory.MessageFactory(pool).GetPrototype(message_descriptor)
 
-    return
+
+def dataframe_to_proto_rows(
+    df: pd.DataFrame, table_schema_path: str, message_class
+) -> list[bytes]:
+    """
+    DataFrameをStorage Write API用にシリアライズした行のリストにする
+    params:
+        df: DataFrame
+        table_schema_path: str: スキーマ定義ファイルパス
+        message_class: to_proto_message_classで作ったメッセージクラス
+    returns:
+        シリアライズした行のリスト
+    """
+    import pandas as pd
+
+    fields = read_table_schema(table_schema_path)
+    df = conform_dataframe(df, table_schema_path, datetime_as_string=True)
+
+    # 列ごとにまとめて変換し、欠損値はNoneにする
+    columns = []
+    for field in fields:
+        series = df[field["name"]]
+        isnull = series.isna().values
+        if field["type"] == "DATE":
+            values = (
+                pd.to_datetime(series).values.astype("datetime64[D]").astype("int64")
+            )
+        else:
+            values = series.values
+        columns.append(
+            [None if null else value for value, null in zip(values.tolist(), isnull)]
+        )
+
+    names = [field["name"] for field in fields]
+    return [
+        message_class(
+            **{name: value for name, value in zip(names, row) if value is not None}
+        ).SerializeToString()
+        for row in zip(*columns)
+    ]
+
+
+def write_rows_to_table(
+    project_id: str,
+    dataset_name: str,
+    table_name: str,
+    table_schema_path: str,
+    df: pd.DataFrame,
+    stream_type: str = "PENDING",
+    batch_rows: int = 500,
+    write_client=None,
+) -> tuple[list[dict], list[int]]:
+    """
+    Storage Write APIでDataFrameの行をテーブルに書き込む(取り込みジョブを使わない)
+    PENDING: 全バッチを書き込んでからコミットする(行エラーがあれば何も反映しない。途中で失敗した場合は例外)
+    COMMITTED: バッチごとに即時反映する(行エラーや失敗のあったバッチのみ反映されない)
+        反映済みのバッチがあるため、書き込みを始めてからの失敗は例外にせず反映されなかった行として返す
+    params:
+        project_id: str: プロジェクト名,
+        dataset_name: str: データセット名,
+        table_name: str: テーブル名,
+        table_schema_path: スキーマ定義ファイルパス
+        df: DataFrame
+        stream_type: str: "PENDING", "COMMITTED"
+        batch_rows: int: 1リクエストで送る行数
+        write_client: 書き込みクライアント(省略時は共有のBigQueryWriteClient)
+    returns:
+        (行エラーのリスト [{"index": DataFrame上の行番号, "code": str, "message": str}],
+         反映されなかった行のDataFrame上の行番号のリスト)
+    """
+    from google.cloud.bigquery_storage_v1 import types
+
+    client = write_client or clients.get_bigquery_write_client()
+
+    parent = f"projects/{project_id}/datasets/{dataset_name}/tables/{table_name}"
+    descriptor = to_proto_descriptor(table_schema_path, name=table_name)
+    rows = dataframe_to_proto_rows(
+        df, table_schema_path, to_proto_message_class(descriptor)
+    )
+
+    if len(rows) == 0:
+        return [], []
+
+    write_stream = client.create_write_stream(
+        parent=parent,
+        write_stream=types.WriteStream(
+            type_=getattr(types.WriteStream.Type, stream_type)
+        ),
+    )
+
+    # バッチごとのリクエスト(スキーマは最初のリクエストにだけ付ける)
+    offsets = list(range(0, len(rows), batch_rows))
+    requests = []
+    for offset in offsets:
+        # 行エラーで拒否されたバッチの分ずれるのでoffsetは指定せず末尾に追記する
+        request = types.AppendRowsRequest(
+            proto_rows=types.AppendRowsRequest.ProtoData(
+                rows=types.ProtoRows(serialized_rows=rows[offset : offset + batch_rows])
+            ),
+        )
+        if offset == 0:
+            request.write_stream = write_stream.name
+            request.proto_rows.writer_schema = types.ProtoSchema(
+                proto_descriptor=descriptor
+            )
+        requests.append(request)
+
+    # レスポンスはリクエスト順に返る
+    row_errors = []
+    written_offsets = set()
+    try:
+        responses = client.append_rows(
+            iter(requests),
+            metadata=(("x-goog-request-params", f"write_stream={write_stream.name}"),),
+        )
+        for offset, response in zip(offsets, responses):
+            for row_error in response.row_errors:
+                row_errors.append(
+                    {
+                        "index": offset + row_error.index,
+                        "code": row_error.code.name,
+                        "message": row_error.message,
+                    }
+                )
+            if response.error.code != 0 and len(response.row_errors) == 0:
+                message = f"append rows failed: {table_name} offset {offset}: {response.error.message}"
+                if stream_type == "PENDING":
+                    raise RuntimeError(message)
+                logger.error(message)
+            # 行エラーのあったバッチはまるごと書き込まれない
+            if response.error.code == 0 and len(response.row_errors) == 0:
+                written_offsets.add(offset)
+        client.finalize_write_stream(name=write_stream.name)
+    except Exception:
+        if stream_type == "PENDING":
+            raise
+        # レスポンスのないバッチは反映されたか分からないので反映されなかった行として返す
+        # (呼び出し元はエラーディレクトリに残すのみで取り込み直さない)
+        logger.exception(f"append rows stopped: {table_name}")
+
+    unwritten_rows = [
+        index
+        for offset in offsets
+        if offset not in written_offsets
+        for index in range(offset, min(offset + batch_rows, len(rows)))
+    ]
+
+    if stream_type == "PENDING":
+        if len(row_errors) > 0:
+            logger.error(
+                f"Not committed: {table_name}: {len(row_errors)} row errors in {len(rows)} rows"
+            )
+            return row_errors, list(range(len(rows)))
+
+        response = client.batch_commit_write_streams(
+            request={"parent": parent, "write_streams": [write_stream.name]}
+        )
+        if len(response.stream_errors) > 0:
+            raise RuntimeError(
+                f"commit failed: {table_name}: {[e.error_message for e in response.stream_errors]}"
+            )
+
+    logger.info(
+        f"Wrote {len(rows) - len(unwritten_rows)} rows to {table_name} by Storage Write API"
+    )
+
+    return row_errors, unwritten_rows
 
 
 def export_csv(
@@ -227,8 +1027,9 @@ def export_csv(
     """
     テーブルのcsvエクスポート
     """
+    from google.cloud import bigquery
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
 
     dataset_ref = bigquery.DatasetReference(bq_project, bq_dataset_id)
     table_ref = dataset_ref.table(bq_table_id)
@@ -256,7 +1057,7 @@ def delete_table(project_id, dataset_name, table_name, not_found_ok=True):
     テーブルの削除
     """
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
 
     table_id = f"{project_id}.{dataset_name}.{table_name}"
 
@@ -270,8 +1071,9 @@ def create_dataset(dataset_name):
     params:
         dataset_name: str 作成するデータセット名
     """
+    from google.cloud import bigquery
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
 
     dataset_id = "{project_id}.{dataset_name}".format(
         project_id=client.project, dataset_name=dataset_name
@@ -291,8 +1093,9 @@ def exists_dataset(dataset_name):
     params:
         dataset_name: str 作成するデータセット名
     """
+    from google.cloud.exceptions import NotFound
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
 
     dataset_id = "{project_id}.{dataset_name}".format(
         project_id=client.project, dataset_name=dataset_name
@@ -317,7 +1120,7 @@ def delete_dataset(dataset_name):
     データセットの削除
     """
 
-    client = bigquery.Client()
+    client = clients.get_bigquery_client()
 
     dataset_id = "{project_id}.{dataset_name}".format(
         project_id=client.project, dataset_name=dataset_name
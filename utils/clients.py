@@ -0,0 +1,102 @@
+import logging
+import threading
+
+from typing import Any, Callable
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# プロセス内で共有するクライアント(ウォームインスタンスの次回実行でも使い回す)
+_clients: dict[str, Any] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_client(name: str, create: Callable[[], Any]):
+    """
+    登録済みのクライアントを返す(なければ生成して登録)
+    params
+        name: str: クライアント名
+        create: Callable[[], Any]: クライアントを生成する関数
+    return
+        クライアント
+    """
+
+    client = _clients.get(name)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        # ロック待ちの間に他のスレッドが生成している場合がある
+        if name not in _clients:
+            _clients[name] = create()
+            logger.info(f"created {name} client")
+        return _clients[name]
+
+
+def get_bigquery_client():
+    """
+    共有のBigQueryクライアントを取得
+    return
+        google.cloud.bigquery.Client
+    """
+
+    def create():
+        from google.cloud import bigquery
+
+        return bigquery.Client()
+
+    return _get_client("bigquery", create)
+
+
+def get_bigquery_write_client():
+    """
+    共有のBigQuery Storage Write APIクライアントを取得
+    return
+        google.cloud.bigquery_storage_v1.BigQueryWriteClient
+    """
+
+    def create():
+        from google.cloud import bigquery_storage_v1
+
+        return bigquery_storage_v1.BigQueryWriteClient()
+
+    return _get_client("bigquery_write", create)
+
+
+def get_storage_client():
+    """
+    共有のCloud Storageクライアントを取得
+    return
+        google.cloud.storage.Client
+    """
+
+    def create():
+        from google.cloud import storage
+
+        return storage.Client()
+
+    return _get_client("storage", create)
+
+
+def get_metric_service_client():
+    """
+    共有のCloud Monitoringクライアントを取得(google-cloud-monitoringが必要)
+    return
+        google.cloud.monitoring_v3.MetricServiceClient
+    """
+
+    def create():
+        from google.cloud import monitoring_v3
+
+        return monitoring_v3.MetricServiceClient()
+
+    return _get_client("metric_service", create)
+
+
+def clear_clients():
+    """
+    登録済みのクライアントを破棄(次回取得時に生成し直す)
+    """
+    with _clients_lock:
+        _clients.clear()
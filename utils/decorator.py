@@ -1,4 +1,9 @@
 import os
+import time
+import functools
+import threading
+import contextlib
+from typing import Optional
 
 from utils import files
 
@@ -21,3 +26,161 @@ def set_config(func):
         return result
 
     return wrapper
+
+
+class Span:
+    def __init__(self, name: str, attrs: dict):
+
+        """
+        1区間の計測結果
+        params
+            name: str: 区間名
+            attrs: dict: 付加情報(table: テーブル名, rows: 行数, bytes: バイト数 など)
+
+        フィールド変数
+        self.name: str
+        self.attrs: dict
+        self.seconds: float: 区間の秒数
+        self.error: bool: 区間内で例外が起きたか
+        """
+
+        self.name = name
+        self.attrs = attrs
+        self.seconds = 0.0
+        self.error = False
+
+    def set(self, **attrs):
+        """付加情報を加える(区間内で分かった行数・バイト数など)"""
+        self.attrs.update(attrs)
+
+
+class RunRecorder:
+    def __init__(self):
+
+        """
+        1回の実行(start_run〜finish_run)の区間を集める(スレッドプール内の区間も集める)
+
+        フィールド変数
+        self.spans: list[Span]
+        """
+
+        self.spans = []
+        self.__started = time.perf_counter()
+        self.__lock = threading.Lock()
+
+    def add(self, span: Span):
+        with self.__lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """
+        区間名・テーブルごとに集計した実行のまとめ
+        return
+            {
+                "seconds": 実行全体の秒数,
+                "stages": {区間名: {"count", "seconds"(合計), "max_seconds", "errors", "rows", "bytes", "slowest"(最も遅い区間の付加情報)}},
+                "tables": {テーブル名: {区間名: {"seconds", "rows", "bytes"}}},
+            }
+            並行に実行された区間(予報の取得など)のsecondsは各区間の合計で、実時間より長くなる
+        """
+        with self.__lock:
+            spans = list(self.spans)
+
+        stages = {}
+        tables = {}
+        for span in spans:
+            stage = stages.setdefault(
+                span.name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0}
+            )
+            stage["count"] += 1
+            stage["seconds"] += span.seconds
+            stage["errors"] += int(span.error)
+            if span.seconds >= stage["max_seconds"]:
+                stage["max_seconds"] = span.seconds
+                if span.attrs:
+                    stage["slowest"] = span.attrs
+            for key in ("rows", "bytes"):
+                if isinstance(span.attrs.get(key), int):
+                    stage[key] = stage.get(key, 0) + span.attrs[key]
+
+            if "table" in span.attrs:
+                table = tables.setdefault(span.attrs["table"], {}).setdefault(
+                    span.name, {"seconds": 0.0}
+                )
+                table["seconds"] += span.seconds
+                for key in ("rows", "bytes"):
+                    if isinstance(span.attrs.get(key), int):
+                        table[key] = table.get(key, 0) + span.attrs[key]
+
+        # 秒数はミリ秒単位に丸める
+        for item in [*stages.values()] + [
+            item for table in tables.values() for item in table.values()
+        ]:
+            for key in ("seconds", "max_seconds"):
+                if key in item:
+                    item[key] = round(item[key], 3)
+
+        return {
+            "seconds": round(time.perf_counter() - self.__started, 3),
+            "stages": stages,
+            "tables": tables,
+        }
+
+
+# 実行中の区間の記録(start_runで生成。実行中でなければ区間は計測のみで捨てる)
+_recorder: Optional[RunRecorder] = None
+
+
+def start_run():
+    """実行の区間の記録を開始する"""
+    global _recorder
+    _recorder = RunRecorder()
+
+
+def finish_run() -> Optional[dict]:
+    """
+    実行の区間の記録を終了する
+    return
+        RunRecorder.summaryのまとめ(start_runしていなければNone)
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is None:
+        return None
+    return recorder.summary()
+
+
+@contextlib.contextmanager
+def span(name: str, started: Optional[float] = None, **attrs):
+    """
+    区間を計測するコンテキストマネージャ(withの中でspan.setで行数などを加えられる)
+    params
+        name: str: 区間名
+        started: Optional[float]: 開始時刻(time.perf_counter()。投入済みのジョブの完了待ちなど開始がwithより前の場合)
+        attrs: 付加情報(table: テーブル名ごとにも集計する)
+    """
+    current = Span(name, attrs)
+    started = time.perf_counter() if started is None else started
+    try:
+        yield current
+    except BaseException:
+        current.error = True
+        raise
+    finally:
+        current.seconds = time.perf_counter() - started
+        recorder = _recorder
+        if recorder is not None:
+            recorder.add(current)
+
+
+# 関数の実行を区間として計測するデコレータ
+def timer(name: str):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
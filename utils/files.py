@@ -1,3 +1,4 @@
+import io
 import os
 import pickle
 import logging
@@ -22,6 +23,19 @@ def read_file(filepath: str) -> str:
     return txt
 
 
+def write_file(filepath: str, txt: str):
+    """
+    ファイル書き込み(書き込み途中のファイルを読まないよう一時ファイルから置き換える)
+    """
+
+    os.makedirs(os.path.dirname(filepath) or ".", exist_ok=True)
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, mode="w", encoding="utf-8") as f:
+        f.write(txt)
+    os.replace(tmp_path, filepath)
+    return
+
+
 def exists(filepath: str) -> bool:
     """
     ファイルやディレクトリの有無
@@ -112,6 +126,186 @@ def to_csvfile(
     return
 
 
+def write_dataframe(
+    df,
+    f,
+    file_format: str = "csv",
+    schema=None,
+    compression: Optional[str] = None,
+):
+    """
+    DataFrameをファイルオブジェクトへ書き込む
+    params
+        df: DataFrame
+        f: 書き込み先(csvはテキストモード、parquet/avroはバイナリモード)
+        file_format: str: "csv", "parquet", "avro"
+        schema: parquet: Optional[pyarrow.Schema]: 列の型(省略時はDataFrameの型から推定) / avro: dict: avroスキーマ
+        compression: Optional[str]: parquet: "snappy"(省略時), "gzip", "zstd" など / avro: "deflate"(省略時), "snappy", "null" など
+    """
+
+    if file_format == "csv":
+        df.to_csv(f, index=False)
+    elif file_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        pq.write_table(table, f, compression=compression or "snappy")
+    elif file_format == "avro":
+        import fastavro
+
+        # 欠損値はnullとして書き込む
+        records = df.astype(object).where(df.notna(), None).to_dict("records")
+        fastavro.writer(
+            f, fastavro.parse_schema(schema), records, codec=compression or "deflate"
+        )
+    else:
+        raise ValueError(f"unknown file format: {file_format}")
+    return
+
+
+def to_buffer(
+    df,
+    file_format: str = "csv",
+    schema=None,
+    compression: Optional[str] = None,
+) -> io.BytesIO:
+    """
+    DataFrameをメモリ上のファイルに出力する
+    params
+        df: DataFrame
+        file_format: str: "csv", "parquet", "avro"
+        schema: write_dataframeを参照
+        compression: Optional[str]: write_dataframeを参照
+    return
+        先頭に巻き戻したファイルオブジェクト
+    """
+
+    buffer = io.BytesIO()
+    if file_format == "csv":
+        # csvはテキストで書き込みutf-8で保持する
+        buffer.write(df.to_csv(index=False).encode("utf-8"))
+    else:
+        write_dataframe(
+            df, buffer, file_format=file_format, schema=schema, compression=compression
+        )
+    buffer.seek(0)
+    return buffer
+
+
+def to_parquetfile(
+    df,
+    filename: str,
+    local_dir: str,
+    schema=None,
+    compression: str = "snappy",
+    bucket_name: Optional[str] = None,
+    gcs_filename_prefix: Optional[str] = None,
+):
+    """
+    DataFrameをparquetファイルに出力する
+    GCSへ出力する場合はparquet出力してからアップロード
+    params
+        df: DataFrame
+        filename: 書き込みファイル名(パスではない)
+        local_dir: str: 書き込み元ファイルがあるローカルディレクトリ(GCSへのアップロード元)
+        schema: Optional[pyarrow.Schema]: 列の型(省略時はDataFrameの型から推定)
+        compression: str: 圧縮形式 "snappy", "gzip", "zstd" など
+        bucket_name: Optional[str]: バケット名
+        gcs_filename_prefix: Optional[str]: GCSのアップロード先のprefix(ファイル名直前まで)
+    """
+
+    with open(local_dir + "/" + filename, mode="wb") as f:
+        write_dataframe(
+            df, f, file_format="parquet", schema=schema, compression=compression
+        )
+
+    if bucket_name is not None:
+        gcs.to_gcs(
+            bucket_name=bucket_name,
+            filepath=gcs_filename_prefix + "/" + filename,
+            upload_path=local_dir + "/" + filename,
+        )
+    return
+
+
+def to_avrofile(
+    df,
+    filename: str,
+    local_dir: str,
+    schema: dict,
+    codec: str = "deflate",
+    bucket_name: Optional[str] = None,
+    gcs_filename_prefix: Optional[str] = None,
+):
+    """
+    DataFrameをavroファイルに出力する
+    GCSへ出力する場合はavro出力してからアップロード
+    params
+        df: DataFrame
+        filename: 書き込みファイル名(パスではない)
+        local_dir: str: 書き込み元ファイルがあるローカルディレクトリ(GCSへのアップロード元)
+        schema: dict: avroスキーマ
+        codec: str: 圧縮形式 "deflate", "snappy", "null" など
+        bucket_name: Optional[str]: バケット名
+        gcs_filename_prefix: Optional[str]: GCSのアップロード先のprefix(ファイル名直前まで)
+    """
+
+    with open(local_dir + "/" + filename, mode="wb") as f:
+        write_dataframe(df, f, file_format="avro", schema=schema, compression=codec)
+
+    if bucket_name is not None:
+        gcs.to_gcs(
+            bucket_name=bucket_name,
+            filepath=gcs_filename_prefix + "/" + filename,
+            upload_path=local_dir + "/" + filename,
+        )
+    return
+
+
+def to_gcsfile(
+    df,
+    filename: str,
+    bucket_name: str,
+    gcs_filename_prefix: str,
+    file_format: str = "csv",
+    schema=None,
+    compression: Optional[str] = None,
+):
+    """
+    DataFrameをローカルに書き出さずGCSへ直接出力する
+    シリアライズした内容をそのままアップロードストリームへ書き込む
+    params
+        df: DataFrame
+        filename: 書き込みファイル名(パスではない)
+        bucket_name: str: バケット名
+        gcs_filename_prefix: str: GCSのアップロード先のprefix(ファイル名直前まで)
+        file_format: str: "csv", "parquet", "avro"
+        schema: write_dataframeを参照
+        compression: Optional[str]: write_dataframeを参照
+    return
+        書き込んだバイト数
+    """
+
+    mode = "wt" if file_format == "csv" else "wb"
+    with gcs.open_blob_writer(
+        bucket_name=bucket_name,
+        filepath=gcs_filename_prefix + "/" + filename,
+        mode=mode,
+    ) as f:
+        write_dataframe(
+            df, f, file_format=file_format, schema=schema, compression=compression
+        )
+        # テキストモードはエンコード後のバイト数
+        if mode == "wt":
+            f.flush()
+            size = f.buffer.tell()
+        else:
+            size = f.tell()
+    logger.info(f"streamed {filename} to gs://{bucket_name}/{gcs_filename_prefix}")
+    return size
+
+
 def load_object(
     filename: str,
     local_dir: str,
@@ -1,11 +1,16 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
-from google.cloud import storage
+from utils import clients
 
 # loggerの設定
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# 1回のバッチリクエストにまとめられる呼び出し数の上限
+BATCH_MAX_CALLS = 100
+
 
 def from_gcs(bucket_name: str, filepath: str, download_path: str):
     """
@@ -16,9 +21,9 @@ def from_gcs(bucket_name: str, filepath: str, download_path: str):
         download_path: str: ダウンロード先パス
     """
 
-    client = storage.Client()
+    client = clients.get_storage_client()
 
-    bucket = client.get_bucket(bucket_name)
+    bucket = client.bucket(bucket_name)
 
     blob = bucket.blob(filepath)
 
@@ -33,22 +38,104 @@ def to_gcs(bucket_name: str, filepath: str, upload_path: str):
         filepath: str: GCS上のアップロード先ファイルのパス
         upload_path: str: アップロード対象ファイルパス
     """
-    client = storage.Client()
+    client = clients.get_storage_client()
 
-    bucket = client.get_bucket(bucket_name)
+    bucket = client.bucket(bucket_name)
 
     blob = bucket.blob(filepath)
 
     blob.upload_from_filename(upload_path)
 
 
+def download_as_text(bucket_name: str, filepath: str) -> Optional[str]:
+    """
+    GCSのオブジェクトを文字列として読み込む
+    params:
+        bucket_name: str: バケット名
+        filepath: str: GCS上のファイルのパス
+    return:
+        ファイルの内容(存在しなければNone)
+    """
+    from google.api_core.exceptions import NotFound
+
+    client = clients.get_storage_client()
+
+    bucket = client.bucket(bucket_name)
+
+    blob = bucket.blob(filepath)
+
+    try:
+        return blob.download_as_text(encoding="utf-8")
+    except NotFound:
+        return None
+
+
+def upload_from_string(
+    bucket_name: str, filepath: str, data: str, content_type: str = "text/plain"
+) -> None:
+    """
+    文字列をGCSへアップロード
+    params:
+        bucket_name: str: バケット名
+        filepath: str: GCS上のアップロード先ファイルのパス
+        data: str: アップロードする内容
+        content_type: str: Content-Type
+    """
+    client = clients.get_storage_client()
+
+    bucket = client.bucket(bucket_name)
+
+    blob = bucket.blob(filepath)
+
+    blob.upload_from_string(data, content_type=content_type)
+
+
+def upload_from_file(bucket_name: str, filepath: str, file_obj) -> None:
+    """
+    メモリ上のファイルの内容をGCSへアップロード
+    params:
+        bucket_name: str: バケット名
+        filepath: str: GCS上のアップロード先ファイルのパス
+        file_obj: アップロードする内容(io.BytesIOなどバイナリモードのファイルオブジェクト)
+    """
+    client = clients.get_storage_client()
+
+    bucket = client.bucket(bucket_name)
+
+    blob = bucket.blob(filepath)
+
+    blob.upload_from_file(file_obj, rewind=True)
+
+
+def open_blob_writer(bucket_name: str, filepath: str, mode: str = "wb"):
+    """
+    GCSのオブジェクトへ直接書き込むファイルオブジェクトを開く
+    書き込んだ内容はチャンク単位でアップロードされ、closeで完了する
+    params:
+        bucket_name: str: バケット名
+        filepath: str: GCS上のアップロード先ファイルのパス
+        mode: str: "wb": バイナリ, "wt": テキスト(utf-8)
+    return:
+        書き込み用ファイルオブジェクト
+    """
+    client = clients.get_storage_client()
+
+    bucket = client.bucket(bucket_name)
+
+    blob = bucket.blob(filepath)
+
+    if mode == "wt":
+        return blob.open(mode, ignore_flush=True, encoding="utf-8", newline="")
+    return blob.open(mode, ignore_flush=True)
+
+
 def rename_blob(bucket_name: str, blob_name: str, new_name: str) -> None:
     """Renames a blob."""
     # bucket_name = "your-bucket-name"
     # blob_name = "your-object-name"
     # new_name = "new-object-name"
 
-    storage_client = storage.Client()
+    storage_client = clients.get_storage_client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(blob_name)
 
@@ -70,7 +157,7 @@ def copy_blob(
     # destination_bucket_name = "destination-bucket-name"
     # destination_blob_name = "destination-object-name"
 
-    storage_client = storage.Client()
+    storage_client = clients.get_storage_client()
 
     source_bucket = storage_client.bucket(bucket_name)
     source_blob = source_bucket.blob(blob_name)
@@ -103,7 +190,7 @@ def mv_blob(
     # destination_bucket_name = "destination-bucket-name"
     # destination_blob_name = "destination-object-name"
 
-    storage_client = storage.Client()
+    storage_client = clients.get_storage_client()
 
     source_bucket = storage_client.bucket(bucket_name)
     source_blob = source_bucket.blob(blob_name)
@@ -138,20 +225,192 @@ def delete_blob(bucket_name, blob_name) -> None:
     # bucket_name = "your-bucket-name"
     # blob_name = "your-object-name"
 
-    storage_client = storage.Client()
+    from google.api_core.exceptions import NotFound
+
+    storage_client = clients.get_storage_client()
 
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(blob_name)
-    if blob.exists():
+    # 存在確認はせず削除し、404は削除済みとして扱う
+    try:
         blob.delete()
         logger.info("Blob {} deleted.".format(blob_name))
-        return
-    else:
+    except NotFound:
         logger.warning("Blob {} is not exist".format(blob_name))
 
     return
 
 
+def _chunks(items: list, size: int = BATCH_MAX_CALLS):
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def _destination_names(
+    blob_names: list[str], destination_blob_names: Optional[list[str]]
+) -> list[str]:
+    if destination_blob_names is None:
+        return blob_names
+    if len(destination_blob_names) != len(blob_names):
+        raise ValueError(
+            f"expected {len(blob_names)} destination names, got {len(destination_blob_names)}"
+        )
+    return destination_blob_names
+
+
+def parallel_delete_blobs(
+    bucket_name: str, blob_names: list[str], max_workers: int = 8
+) -> None:
+    """
+    オブジェクトをスレッドで並行に削除(存在しないオブジェクトは削除済みとして扱う)
+    params
+        bucket_name: str: バケット名
+        blob_names: list[str]: 削除するオブジェクト名のリスト
+        max_workers: int: 同時リクエスト数の上限
+    """
+
+    from google.api_core.exceptions import NotFound
+
+    bucket = clients.get_storage_client().bucket(bucket_name)
+
+    def delete(blob_name: str):
+        try:
+            bucket.blob(blob_name).delete()
+        except NotFound:
+            pass
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 例外があれば呼び出し元に伝える
+        list(executor.map(delete, blob_names))
+
+    logger.info(f"deleted {len(blob_names)} blobs in bucket {bucket_name}.")
+    return
+
+
+def parallel_copy_blobs(
+    bucket_name: str,
+    blob_names: list[str],
+    destination_bucket_name: str,
+    destination_blob_names: Optional[list[str]] = None,
+    max_workers: int = 8,
+) -> None:
+    """
+    オブジェクトをスレッドで並行にコピー
+    params
+        bucket_name: str: コピー元バケット名
+        blob_names: list[str]: コピー元オブジェクト名のリスト
+        destination_bucket_name: str: コピー先バケット名
+        destination_blob_names: Optional[list[str]]: コピー先オブジェクト名のリスト(省略時は同名)
+        max_workers: int: 同時リクエスト数の上限
+    """
+
+    destination_blob_names = _destination_names(blob_names, destination_blob_names)
+
+    client = clients.get_storage_client()
+    source_bucket = client.bucket(bucket_name)
+    destination_bucket = client.bucket(destination_bucket_name)
+
+    def copy(names: tuple[str, str]):
+        blob_name, destination_blob_name = names
+        source_bucket.copy_blob(
+            source_bucket.blob(blob_name), destination_bucket, destination_blob_name
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(copy, zip(blob_names, destination_blob_names)))
+
+    logger.info(
+        f"copied {len(blob_names)} blobs in bucket {bucket_name} to bucket {destination_bucket_name}."
+    )
+    return
+
+
+def parallel_move_blobs(
+    bucket_name: str,
+    blob_names: list[str],
+    destination_bucket_name: str,
+    destination_blob_names: Optional[list[str]] = None,
+    max_workers: int = 8,
+) -> None:
+    """
+    オブジェクトをスレッドで並行に移動(全てコピーできてからコピー元を削除)
+    params
+        parallel_copy_blobsを参照
+    """
+
+    parallel_copy_blobs(
+        bucket_name=bucket_name,
+        blob_names=blob_names,
+        destination_bucket_name=destination_bucket_name,
+        destination_blob_names=destination_blob_names,
+        max_workers=max_workers,
+    )
+    parallel_delete_blobs(
+        bucket_name=bucket_name, blob_names=blob_names, max_workers=max_workers
+    )
+    return
+
+
+def batch_copy_blobs(
+    bucket_name: str,
+    blob_names: list[str],
+    destination_bucket_name: str,
+    destination_blob_names: Optional[list[str]] = None,
+) -> None:
+    """
+    オブジェクトをバッチリクエストでコピー
+    BATCH_MAX_CALLS件ごとに1リクエストにまとめる
+    params
+        bucket_name: str: コピー元バケット名
+        blob_names: list[str]: コピー元オブジェクト名のリスト
+        destination_bucket_name: str: コピー先バケット名
+        destination_blob_names: Optional[list[str]]: コピー先オブジェクト名のリスト(省略時は同名)
+    """
+
+    destination_blob_names = _destination_names(blob_names, destination_blob_names)
+
+    client = clients.get_storage_client()
+    source_bucket = client.bucket(bucket_name)
+    destination_bucket = client.bucket(destination_bucket_name)
+
+    for chunk in _chunks(list(zip(blob_names, destination_blob_names))):
+        with client.batch():
+            for blob_name, destination_blob_name in chunk:
+                source_bucket.copy_blob(
+                    source_bucket.blob(blob_name),
+                    destination_bucket,
+                    destination_blob_name,
+                )
+
+    logger.info(
+        f"copied {len(blob_names)} blobs in bucket {bucket_name} to bucket {destination_bucket_name}."
+    )
+    return
+
+
+def batch_move_blobs(
+    bucket_name: str,
+    blob_names: list[str],
+    destination_bucket_name: str,
+    destination_blob_names: Optional[list[str]] = None,
+) -> None:
+    """
+    オブジェクトをバッチリクエストでコピーしてから、コピー元をスレッドで並行に削除して移動
+    (バッチリクエストではサブリクエストごとの404を公開APIで扱えないため、削除はparallel_delete_blobsで行う)
+    params
+        batch_copy_blobsを参照
+    """
+
+    batch_copy_blobs(
+        bucket_name=bucket_name,
+        blob_names=blob_names,
+        destination_bucket_name=destination_bucket_name,
+        destination_blob_names=destination_blob_names,
+    )
+    parallel_delete_blobs(bucket_name=bucket_name, blob_names=blob_names)
+    return
+
+
 def find_objects(bucket_name: str, prefix: str) -> list[str]:
     """
     指定したprefixのオブジェクトの一覧を返す
@@ -161,7 +420,7 @@ def find_objects(bucket_name: str, prefix: str) -> list[str]:
     return
         存在するかオブジェクト名のリスト
     """
-    client = storage.Client()
+    client = clients.get_storage_client()
     return [blob.name for blob in client.list_blobs(bucket_name, prefix=prefix)]
 
 
@@ -174,8 +433,7 @@ def delete_blobs(bucket_name: str, prefix: str) -> None:
     """
 
     blob_names = find_objects(bucket_name=bucket_name, prefix=prefix)
-    for blob_name in blob_names:
-        delete_blob(bucket_name=bucket_name, blob_name=blob_name)
+    parallel_delete_blobs(bucket_name=bucket_name, blob_names=blob_names)
 
     return
 
@@ -201,7 +459,7 @@ def exists_objects(bucket_name: str, prefix: str) -> bool:
 def mv_objects(bucket_name: str, prefix: str, source_key: str, target_key: str) -> None:
     """
     同じバケット内の指定したprefixのオブジェクトを指定した箇所に移動する
-    renameすることで実現
+    コピーをバッチリクエスト、削除をスレッドでの並行リクエストで行うことで実現
     params
         params bucket_name: str: バケット名
         prefix: str: 指定するprefix
@@ -210,10 +468,45 @@ def mv_objects(bucket_name: str, prefix: str, source_key: str, target_key: str)
     return
     """
 
-    for blob_name in find_objects(bucket_name=bucket_name, prefix=prefix):
+    blob_names = find_objects(bucket_name=bucket_name, prefix=prefix)
+    batch_move_blobs(
+        bucket_name=bucket_name,
+        blob_names=blob_names,
+        destination_bucket_name=bucket_name,
+        destination_blob_names=[
+            blob_name.replace(source_key, target_key) for blob_name in blob_names
+        ],
+    )
+
+    return
+
+
+def copy_objects(
+    bucket_name: str,
+    prefix: str,
+    source_key: str,
+    target_key: str,
+    destination_bucket_name: Optional[str] = None,
+) -> None:
+    """
+    指定したprefixのオブジェクトを指定した箇所にコピーする
+    params
+        bucket_name: str: バケット名
+        prefix: str: 指定するprefix
+        source_key: str: 置き換え元キーワード
+        target_key: str: 置き換え先キーワード
+        destination_bucket_name: Optional[str]: コピー先バケット名(省略時は同じバケット)
+    """
 
-        new_name = blob_name.replace(source_key, target_key)
-        rename_blob(bucket_name=bucket_name, blob_name=blob_name, new_name=new_name)
+    blob_names = find_objects(bucket_name=bucket_name, prefix=prefix)
+    batch_copy_blobs(
+        bucket_name=bucket_name,
+        blob_names=blob_names,
+        destination_bucket_name=destination_bucket_name or bucket_name,
+        destination_blob_names=[
+            blob_name.replace(source_key, target_key) for blob_name in blob_names
+        ],
+    )
 
     return
 
@@ -222,7 +515,7 @@ def create_bucket(bucket_name, storage_class="COLDLINE", location="us"):
     """Create a new bucket in specific location with storage class"""
     # bucket_name = "your-new-bucket-name"
 
-    storage_client = storage.Client()
+    storage_client = clients.get_storage_client()
 
     bucket = storage_client.bucket(bucket_name)
     bucket.storage_class = storage_class
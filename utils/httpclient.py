@@ -0,0 +1,91 @@
+import random
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# リトライ対象のステータスコード
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+# ウォームインスタンスで使い回すセッション(get_sessionで生成)
+_session = None
+_session_lock = threading.Lock()
+
+
+class JitteredRetry(Retry):
+    """
+    指数バックオフに揺らぎ(full jitter)を加えたRetry
+    同時に失敗したリクエストが同じタイミングで再送しないようにする
+    """
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff <= 0:
+            return 0
+        return random.uniform(0, backoff)
+
+
+def create_session(
+    pool_maxsize: int = 10, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    コネクションプールとリトライを設定したセッションを生成
+    params
+        pool_maxsize: int: ホストごとに保持するコネクション数
+        retries: int: 接続エラー・5xx時の最大リトライ回数
+        backoff_factor: float: 指数バックオフの係数(秒)
+    return
+        セッション
+    """
+
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET"]),
+        backoff_factor=backoff_factor,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def get_session(
+    pool_maxsize: int = 10, retries: int = 3, backoff_factor: float = 0.5
+) -> requests.Session:
+    """
+    共有セッションを取得
+    初回呼び出し時に生成し、以降(ウォームインスタンスでの次回実行も含む)は同じセッションを返す
+    params
+        pool_maxsize: int: ホストごとに保持するコネクション数
+        retries: int: 接続エラー・5xx時の最大リトライ回数
+        backoff_factor: float: 指数バックオフの係数(秒)
+    return
+        セッション
+    """
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = create_session(
+                pool_maxsize=pool_maxsize,
+                retries=retries,
+                backoff_factor=backoff_factor,
+            )
+            logger.info("created http session")
+
+    return _session
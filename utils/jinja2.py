@@ -1,7 +1,6 @@
-from jinja2 import Template
-
-
 def embed_to_query(query_base: str, params: dict[str, any]) -> str:
+    # クエリを組み立てるときだけ読み込む
+    from jinja2 import Template
 
     # jinja2テンプレートでレンダリング準備
     template = Template(query_base)
@@ -1,11 +1,66 @@
 import os
+import sys
+import json
 import logging
-from google.cloud.logging import Client, Resource
-from google.cloud.logging.handlers import CloudLoggingHandler, setup_logging
+
+
+class StructuredLogFormatter(logging.Formatter):
+    """
+    Cloud Loggingの構造化ログ(1行1JSON)に整形するFormatter
+    Cloud Functionsでは標準出力のJSONがseverity付きのログエントリとして取り込まれる
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.exc_info:
+            message = f"{message}\n{self.formatException(record.exc_info)}"
+
+        entry = {
+            "severity": record.levelname,
+            "message": message,
+            "logger": record.name,
+            "logging.googleapis.com/sourceLocation": {
+                "file": record.pathname,
+                "line": record.lineno,
+                "function": record.funcName,
+            },
+        }
+        # extra={"json_fields": {...}}の項目はjsonPayloadのフィールドにする(Cloud Loggingクライアントと同じ指定方法)
+        entry.update(getattr(record, "json_fields", None) or {})
+
+        return json.dumps(entry, ensure_ascii=False)
 
 
 def setup_logger():
-    """ルートロガーに CloudLoggingの設定をする"""
+    """ルートロガーに CloudLoggingの設定をする
+    標準では構造化ログを標準出力に書き出す(Cloud Loggingクライアントの生成・APIの呼び出しをしない)
+    環境変数 _LOG_HANDLER が "client" の場合は従来通りCloud Loggingクライアントで送信する
+    """
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+
+    if os.environ.get("_LOG_HANDLER") == "client":
+        setup_cloud_logging_client()
+        return
+
+    # ウォームインスタンスで再度呼ばれてもハンドラを重複させない
+    for handler in root_logger.handlers:
+        if isinstance(handler.formatter, StructuredLogFormatter):
+            return
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredLogFormatter())
+    root_logger.addHandler(handler)
+
+    return
+
+
+def setup_cloud_logging_client():
+    """ルートロガーに Cloud Loggingクライアントで送信するハンドラを設定する"""
+    # 読み込みが重いので使う場合のみimportする
+    from google.cloud.logging import Client, Resource
+    from google.cloud.logging.handlers import CloudLoggingHandler, setup_logging
 
     logging_client = Client()
     resource = Resource(
@@ -0,0 +1,320 @@
+import math
+import time
+import logging
+import threading
+
+from typing import Optional, Union
+
+from utils import clients
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+# レイテンシのヒストグラムの既定のバケット(秒)
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Cloud Monitoringの1リクエストで書き込める時系列数の上限
+CLOUD_MONITORING_MAX_SERIES = 200
+
+
+class Metric:
+    def __init__(self, name: str, description: str, label_names: tuple):
+
+        """
+        ラベルごとの値を持つメトリクス(CounterとHistogramの共通部分)
+        params
+            name: str: メトリクス名(英小文字・数字・_)
+            description: str: 説明
+            label_names: tuple: ラベル名
+
+        フィールド変数
+        self.name: str
+        self.description: str
+        self.label_names: tuple
+        self.values: dict[tuple, Any]: {ラベルの値のタプル: 値}
+        """
+
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: dict) -> tuple:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name}: labels {sorted(labels)} != {sorted(self.label_names)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def reset(self):
+        with self._lock:
+            self.values = {}
+
+
+class Counter(Metric):
+    """増えるだけの値(リクエスト数・バイト数・行数など)"""
+
+    type = "counter"
+
+    def inc(self, amount: Union[int, float] = 1, **labels):
+        """
+        ラベルの値を増やす
+        params
+            amount: Union[int, float]: 増やす量(0以上)
+            labels: ラベル名ごとの値
+        """
+        if amount < 0:
+            raise ValueError(f"{self.name}: counter cannot decrease")
+        key = self._label_values(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, description: str, label_names: tuple, buckets=DEFAULT_BUCKETS
+    ):
+
+        """
+        値の分布(レイテンシなど)
+        params
+            name: str: メトリクス名
+            description: str: 説明
+            label_names: tuple: ラベル名
+            buckets: バケットの上限値(昇順。+Infは自動で加える)
+
+        フィールド変数
+        self.buckets: tuple[float]
+        self.values: dict[tuple, dict]: {ラベルの値のタプル: {"counts": バケットごとの件数(累積ではない。末尾は+Inf), "sum", "count"}}
+        """
+
+        super().__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        """
+        値を記録する
+        params
+            value: float: 値
+            labels: ラベル名ごとの値
+        """
+        key = self._label_values(labels)
+        # value以上で最小の上限値のバケット(どれにも入らなければ+Inf)
+        index = next(
+            (i for i, bound in enumerate(self.buckets) if value <= bound),
+            len(self.buckets),
+        )
+        with self._lock:
+            item = self.values.setdefault(
+                key, {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            )
+            item["counts"][index] += 1
+            item["sum"] += value
+            item["count"] += 1
+
+
+class MetricsRegistry:
+    def __init__(self):
+
+        """
+        プロセス内のメトリクスの登録先
+        メトリクスは各モジュールで1度だけ登録し、値は実行ごとにresetする
+
+        フィールド変数
+        self.metrics: dict[str, Metric]: {メトリクス名: メトリクス}(登録順)
+        """
+
+        self.metrics = {}
+        self.__lock = threading.Lock()
+
+    def __register(self, metric_class, name: str, *args, **kwargs):
+        with self.__lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"{name} is already registered as {metric.type}")
+            return metric
+
+    def counter(self, name: str, description: str, label_names: tuple = ()) -> Counter:
+        """Counterを登録する(登録済みならそれを返す)"""
+        return self.__register(Counter, name, description, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        label_names: tuple = (),
+        buckets=DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Histogramを登録する(登録済みならそれを返す)"""
+        return self.__register(
+            Histogram, name, description, label_names, buckets=buckets
+        )
+
+    def reset(self):
+        """全メトリクスの値を消す(登録は残す)"""
+        for metric in list(self.metrics.values()):
+            metric.reset()
+
+    def to_openmetrics(self) -> str:
+        """
+        OpenMetricsのテキスト形式
+        return
+            "# TYPE ...\n...# EOF\n"(値のないメトリクスも型・説明は出力する)
+        """
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.append(f"# HELP {metric.name} {_escape(metric.description)}")
+            with metric._lock:
+                values = sorted(metric.values.items())
+            for label_values, value in values:
+                labels = list(zip(metric.label_names, label_values))
+                if metric.type == "counter":
+                    lines.append(
+                        f"{metric.name}_total{_labels(labels)} {_number(value)}"
+                    )
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), value["counts"]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else _number(float(bound))
+                    lines.append(
+                        f"{metric.name}_bucket{_labels(labels + [('le', le)])} {cumulative}"
+                    )
+                lines.append(f"{metric.name}_count{_labels(labels)} {value['count']}")
+                lines.append(
+                    f"{metric.name}_sum{_labels(labels)} {_number(value['sum'])}"
+                )
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: list) -> str:
+    if len(labels) == 0:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _number(value: Union[int, float]) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# プロセス内で共有する登録先
+registry = MetricsRegistry()
+
+
+def counter(name: str, description: str, label_names: tuple = ()) -> Counter:
+    """共有の登録先にCounterを登録する"""
+    return registry.counter(name, description, label_names)
+
+
+def histogram(
+    name: str, description: str, label_names: tuple = (), buckets=DEFAULT_BUCKETS
+) -> Histogram:
+    """共有の登録先にHistogramを登録する"""
+    return registry.histogram(name, description, label_names, buckets=buckets)
+
+
+def write_openmetrics_file(
+    filepath: str, metrics_registry: Optional[MetricsRegistry] = None
+):
+    """
+    OpenMetricsのテキストファイルに書き出す(オフラインで確認できる出力先)
+    params
+        filepath: str: 書き込み先のパス
+        metrics_registry: Optional[MetricsRegistry]: 登録先(省略時は共有の登録先)
+    """
+    with open(filepath, "w", encoding="utf-8") as f:
+        f.write((metrics_registry or registry).to_openmetrics())
+    return
+
+
+def to_time_series(
+    project_id: str,
+    metric_prefix: str,
+    metrics_registry: Optional[MetricsRegistry] = None,
+) -> list:
+    """
+    Cloud Monitoringのカスタム指標の時系列にする(1回の実行分の値をGAUGEとして書き込む)
+    Counterはint64(小数を含む場合はdouble)、Histogramはdistribution
+    params
+        project_id: str: プロジェクトID
+        metric_prefix: str: 指標の種類の接頭辞(例: "custom.googleapis.com/tenmado")
+        metrics_registry: Optional[MetricsRegistry]: 登録先(省略時は共有の登録先)
+    return
+        list[monitoring_v3.TimeSeries]
+    """
+    # 読み込みが重いので使う場合のみimportする
+    from google.cloud import monitoring_v3
+
+    now = time.time()
+    interval = monitoring_v3.TimeInterval(
+        {"end_time": {"seconds": int(now), "nanos": int((now - int(now)) * 10**9)}}
+    )
+
+    series_list = []
+    for metric in list((metrics_registry or registry).metrics.values()):
+        with metric._lock:
+            values = sorted(metric.values.items())
+        for label_values, value in values:
+            if metric.type == "counter":
+                typed_value = (
+                    {"double_value": value}
+                    if isinstance(value, float)
+                    else {"int64_value": value}
+                )
+            else:
+                typed_value = {
+                    "distribution_value": {
+                        "count": value["count"],
+                        "mean": value["sum"] / value["count"],
+                        "bucket_options": {
+                            "explicit_buckets": {"bounds": list(metric.buckets)}
+                        },
+                        # 先頭は最小の上限値以下のバケット(Cloud Monitoringの先頭のアンダーフローに相当)
+                        "bucket_counts": value["counts"],
+                    }
+                }
+            series = monitoring_v3.TimeSeries()
+            series.metric.type = f"{metric_prefix}/{metric.name}"
+            series.metric.labels.update(dict(zip(metric.label_names, label_values)))
+            series.resource.type = "global"
+            series.resource.labels["project_id"] = project_id
+            series.points = [
+                monitoring_v3.Point({"interval": interval, "value": typed_value})
+            ]
+            series_list.append(series)
+    return series_list
+
+
+def export_to_cloud_monitoring(
+    project_id: str,
+    metric_prefix: str,
+    metrics_registry: Optional[MetricsRegistry] = None,
+):
+    """
+    Cloud Monitoringのカスタム指標として書き込む
+    params
+        project_id: str: プロジェクトID
+        metric_prefix: str: 指標の種類の接頭辞
+        metrics_registry: Optional[MetricsRegistry]: 登録先(省略時は共有の登録先)
+    """
+    series_list = to_time_series(project_id, metric_prefix, metrics_registry)
+    client = clients.get_metric_service_client()
+    for start in range(0, len(series_list), CLOUD_MONITORING_MAX_SERIES):
+        client.create_time_series(
+            name=f"projects/{project_id}",
+            time_series=series_list[start : start + CLOUD_MONITORING_MAX_SERIES],
+        )
+    logger.info(f"exported {len(series_list)} time series to Cloud Monitoring")
+    return
@@ -0,0 +1,131 @@
+import io
+import sys
+import pstats
+import marshal
+import cProfile
+import logging
+import threading
+import tracemalloc
+
+# loggerの設定
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class RunProfiler:
+    def __init__(self, tracemalloc_frames: int = 1):
+
+        """
+        1回の実行をcProfileとtracemallocで計測する(startからstopまで)
+        startの後に開始したスレッド(気象庁APIへの並行リクエストなど)もスレッドごとにcProfileで計測し、まとめて集計する
+        (Python 3.12以降のcProfileは全スレッドを1つのプロファイラで計測するため、スレッドごとのプロファイラは作らない)
+        params
+            tracemalloc_frames: int: メモリ確保ごとに保持するスタックの深さ
+
+        フィールド変数
+        self.tracemalloc_frames: int
+        self.stats: pstats.Stats: stop後のcProfileの集計
+        self.snapshot: tracemalloc.Snapshot: stop時のメモリ確保の状況
+        self.peak_bytes: int: 計測中のメモリ使用量のピーク
+        """
+
+        self.tracemalloc_frames = tracemalloc_frames
+        self.stats = None
+        self.snapshot = None
+        self.peak_bytes = 0
+        self.__profile = cProfile.Profile()
+        self.__thread_profiles = []
+        self.__lock = threading.Lock()
+
+    def __start_thread_profile(self, frame, event, arg):
+        # 新しいスレッドの最初のイベントでそのスレッド用のプロファイラに切り替える
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # 他のプロファイラが有効(全スレッドを計測している)
+            sys.setprofile(None)
+            return
+        with self.__lock:
+            self.__thread_profiles.append(profile)
+
+    def start(self):
+        """計測を開始"""
+        tracemalloc.start(self.tracemalloc_frames)
+        if sys.version_info < (3, 12):
+            threading.setprofile(self.__start_thread_profile)
+        self.__profile.enable()
+
+    def stop(self):
+        """計測を終了して集計する"""
+        self.__profile.disable()
+        threading.setprofile(None)
+
+        # cProfileの集計で確保するメモリを含めないよう先にtracemallocを止める
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        self.snapshot = tracemalloc.take_snapshot().filter_traces(
+            [
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ]
+        )
+        tracemalloc.stop()
+
+        self.stats = pstats.Stats(self.__profile)
+        with self.__lock:
+            thread_profiles = list(self.__thread_profiles)
+        for profile in thread_profiles:
+            try:
+                self.stats.add(profile)
+            except TypeError:
+                # 1度も関数を呼ばずに終わったスレッド
+                continue
+        logger.info(
+            f"profiled {len(thread_profiles) + 1} threads,"
+            f" peak memory {self.peak_bytes / 1024 / 1024:.1f} MiB"
+        )
+
+    def pstats_bytes(self) -> bytes:
+        """
+        cProfileの集計をpstatsのダンプ形式(pstats.Stats.dump_statsと同じ)にする
+        return
+            pstats.Stats(ファイルパス)やsnakevizで読み込めるバイト列
+        """
+        return marshal.dumps(self.stats.stats)
+
+    def stats_report(self, top_n: int, sort: str = "cumulative") -> str:
+        """
+        cProfileの集計の上位の関数
+        params
+            top_n: int: 表示する関数の数
+            sort: str: 並べ替えの基準(pstats.Stats.sort_statsの指定)
+        return
+            pstats.Stats.print_statsの出力
+        """
+        stream = io.StringIO()
+        self.stats.stream = stream
+        self.stats.sort_stats(sort).print_stats(top_n)
+        return stream.getvalue()
+
+    def allocation_report(self, top_n: int) -> str:
+        """
+        stop時点で確保されたままのメモリの上位の行
+        params
+            top_n: int: 表示する行数
+        return
+            メモリ使用量のピークと、確保した行ごとのサイズ・回数
+        """
+        statistics = self.snapshot.statistics("lineno")
+        lines = [
+            f"peak: {self.peak_bytes / 1024:.1f} KiB",
+            f"total: {sum(stat.size for stat in statistics) / 1024:.1f} KiB",
+            "",
+        ]
+        for index, stat in enumerate(statistics[:top_n], 1):
+            frame = stat.traceback[0]
+            lines.append(
+                f"#{index}: {frame.filename}:{frame.lineno}:"
+                f" {stat.size / 1024:.1f} KiB, {stat.count} blocks"
+            )
+        return "\n".join(lines) + "\n"